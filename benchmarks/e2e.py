@@ -0,0 +1,215 @@
+"""
+离线端到端基准测试
+
+使用离线模拟的大模型（MODEL_PROVIDER=mock）与联网搜索（WEB_SEARCH_TYPE=fake）运行完整的 report_builder 工作流，
+无需网络与 api-key，统计：
+1. 每个节点（包括章节子图中的节点）的耗时
+2. 端到端耗时
+3. 内存峰值（tracemalloc 统计的 Python 内存峰值 以及 进程 RSS 峰值）
+4. 事件循环阻塞时间：监控协程按固定间隔休眠，实际唤醒时间超出预期的部分即为事件循环被阻塞的时间
+
+运行方式（项目根目录）：
+    python -m benchmarks.e2e --reports 3 --concurrency 3 --seed 42 --output bench_e2e.json
+"""
+import os
+
+# 必须在导入 deep_research 之前设置，配置在导入时读取
+os.environ["MODEL_PROVIDER"] = "mock"
+os.environ["WEB_SEARCH_TYPE"] = "fake"
+
+import argparse
+import asyncio
+import contextlib
+import json
+import resource
+import time
+import tracemalloc
+import uuid
+
+from langgraph.checkpoint.memory import MemorySaver
+
+import deep_research.llm.mock as mock
+import deep_research.utils as utils
+from deep_research.config.application_project import MOCK_MODEL, FAKE_SEARCH
+from deep_research.events.headless import HeadlessEventSink
+from deep_research.graph import report_builder
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "total": sum(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": max(values, default=0.0),
+    }
+
+
+class LoopLagMonitor:
+    """ 事件循环阻塞监控：每隔 interval 秒唤醒一次，唤醒延迟超过 threshold 的部分累计为阻塞时间 """
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            begin = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(time.perf_counter() - begin - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> dict:
+        stalls = [lag for lag in self.lags if lag > self.threshold]
+        return {
+            "samples": len(self.lags),
+            "stalls": len(stalls),
+            "stall_seconds": sum(stalls),
+            "max_lag": max(self.lags, default=0.0),
+            "p99_lag": percentile(self.lags, 0.99),
+        }
+
+
+async def run_report(workflow, topic: str, node_times: dict, args) -> float:
+    """ 运行单个报告，通过 debug 事件流统计每个节点的耗时，返回端到端耗时 """
+    config = {"configurable": {"thread_id": str(uuid.uuid4()),
+                               "event_sink": HeadlessEventSink(verbose=False, reply_delay=args.approval_delay),
+                               "bypass_search_cache": True,
+                               "bypass_llm_cache": True,
+                               "speculative_research": args.speculative}}
+    started = {}
+    begin = time.perf_counter()
+    async for namespace, event in workflow.astream({"topic": topic}, config, stream_mode="debug", subgraphs=True):
+        if event["type"] == "task":
+            started[event["payload"]["id"]] = time.perf_counter()
+        elif event["type"] == "task_result":
+            task_begin = started.pop(event["payload"]["id"], None)
+            if task_begin is not None:
+                node_times.setdefault(event["payload"]["name"], []).append(time.perf_counter() - task_begin)
+    return time.perf_counter() - begin
+
+
+async def run_benchmark(args) -> dict:
+    workflow = report_builder.compile(checkpointer=MemorySaver())
+    node_times = {}
+    monitor = LoopLagMonitor()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_with_limit(idx: int):
+        async with semaphore:
+            return await run_report(workflow, f"离线基准测试主题{idx}", node_times, args)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    monitor.start()
+    begin = time.perf_counter()
+    latencies = await asyncio.gather(*[run_with_limit(idx) for idx in range(1, args.reports + 1)])
+    wall_time = time.perf_counter() - begin
+    await monitor.stop()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    return {
+        "reports": args.reports,
+        "concurrency": args.concurrency,
+        "wall_time": wall_time,
+        "end_to_end": summarize(latencies),
+        "nodes": {name: summarize(times) for name, times in sorted(node_times.items())},
+        "memory": {
+            "tracemalloc_peak_mb": traced_peak / 1024 / 1024 if traced_peak is not None else None,
+            # linux 下 ru_maxrss 的单位为 KB
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        "event_loop": monitor.stats(),
+        "search": utils.get_scheduler("fake").stats(),
+    }
+
+
+def configure(args):
+    """ 按命令行参数调整离线模拟的大模型与联网搜索 """
+    MOCK_MODEL["research-sections"] = args.research_sections
+    MOCK_MODEL["fail-rate"] = args.fail_rate
+    MOCK_MODEL["first-token-latency"] = {"distribution": "lognormal", "median": args.first_token_latency,
+                                         "sigma": args.sigma}
+    MOCK_MODEL["tokens-per-second"] = {"reasoner": args.tokens_per_second / 2, "writer": args.tokens_per_second}
+    FAKE_SEARCH["latency"] = {"distribution": "lognormal", "median": args.search_latency, "sigma": args.sigma}
+    FAKE_SEARCH["error-rate"] = args.search_error_rate
+    if args.seed is not None:
+        mock._random.seed(args.seed)
+        utils._fake_search_random.seed(args.seed)
+
+
+def print_result(result: dict):
+    print(f"报告数: {result['reports']}, 并发数: {result['concurrency']}, 总耗时: {result['wall_time']:.2f}s")
+    e2e = result["end_to_end"]
+    print(f"端到端耗时: 平均 {e2e['mean']:.2f}s, p50 {e2e['p50']:.2f}s, p95 {e2e['p95']:.2f}s, 最大 {e2e['max']:.2f}s")
+    print(f"{'节点':<36}{'次数':>6}{'平均(s)':>10}{'p95(s)':>10}{'最大(s)':>10}{'合计(s)':>10}")
+    for name, stats in result["nodes"].items():
+        print(f"{name:<36}{stats['count']:>6}{stats['mean']:>10.3f}{stats['p95']:>10.3f}"
+              f"{stats['max']:>10.3f}{stats['total']:>10.3f}")
+    memory = result["memory"]
+    if memory["tracemalloc_peak_mb"] is not None:
+        print(f"内存峰值: tracemalloc {memory['tracemalloc_peak_mb']:.1f}MB, RSS {memory['max_rss_mb']:.1f}MB")
+    else:
+        print(f"内存峰值: RSS {memory['max_rss_mb']:.1f}MB")
+    loop = result["event_loop"]
+    print(f"事件循环阻塞: {loop['stalls']} 次, 合计 {loop['stall_seconds'] * 1000:.1f}ms, "
+          f"最大延迟 {loop['max_lag'] * 1000:.1f}ms, p99 延迟 {loop['p99_lag'] * 1000:.1f}ms")
+
+
+def main(args):
+    configure(args)
+    # 节点运行过程中的打印信息较多，默认不输出
+    if args.verbose:
+        result = asyncio.run(run_benchmark(args))
+    else:
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(run_benchmark(args))
+    print_result(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基准测试结果：{args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--reports", type=int, default=3, help="运行的报告个数")
+    parser.add_argument("--concurrency", type=int, default=3, help="同时运行的报告个数")
+    parser.add_argument("--research-sections", type=int, default=MOCK_MODEL.get("research-sections"),
+                        help="每个报告需要研究的章节个数")
+    parser.add_argument("--fail-rate", type=float, default=MOCK_MODEL.get("fail-rate"),
+                        help="章节评估为 fail 的概率，MAX_SEARCH_DEPTH 大于 1 时才会触发追加搜索")
+    parser.add_argument("--first-token-latency", type=float, default=0.4, help="模型首个 token 耗时的中位数（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=80, help="撰写模型每秒生成的 token 数，深度思考模型减半")
+    parser.add_argument("--search-latency", type=float, default=0.6, help="单个联网搜索查询耗时的中位数（秒）")
+    parser.add_argument("--search-error-rate", type=float, default=0.0, help="单个联网搜索查询失败的概率")
+    parser.add_argument("--sigma", type=float, default=0.3, help="对数正态延迟分布的 sigma，越大长尾越明显")
+    parser.add_argument("--approval-delay", type=float, default=0.0, help="模拟用户确认报告计划的耗时（秒）")
+    parser.add_argument("--speculative", action="store_true", help="开启预研究：等待用户确认报告计划期间提前研究章节")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="不使用 tracemalloc 统计内存峰值（tracemalloc 会拖慢运行）")
+    parser.add_argument("--verbose", action="store_true", help="输出节点运行过程中的打印信息")
+    parser.add_argument("--output", default=None, help="基准测试结果的 json 输出路径")
+    main(parser.parse_args())
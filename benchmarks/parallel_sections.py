@@ -0,0 +1,154 @@
+"""
+章节并行调度基准测试
+
+通过假的流式大模型与假的联网搜索，复现 HumanFeedbackNode 中 Send("build_section_with_web_research", ...) 的扇出过程，
+验证 N 个研究章节的总耗时约等于最慢的那个章节，而不是所有章节耗时之和。
+同时以 blocking 模式（同步阻塞调用，即改造前的 .invoke()/.stream()）作为对照组。
+
+运行方式（项目根目录）：
+    python -m benchmarks.parallel_sections --sections 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Literal
+
+from langchain_core.messages import AIMessageChunk
+from langgraph.graph import END, StateGraph
+from langgraph.types import Command, Send
+
+import deep_research.search.evidence as evidence
+from deep_research.events.headless import HeadlessEventSink
+from deep_research.graph import section_builder
+from deep_research.llm.llm import ModelRouter
+from deep_research.state import ReportState, Section, Queries, SearchQuery
+
+
+class FakeStreamingModel:
+    """
+    假的流式大模型
+    - 每个 token 固定耗时 token_latency 秒，blocking=True 时使用 time.sleep 模拟同步阻塞调用
+    - 结构化输出时，从 prompt 中找出当前章节的主题作为搜索查询，便于按章节区分搜索耗时
+    """
+
+    def __init__(self, content: str, token_latency: float, blocking: bool,
+                 section_topics: list[str], reasoning: bool = False):
+        self.content = content
+        self.token_latency = token_latency
+        self.blocking = blocking
+        self.section_topics = section_topics
+        self.reasoning = reasoning
+
+    async def _sleep(self):
+        if self.blocking:
+            time.sleep(self.token_latency)
+        else:
+            await asyncio.sleep(self.token_latency)
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, inputs):
+        for _ in range(10):
+            await self._sleep()
+        # 可变内容（章节主题）在最后一条 user 消息中
+        prompt = inputs[-1].content
+        section_topic = next(topic for topic in self.section_topics if topic in prompt)
+        return Queries(queries=[SearchQuery(search_query=section_topic)])
+
+    async def astream(self, inputs):
+        if self.reasoning:
+            for token in "深度思考中":
+                await self._sleep()
+                yield AIMessageChunk(content="", additional_kwargs={"reasoning_content": token})
+        for token in self.content:
+            await self._sleep()
+            yield AIMessageChunk(content=token)
+
+
+def patch_dependencies(search_latencies: dict[str, float], token_latency: float, blocking: bool):
+    """ 将模型路由 和 联网搜索 替换为假的实现 """
+    section_topics = list(search_latencies)
+    grade = json.dumps({"grade": "pass", "follow_up_queries": []})
+
+    ModelRouter.get_model = lambda self: FakeStreamingModel("章节内容" * 10, token_latency, blocking,
+                                                            section_topics)
+    ModelRouter.get_reasoner_model = lambda self: FakeStreamingModel(grade, token_latency / 4, blocking,
+                                                                     section_topics, reasoning=True)
+
+    async def fake_cached_search(search_queries, *args, **kwargs):
+        latency = max(search_latencies[query] for query in search_queries)
+        if blocking:
+            time.sleep(latency)
+        else:
+            await asyncio.sleep(latency)
+        return [{"query": query, "results": [{"title": query, "url": f"https://example.com/{idx}", "content": query}]}
+                for idx, query in enumerate(search_queries)]
+
+    evidence.cached_search = fake_cached_search
+
+
+def build_fan_out_graph():
+    """ 构建一个仅包含章节扇出的最小报告工作流 """
+
+    async def fan_out(state: ReportState) -> Command[Literal["build_section_with_web_research"]]:
+        return Command(goto=[
+            Send("build_section_with_web_research",
+                 {"topic": state["topic"], "section": section, "search_iterations": 0})
+            for section in state["sections"] if section.research
+        ])
+
+    builder = StateGraph(ReportState)
+    builder.add_node("fan_out", fan_out)
+    builder.add_node("build_section_with_web_research", section_builder.compile())
+    builder.set_entry_point("fan_out")
+    builder.add_edge("build_section_with_web_research", END)
+    return builder.compile()
+
+
+async def run_sections(sections: list[Section]) -> float:
+    """ 运行扇出工作流，返回总耗时 """
+    graph = build_fan_out_graph()
+    config = {"configurable": {"event_sink": HeadlessEventSink(verbose=False)}}
+    begin = time.perf_counter()
+    await graph.ainvoke({"topic": "并行章节基准测试", "sections": sections}, config)
+    return time.perf_counter() - begin
+
+
+async def main(args):
+    sections = [
+        Section(name=f"章节{idx}", description=f"基准测试章节主题{idx}号", research=True, content="")
+        for idx in range(1, args.sections + 1)
+    ]
+    # 每个章节的搜索耗时不同，最慢的章节决定整体耗时
+    search_latencies = {section.description: args.search_latency * idx for idx, section in enumerate(sections, 1)}
+
+    results = {}
+    for mode, blocking in (("async", False), ("blocking", True)):
+        patch_dependencies(search_latencies, args.token_latency, blocking)
+        section_times = [await run_sections([section]) for section in sections]
+        results[mode] = {
+            "wall_time": await run_sections(sections),
+            "slowest_section": max(section_times),
+            "sum_of_sections": sum(section_times),
+        }
+
+    for mode, result in results.items():
+        print(f"[{mode}] 章节数: {args.sections}, 总耗时: {result['wall_time']:.2f}s, "
+              f"最慢章节: {result['slowest_section']:.2f}s, 章节耗时之和: {result['sum_of_sections']:.2f}s, "
+              f"总耗时/最慢章节: {result['wall_time'] / result['slowest_section']:.2f}")
+
+    overlap_ratio = results["async"]["wall_time"] / results["async"]["slowest_section"]
+    if overlap_ratio > args.tolerance:
+        raise SystemExit(f"章节未能并行执行，总耗时是最慢章节的 {overlap_ratio:.2f} 倍")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="章节并行调度基准测试")
+    parser.add_argument("--sections", type=int, default=5, help="研究章节的个数")
+    parser.add_argument("--search-latency", type=float, default=0.3,
+                        help="第 N 个章节的搜索耗时为 N * search-latency 秒")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="假模型每个 token 的耗时（秒）")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="总耗时 / 最慢章节耗时 允许的最大比值")
+    asyncio.run(main(parser.parse_args()))
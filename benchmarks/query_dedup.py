@@ -0,0 +1,49 @@
+"""
+联网搜索查询语义去重的校验
+
+按当前的 QUERY_DEDUP 配置计算一组查询对的相似度，校验：
+1. 只是调整词序、增减空格的查询判为重复
+2. 只差一个词（年份、型号、出口/进口等）的查询无论相似度多高都不判为重复
+任何一对的判定与预期不一致时以非零状态退出
+
+运行方式（项目根目录）：
+    python -m benchmarks.query_dedup
+"""
+from deep_research.config.application_project import QUERY_DEDUP
+from deep_research.search.query_dedup import query_similarity, find_similar_query, deduplicate_queries
+
+# (查询, 已搜索的查询, 是否应判为重复)
+_CASES = [
+    ("2024 特斯拉 销量 数据", "特斯拉 2024 销量数据", True),
+    ("large language model inference cost", "inference cost of large language models", True),
+    ("2024年大模型市场规模", "2025年大模型市场规模", False),
+    ("2023年中国新能源汽车销量", "2024年中国新能源汽车销量", False),
+    ("iPhone 15 battery life", "iPhone 16 battery life", False),
+    ("特斯拉 2024 营收", "特斯拉 2023 营收", False),
+    ("GPT-4 评测", "GPT-5 评测", False),
+    ("LLM 推理 成本", "LLM 训练 成本", False),
+    ("中国 新能源汽车 出口 增长", "中国 新能源汽车 进口 增长", False),
+    ("2024 光伏 组件 价格 下滑", "2024 光伏 组件 价格 增长", False),
+    ("GPT-4o 价格", "GPT-4 价格", False),
+    ("open source model benchmark", "open source model benchmarks 2024", False),
+]
+
+
+def main():
+    method = QUERY_DEDUP.get("method")
+    print(f"相似度方法: {method}，阈值: {QUERY_DEDUP.get('threshold').get(method)}")
+    failures = []
+    for query, searched, expected in _CASES:
+        duplicate = find_similar_query(query, [searched]) is not None
+        kept, _ = deduplicate_queries([searched, query], [])
+        consistent = duplicate == expected and (len(kept) == 1) == expected
+        print(f"{'通过' if consistent else '失败'}  相似度 {query_similarity(query, searched):.2f}  "
+              f"判为重复 {duplicate}（预期 {expected}）  {query} | {searched}")
+        if not consistent:
+            failures.append(query)
+    if failures:
+        raise SystemExit(f"{len(failures)} 个查询对的去重判定与预期不一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+流式输出合并基准测试
+
+模拟多个章节同时流式输出到较慢的前端：每条 websocket 消息固定耗时 send_latency 秒，
+对比逐个 token 发送（改造前每个分块 await 一次 stream_token）与 BufferedStep 合并发送的：
+1. 大模型生成耗时（前端较慢时，逐个发送会拖慢生成）
+2. 实际发送的消息数 / 收到的 token 分块数
+3. 前端收到的内容是否完整且有序
+
+运行方式（项目根目录）：
+    python -m benchmarks.stream_buffer --streams 10 --tokens 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from deep_research.config.application_project import STREAM_BUFFER
+from deep_research.events.buffered import BufferedStep
+
+
+class SlowStep:
+    """ 假的前端步骤，每条消息发送耗时 send_latency 秒 """
+
+    def __init__(self, send_latency: float):
+        self.send_latency = send_latency
+        self.id = "slow-step"
+        self.input = ""
+        self.output = ""
+        self.messages = 0
+
+    async def stream_token(self, token: str):
+        await asyncio.sleep(self.send_latency)
+        self.output += token
+        self.messages += 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+async def run_stream(step, tokens: list[str], token_latency: float) -> tuple[float, float]:
+    """ 模拟大模型流式生成，返回 (生成耗时, 步骤结束耗时) """
+    begin = time.perf_counter()
+    async with step:
+        for token in tokens:
+            await asyncio.sleep(token_latency)
+            await step.stream_token(token)
+        generated = time.perf_counter() - begin
+    return generated, time.perf_counter() - begin
+
+
+async def run_mode(args, buffered: bool) -> dict:
+    tokens = [f"第{idx}个token。" for idx in range(args.tokens)]
+    slow_steps = [SlowStep(args.send_latency) for _ in range(args.streams)]
+    steps = [BufferedStep(step, args.flush_interval, args.flush_chars) if buffered else step for step in slow_steps]
+    results = await asyncio.gather(*[run_stream(step, tokens, args.token_latency) for step in steps])
+    messages = sum(step.messages for step in slow_steps)
+    return {
+        "generation_seconds": max(generated for generated, _ in results),
+        "finish_seconds": max(finished for _, finished in results),
+        "tokens": args.streams * args.tokens,
+        "messages": messages,
+        "complete": all(step.output == "".join(tokens) for step in slow_steps),
+    }
+
+
+def main(args):
+    result = {
+        "direct": asyncio.run(run_mode(args, buffered=False)),
+        "buffered": asyncio.run(run_mode(args, buffered=True)),
+    }
+    for mode, stats in result.items():
+        print(f"{mode:<10} 生成耗时 {stats['generation_seconds']:.2f}s  结束耗时 {stats['finish_seconds']:.2f}s  "
+              f"token 分块 {stats['tokens']}  发送消息 {stats['messages']}  内容完整 {stats['complete']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基准测试结果：{args.output}")
+    if not all(stats["complete"] for stats in result.values()):
+        raise SystemExit("前端收到的内容不完整")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="流式输出合并基准测试")
+    parser.add_argument("--streams", type=int, default=10, help="同时流式输出的章节个数")
+    parser.add_argument("--tokens", type=int, default=500, help="每个章节输出的 token 分块数")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="大模型每个 token 分块的耗时（秒）")
+    parser.add_argument("--send-latency", type=float, default=0.02, help="前端每条消息的发送耗时（秒）")
+    parser.add_argument("--flush-interval", type=float, default=STREAM_BUFFER.get("flush-interval"),
+                        help="合并发送的时间间隔（秒）")
+    parser.add_argument("--flush-chars", type=int, default=STREAM_BUFFER.get("flush-chars"),
+                        help="合并发送的字符数")
+    parser.add_argument("--output", default=None, help="基准测试结果的 json 输出路径")
+    main(parser.parse_args())
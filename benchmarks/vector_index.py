@@ -0,0 +1,88 @@
+"""
+报告级别向量索引基准测试
+
+生成 N 个模拟的网页正文片段写入向量索引，对比：
+1. 批量检索：一次矩阵乘法 + argpartition 选出每个章节的 top-k
+2. 逐个计算：Python 循环逐个片段计算相似度后排序（改造前的写法）
+并验证两种方式的 top-k 结果一致
+
+运行方式（项目根目录）：
+    python -m benchmarks.vector_index --chunks 5000 --queries 10
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from deep_research.config.application_project import VECTOR_INDEX
+from deep_research.embedding import load_embed_function
+from deep_research.search.vector_index import VectorIndex
+
+_WORDS = ["模型", "推理", "数据", "训练", "性能", "成本", "市场", "产品", "用户", "技术",
+          "架构", "部署", "开源", "评测", "应用", "场景", "生态", "趋势", "安全", "效率"]
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    embed_many = load_embed_function(VECTOR_INDEX.get("embedding-function"))
+    records = [{"key": idx, "title": f"模拟网页{idx}", "url": f"https://example.com/{idx}", "chunk": 0,
+                "text": "".join(rng.choices(_WORDS, k=args.chunk_chars // 2))} for idx in range(args.chunks)]
+    queries = ["".join(rng.choices(_WORDS, k=8)) for _ in range(args.queries)]
+
+    index = VectorIndex(embed_many)
+    begin = time.perf_counter()
+    index.add(records)
+    index_seconds = time.perf_counter() - begin
+
+    # 预热后计时，只统计检索本身（含查询的向量化）
+    index.search(queries, args.top_k)
+    begin = time.perf_counter()
+    for _ in range(args.repeat):
+        batched = index.search(queries, args.top_k)
+    batched_ms = (time.perf_counter() - begin) / args.repeat * 1000
+
+    # 逐个计算时片段的向量化不计入耗时
+    vectors = embed_many([record["text"] for record in index.records])
+    begin = time.perf_counter()
+    query_vectors = embed_many(queries)
+    looped = []
+    for query_vector in query_vectors:
+        scores = [(float(np.dot(query_vector, vector)), idx) for idx, vector in enumerate(vectors)]
+        scores.sort(key=lambda item: -item[0])
+        looped.append([idx for _, idx in scores[:args.top_k]])
+    loop_ms = (time.perf_counter() - begin) * 1000
+
+    batched_ids = [[record["key"] for _, record in hits] for hits in batched]
+    consistent = all(set(left) == set(right) for left, right in zip(batched_ids, looped))
+    result = {
+        "chunks": args.chunks,
+        "queries": args.queries,
+        "top_k": args.top_k,
+        "index_seconds": index_seconds,
+        "batched_search_ms": batched_ms,
+        "loop_search_ms": loop_ms,
+        "consistent": consistent,
+    }
+    print(f"片段数 {args.chunks}，查询数 {args.queries}，top-k {args.top_k}")
+    print(f"建立索引（含向量化）: {index_seconds:.2f}s")
+    print(f"批量检索: {batched_ms:.2f}ms  逐个计算: {loop_ms:.2f}ms  结果一致: {consistent}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基准测试结果：{args.output}")
+    if not consistent:
+        raise SystemExit("批量检索与逐个计算的结果不一致")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="报告级别向量索引基准测试")
+    parser.add_argument("--chunks", type=int, default=5000, help="索引的片段数")
+    parser.add_argument("--chunk-chars", type=int, default=200, help="每个片段的字数")
+    parser.add_argument("--queries", type=int, default=10, help="同时检索的章节数")
+    parser.add_argument("--top-k", type=int, default=VECTOR_INDEX.get("top-k"), help="每个章节检索的片段数")
+    parser.add_argument("--repeat", type=int, default=20, help="批量检索的重复次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="基准测试结果的 json 输出路径")
+    main(parser.parse_args())
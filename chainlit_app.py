@@ -1,10 +1,27 @@
+import atexit
+
 import chainlit as cl
-from langgraph.checkpoint.memory import MemorySaver
+from chainlit.server import app
+from fastapi.responses import PlainTextResponse
+
+from deep_research.checkpoint import open_checkpointer
+from deep_research.events.chainlit_sink import ChainlitEventSink
+from deep_research.graph import report_builder, release_report_resources
+from deep_research.llm.registry import model_client_registry
+from deep_research.tracing import tracer
+
+# 进程退出时关闭模型客户端共享的连接池
+atexit.register(model_client_registry.close)
+
 
-from deep_research.graph import report_builder
+async def metrics():
+    """ Prometheus 指标采集接口 """
+    return PlainTextResponse(tracer.render_prometheus(), media_type="text/plain; version=0.0.4")
 
-memory = MemorySaver()
-workflow = report_builder.compile(checkpointer=memory)
+
+# chainlit 注册了兜底的前端页面路由，需要把 /metrics 放到最前面，否则会被兜底路由匹配
+app.add_api_route("/metrics", metrics, methods=["GET"])
+app.router.routes.insert(0, app.router.routes.pop())
 
 
 @cl.on_chat_start
@@ -12,17 +29,33 @@ async def on_chat_start():
     await cl.Message(content="你好，我是小飞飞，请输入你想要研究的主题").send()
 
 
+@cl.on_chat_end
+async def on_chat_end():
+    # 会话结束（用户关闭页面等）时释放报告级别的资源
+    release_report_resources({"configurable": {"thread_id": cl.user_session.get("id")}})
+
+
 @cl.on_message
 async def chat(message: cl.Message):
     session_id = cl.user_session.get("id")
-    thread = {"configurable": {"thread_id": session_id}}
+    thread = {"configurable": {"thread_id": session_id, "event_sink": ChainlitEventSink()}}
 
     user_chat_history = [message for message in cl.chat_context.get() if message.type == 'user_message']
     if len(user_chat_history) == 1:
         topic = message.content
-        async for event in workflow.astream({"topic": topic}, thread, stream_mode="updates"):
-            # 所有输出展示结果统一 交给 chainlit 去渲染展示，因此这里只是启动graph，无需其他调度
-            pass
+        # 运行状态持久化到 SQLite，进程崩溃或重启后可以通过 python -m deep_research.resume 继续运行
+        async with open_checkpointer() as checkpointer:
+            workflow = report_builder.compile(checkpointer=checkpointer)
+            try:
+                async for event in workflow.astream({"topic": topic}, thread, stream_mode="updates"):
+                    # 所有输出展示结果统一 交给 chainlit 去渲染展示，因此这里只是启动graph，无需其他调度
+                    pass
+            except Exception as e:
+                await cl.Message(content=f"研究中断，原因是：{e}\n\n"
+                                         f"已完成的章节已保存，可通过 `python -m deep_research.resume {session_id}` 继续运行").send()
+                raise
+            finally:
+                release_report_resources(thread)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,251 @@
+"""
+进程内所有会话共享的准入控制
+
+大模型与联网搜索调用在发出前先按资源申请在途名额：
+1. 资源：大模型按 (模型服务提供商, 角色)，联网搜索按联网搜索服务，并发上限见 ADMISSION_CONTROL 与 SEARCH_RATE_LIMITS
+2. 公平分配：名额用满后调用按 thread_id 排队，释放名额时优先放行当前在途调用最少的会话，相同时按会话轮流放行，
+   章节很多的报告排队的调用再多，也不会让其他报告一直等待
+3. 指标：各资源的排队数、在途数、排队耗时（Prometheus 指标），节点内的排队耗时记录到链路追踪
+4. 过载：任一资源的排队数达到 max-queue-depth 时，按 overload-policy 继续排队、降低研究深度或拒绝新的报告
+
+thread_id 从当前节点的 RunnableConfig 中获取，节点内的调用无需传递任何参数。
+"""
+import asyncio
+import collections
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from langgraph.config import get_config
+
+from deep_research.config.application_project import ADMISSION_CONTROL
+from deep_research.tracing import Histogram, current_span, tracer
+
+# 不在节点内（如基准测试直接调用联网搜索）时的会话标识
+_DEFAULT_OWNER = "default"
+_WAIT_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+
+class OverloadedError(Exception):
+    """ 系统过载，按 reject 策略拒绝新的报告 """
+
+
+class FairSemaphore:
+    """
+    按会话公平分配的信号量
+    名额用满后每个会话的等待者各自排队，释放名额时放行在途名额最少的会话的下一个等待者，相同时按会话轮流放行
+    asyncio 的 Future 只能在创建它的事件循环中使用，需按事件循环分别创建
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_flight = 0
+        self._owner_in_flight = collections.Counter()
+        # 会话 => 等待者队列，按会话开始排队的先后排列，被放行后移到末尾
+        self._waiters: dict[str, collections.deque] = {}
+
+    async def acquire(self, owner: str):
+        if self.in_flight < self.capacity and not self._waiters:
+            self._grant(owner)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(owner, collections.deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已被放行但调用方同时被取消，归还名额
+                self.release(owner)
+            else:
+                self._remove_waiter(owner, future)
+            raise
+
+    def release(self, owner: str):
+        self.in_flight -= 1
+        self._owner_in_flight[owner] -= 1
+        if self._owner_in_flight[owner] <= 0:
+            del self._owner_in_flight[owner]
+        self._wake_up()
+
+    def _grant(self, owner: str):
+        self.in_flight += 1
+        self._owner_in_flight[owner] += 1
+
+    def _wake_up(self):
+        while self.in_flight < self.capacity and self._waiters:
+            owner = min(self._waiters, key=lambda waiting_owner: self._owner_in_flight[waiting_owner])
+            waiters = self._waiters.pop(owner)
+            future = waiters.popleft()
+            if waiters:
+                self._waiters[owner] = waiters
+            if future.cancelled():
+                continue
+            self._grant(owner)
+            future.set_result(None)
+
+    def _remove_waiter(self, owner: str, future: asyncio.Future):
+        waiters = self._waiters.get(owner)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[owner]
+
+
+class AdmissionResource:
+    """
+    单个资源的准入控制，进程内所有会话共享
+    信号量按事件循环隔离，指标全局共享
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.wait_histogram = Histogram(_WAIT_BUCKETS)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @asynccontextmanager
+    async def slot(self, owner: str = None):
+        """ 申请一个在途名额，退出时归还 """
+        owner = owner or current_owner()
+        semaphore = self._get_semaphore()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        enqueued_at = time.monotonic()
+        try:
+            await semaphore.acquire(owner)
+        finally:
+            self.queued -= 1
+        wait_seconds = time.monotonic() - enqueued_at
+        self.admitted += 1
+        self.wait_histogram.observe(wait_seconds)
+        span = current_span()
+        if span is not None:
+            span.admission_wait_seconds += wait_seconds
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release(owner)
+
+    def _get_semaphore(self) -> FairSemaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores.setdefault(loop, FairSemaphore(self.capacity))
+        return semaphore
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "avg_wait_seconds": self.wait_histogram.sum / self.admitted if self.admitted else 0.0,
+        }
+
+
+class AdmissionController:
+    """ 准入控制器，管理所有大模型与联网搜索资源，并按过载策略处理过载 """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._lock = threading.Lock()
+        self._resources: dict[str, AdmissionResource] = {}
+        self.rejected_reports = 0
+        self.degraded_sections = 0
+
+    def llm(self, provider: str, role: str) -> AdmissionResource:
+        """ 大模型服务提供商按角色的资源 """
+        limits = self.config.get("llm")
+        capacity = limits.get(provider, limits.get("default")).get(role)
+        return self.resource(f"llm:{provider}:{role}", capacity)
+
+    def search(self, provider: str, capacity: int) -> AdmissionResource:
+        """ 联网搜索服务的资源，并发上限由联网搜索调度器传入 """
+        return self.resource(f"search:{provider}", capacity)
+
+    def resource(self, name: str, capacity: int) -> AdmissionResource:
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                resource = self._resources[name] = AdmissionResource(name, capacity)
+            return resource
+
+    def overloaded(self) -> bool:
+        """ 任一资源的排队数达到 max-queue-depth """
+        max_queue_depth = self.config.get("max-queue-depth")
+        return any(resource.queued >= max_queue_depth for resource in list(self._resources.values()))
+
+    def admit_report(self, thread_id: str = None):
+        """ 开始新的报告前调用，过载且策略为 reject 时抛出 OverloadedError """
+        if self.config.get("overload-policy") == "reject" and self.overloaded():
+            self.rejected_reports += 1
+            raise OverloadedError(f"系统繁忙，暂时无法开始新的研究报告（thread_id: {thread_id}），请稍后重试")
+
+    def should_degrade(self) -> bool:
+        """ 过载且策略为 degrade 时返回 True，调用方降低研究深度 """
+        if self.config.get("overload-policy") == "degrade" and self.overloaded():
+            self.degraded_sections += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "overloaded": self.overloaded(),
+            "rejected_reports": self.rejected_reports,
+            "degraded_sections": self.degraded_sections,
+            "resources": {name: resource.stats() for name, resource in list(self._resources.items())},
+        }
+
+    def render_prometheus(self) -> list[str]:
+        """ Prometheus 文本格式的排队指标 """
+        resources = sorted(self._resources.items())
+        lines = []
+        gauges = [("deep_research_admission_queue_depth", "准入控制当前排队的调用数", "queued"),
+                  ("deep_research_admission_in_flight", "准入控制当前在途的调用数", "in_flight"),
+                  ("deep_research_admission_capacity", "准入控制的最大在途调用数", "capacity")]
+        for name, description, attribute in gauges:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{resource="{resource_name}"}} {getattr(resource, attribute)}'
+                      for resource_name, resource in resources]
+        name = "deep_research_admission_wait_seconds"
+        lines += [f"# HELP {name} 准入控制的排队耗时（秒）", f"# TYPE {name} histogram"]
+        for resource_name, resource in resources:
+            histogram = resource.wait_histogram
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{resource="{resource_name}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{resource="{resource_name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{resource="{resource_name}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{resource="{resource_name}"}} {histogram.count}')
+        lines += ["# HELP deep_research_admission_rejected_reports_total 过载时拒绝的报告数",
+                  "# TYPE deep_research_admission_rejected_reports_total counter",
+                  f"deep_research_admission_rejected_reports_total {self.rejected_reports}",
+                  "# HELP deep_research_admission_degraded_sections_total 过载时降低研究深度的章节数",
+                  "# TYPE deep_research_admission_degraded_sections_total counter",
+                  f"deep_research_admission_degraded_sections_total {self.degraded_sections}"]
+        return lines
+
+
+def current_owner() -> str:
+    """ 当前节点所属会话的 thread_id，不在节点内时返回 default """
+    try:
+        config = get_config()
+    except RuntimeError:
+        return _DEFAULT_OWNER
+    return (config.get("configurable") or {}).get("thread_id") or _DEFAULT_OWNER
+
+
+# 进程内共享的准入控制器
+admission_controller = AdmissionController(ADMISSION_CONTROL)
+tracer.add_collector(admission_controller.render_prometheus)
@@ -0,0 +1,125 @@
+"""
+无界面批量研究入口
+
+从主题文件中读取研究主题（每行一个，空行与 # 开头的行会被忽略），自动批准报告计划，
+以有限的并发数运行报告工作流，并将最终报告写入输出目录。可选地使用多进程，充分利用多核。
+运行状态持久化到 checkpoint，失败的主题可以通过 python -m deep_research.resume <thread_id> 继续运行。
+
+运行方式（项目根目录）：
+    python -m deep_research.batch topics.txt --output-dir reports --concurrency 4 --processes 2
+"""
+import argparse
+import asyncio
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from langgraph.graph.state import CompiledStateGraph
+
+from deep_research.checkpoint import open_checkpointer
+from deep_research.events.headless import HeadlessEventSink
+from deep_research.graph import report_builder, release_report_resources
+from deep_research.llm.registry import model_client_registry
+from deep_research.tracing import tracer, TRACING
+
+
+def read_topics(path: str) -> list[str]:
+    """ 读取主题文件 """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def report_file_name(index: int, topic: str) -> str:
+    """ 报告文件名：序号-主题（去掉文件名中不允许的字符） """
+    slug = re.sub(r"[\\/:*?\"<>|\s]+", "_", topic).strip("_")[:50]
+    return f"{index:03d}-{slug}.md"
+
+
+async def run_topic(workflow: CompiledStateGraph, index: int, topic: str, output_dir: str, verbose: bool) -> dict:
+    """ 运行单个主题的报告工作流，并将最终报告写入输出目录 """
+    event_sink = HeadlessEventSink(name=f"{index:03d}", verbose=verbose)
+    thread_id = str(uuid.uuid4())
+    # 批量研究自动批准报告计划，章节在报告规划输出的同时开始预研究
+    config = {"configurable": {"thread_id": thread_id, "event_sink": event_sink, "speculative_research": True}}
+
+    begin = time.perf_counter()
+    try:
+        result = await workflow.ainvoke({"topic": topic}, config)
+    except Exception as e:
+        print(f"[{index:03d}] 主题 [{topic}] 研究失败，原因是：{e}，"
+              f"可通过 python -m deep_research.resume {thread_id} 继续运行")
+        return {"index": index, "topic": topic, "thread_id": thread_id, "error": str(e),
+                "elapsed": time.perf_counter() - begin}
+    finally:
+        release_report_resources(config)
+
+    path = os.path.join(output_dir, report_file_name(index, topic))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(result["final_report"])
+    elapsed = time.perf_counter() - begin
+    print(f"[{index:03d}] 主题 [{topic}] 研究完成，耗时 {elapsed:.2f}s，报告：{path}")
+    return {"index": index, "topic": topic, "path": path, "elapsed": elapsed}
+
+
+async def run_batch(indexed_topics: list[tuple[int, str]], output_dir: str, concurrency: int,
+                    verbose: bool) -> list[dict]:
+    """ 在当前进程中以有限的并发数运行多个主题 """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with open_checkpointer() as checkpointer:
+        workflow = report_builder.compile(checkpointer=checkpointer)
+
+        async def run_with_limit(index: int, topic: str):
+            async with semaphore:
+                return await run_topic(workflow, index, topic, output_dir, verbose)
+
+        try:
+            return await asyncio.gather(*[run_with_limit(index, topic) for index, topic in indexed_topics])
+        finally:
+            await model_client_registry.aclose()
+
+
+def run_batch_in_process(indexed_topics: list[tuple[int, str]], output_dir: str, concurrency: int,
+                         verbose: bool) -> list[dict]:
+    """ 子进程入口 """
+    return asyncio.run(run_batch(indexed_topics, output_dir, concurrency, verbose))
+
+
+def main(args):
+    topics = read_topics(args.topics)
+    os.makedirs(args.output_dir, exist_ok=True)
+    indexed_topics = list(enumerate(topics, 1))
+
+    begin = time.perf_counter()
+    trace_path = TRACING.get("jsonl-path")
+    trace_offset = os.path.getsize(trace_path) if trace_path and os.path.exists(trace_path) else 0
+    if args.processes <= 1:
+        results = run_batch_in_process(indexed_topics, args.output_dir, args.concurrency, args.verbose)
+    else:
+        # 按主题轮询分配到各个进程，每个进程内部再以有限的并发数运行
+        chunks = [indexed_topics[i::args.processes] for i in range(args.processes)]
+        with ProcessPoolExecutor(max_workers=args.processes) as executor:
+            futures = [executor.submit(run_batch_in_process, chunk, args.output_dir, args.concurrency, args.verbose)
+                       for chunk in chunks if chunk]
+            results = [result for future in futures for result in future.result()]
+        # 子进程的追踪记录只写入了 JSONL 文件，在主进程中汇总为 Prometheus 指标
+        if trace_path and os.path.exists(trace_path):
+            tracer.load_jsonl(trace_path, trace_offset)
+    tracer.write_prometheus()
+
+    failed = [result for result in results if result.get("error")]
+    print(f"批量研究完成，主题数：{len(topics)}，成功：{len(topics) - len(failed)}，失败：{len(failed)}，"
+          f"总耗时：{time.perf_counter() - begin:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="无界面批量研究")
+    parser.add_argument("topics", help="主题文件，每行一个研究主题")
+    parser.add_argument("--output-dir", default="reports", help="报告输出目录")
+    parser.add_argument("--concurrency", type=int, default=2, help="每个进程同时运行的主题数")
+    parser.add_argument("--processes", type=int, default=1, help="进程数，大于 1 时使用多进程运行")
+    parser.add_argument("--verbose", action="store_true", help="打印每个步骤的完成情况")
+    raise SystemExit(main(parser.parse_args()))
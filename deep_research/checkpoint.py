@@ -0,0 +1,137 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from deep_research.config.application_project import CHECKPOINT
+
+
+class DurableSqliteSaver(AsyncSqliteSaver):
+    """
+    基于 SQLite（WAL 模式）持久化的 checkpointer，替代进程内的 MemorySaver
+    1. 每个节点（以及每个章节子图的节点）完成后写入 checkpoint，进程崩溃后已完成的章节不会丢失
+    2. 记录每个会话的最近更新时间，用于按保留策略删除过期会话
+    3. 压缩：每个会话的每个命名空间只保留最近的若干个 checkpoint，删除的行数较多时执行 VACUUM
+
+    aiosqlite 的连接只能在创建它的事件循环中使用，因此通过 open_checkpointer 按次打开、用完即关闭
+    """
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        async with self.lock:
+            await self.conn.executescript(
+                """
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS checkpoint_threads (
+                    thread_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS checkpoint_compactions (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    compacted_at REAL NOT NULL
+                );
+                """
+            )
+            await self.conn.commit()
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        await self.setup()
+        now = time.time()
+        async with self.lock:
+            # 不单独提交，随 checkpoint 的写入一起提交
+            await self.conn.execute(
+                "INSERT INTO checkpoint_threads (thread_id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (str(config["configurable"]["thread_id"]), now, now))
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def list_threads(self) -> list[dict]:
+        """ 所有会话，按最近更新时间倒序 """
+        await self.setup()
+        async with self.lock, self.conn.execute(
+                "SELECT thread_id, created_at, updated_at FROM checkpoint_threads ORDER BY updated_at DESC") as cur:
+            return [{"thread_id": thread_id, "created_at": created_at, "updated_at": updated_at}
+                    async for thread_id, created_at, updated_at in cur]
+
+    async def compact(self, keep_last: int = None, thread_ttl: float = None, vacuum_threshold: int = None) -> dict:
+        """ 删除过期会话 以及每个命名空间中较早的 checkpoint，返回删除统计 """
+        keep_last = keep_last or CHECKPOINT.get("keep-last")
+        thread_ttl = thread_ttl or CHECKPOINT.get("thread-ttl")
+        vacuum_threshold = vacuum_threshold or CHECKPOINT.get("vacuum-threshold")
+        await self.setup()
+        now = time.time()
+        async with self.lock:
+            expired = "SELECT thread_id FROM checkpoint_threads WHERE updated_at < ?"
+            expired_args = (now - thread_ttl,)
+            expired_threads = (await self.conn.execute_fetchall(
+                f"SELECT COUNT(*) FROM ({expired})", expired_args))[0][0]
+            for table in ("writes", "checkpoints", "checkpoint_threads"):
+                await self._execute(f"DELETE FROM {table} WHERE thread_id IN ({expired})", expired_args)
+
+            deleted_checkpoints = await self._execute(
+                "DELETE FROM checkpoints WHERE rowid IN ("
+                "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+                "PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS position FROM checkpoints) "
+                "WHERE position > ?)", (keep_last,))
+            # 删除不再属于任何 checkpoint 的中间写入
+            deleted_writes = await self._execute(
+                "DELETE FROM writes WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE "
+                "c.thread_id = writes.thread_id AND c.checkpoint_ns = writes.checkpoint_ns "
+                "AND c.checkpoint_id = writes.checkpoint_id)")
+            await self._execute(
+                "INSERT INTO checkpoint_compactions (id, compacted_at) VALUES (1, ?) "
+                "ON CONFLICT(id) DO UPDATE SET compacted_at = excluded.compacted_at", (now,))
+            await self.conn.commit()
+
+            vacuumed = deleted_checkpoints + deleted_writes >= vacuum_threshold
+            if vacuumed:
+                await self._execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                await self._execute("VACUUM")
+        return {
+            "expired_threads": expired_threads,
+            "deleted_checkpoints": deleted_checkpoints,
+            "deleted_writes": deleted_writes,
+            "vacuumed": vacuumed,
+        }
+
+    async def _execute(self, sql: str, parameters: tuple = ()) -> int:
+        """ 执行语句并关闭游标（VACUUM 要求没有未关闭的语句），返回影响的行数 """
+        async with self.conn.execute(sql, parameters) as cur:
+            return cur.rowcount
+
+    async def maybe_compact(self, compact_interval: float = None):
+        """ 距离上次压缩超过 compact-interval 时执行压缩 """
+        compact_interval = compact_interval or CHECKPOINT.get("compact-interval")
+        await self.setup()
+        async with self.lock:
+            rows = await self.conn.execute_fetchall("SELECT compacted_at FROM checkpoint_compactions WHERE id = 1")
+        if rows and time.time() - rows[0][0] < compact_interval:
+            return None
+        stats = await self.compact()
+        print(f"checkpoint 压缩完成：{stats}")
+        return stats
+
+
+@asynccontextmanager
+async def open_checkpointer(path: str = None) -> AsyncIterator[DurableSqliteSaver]:
+    """ 打开持久化的 checkpointer，退出时按压缩间隔执行一次压缩 并关闭连接 """
+    path = path or CHECKPOINT.get("path")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 多个进程同时写入时，等待写锁而不是立即报错
+    async with aiosqlite.connect(path, timeout=30) as conn:
+        checkpointer = DurableSqliteSaver(conn)
+        await checkpointer.setup()
+        try:
+            yield checkpointer
+        finally:
+            await checkpointer.maybe_compact()
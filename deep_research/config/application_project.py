@@ -55,12 +55,317 @@ TONGYI_WRITER_MODEL = {
     "base-url": os.getenv("TONGYI_BASE_URL"),
 }
 
-# 联网搜索服务 目前仅支持
+# 大模型客户端共享的 HTTP 连接池配置（keep-alive 连接复用，避免每次节点调度都重新握手）
+MODEL_HTTP_POOL = {
+    "max-connections": 100,
+    "max-keepalive-connections": 20,
+    "keepalive-expiry": 60,
+    "timeout": 600,
+}
+
+# 联网搜索服务 目前支持 tavily / duckduckgo / bocha，fake 为离线模拟的联网搜索（基准测试使用）
 # WEB_SEARCH_TYPE = "bocha"
-WEB_SEARCH_TYPE = "tavily"
+WEB_SEARCH_TYPE = os.getenv("WEB_SEARCH_TYPE", "tavily")
 # 单次最多获取搜索网页个数
 WEB_SEARCH_MAX_RESULTS = 5
+# 单个联网搜索查询的超时时间（秒）
+WEB_SEARCH_TIMEOUT = 20
+
+# 联网搜索来源去重：URL 归一化 + 基于字符 n-gram MinHash 的近似重复内容检测（镜像、转载等）
+SOURCE_DEDUP = {
+    "near-duplicate": True,
+    # 字符 n-gram 的长度，无需分词，中文同样适用
+    "ngram-size": 3,
+    # MinHash 哈希函数个数，越多相似度估计越准确
+    "num-perm": 128,
+    # n-gram 集合的 Jaccard 相似度（MinHash 估计值）不低于该阈值即视为近似重复
+    "similarity-threshold": 0.8,
+    # 标题 + 内容去掉空白后短于该字数的来源只按 URL 去重，内容过短时相似度没有意义（如空内容的来源全部"相似"）
+    "min-chars": 20,
+    # URL 中需要去掉的追踪参数（utm_* 默认去掉）
+    # 只列纯追踪用途的参数，source、from 等在不少网站上决定页面内容，不能去掉
+    "tracking-params": ["spm", "ref", "fbclid", "gclid", "share_token", "share_source",
+                        "scene", "srcid", "wfr", "isappinstalled"],
+}
+
+# 联网搜索查询的语义去重：与本章节之前迭代已搜索的查询（或同一批次中靠前的查询）语义重复的直接跳过，
+# 与报告中其他章节（或报告规划）已搜索的查询语义重复的合并到该查询，复用其搜索结果
+QUERY_DEDUP = {
+    "enabled": True,
+    # jaccard：字符 n-gram 集合的 Jaccard 相似度（对词序变化不敏感）；embedding：EMBEDDING 特征哈希向量的余弦相似度
+    "method": "jaccard",
+    "ngram-size": 2,
+    # 比较两个查询的用词时忽略的虚词，除此之外任何一个词只出现在其中一个查询时都不视为重复
+    "ignored-words": ["a", "an", "the", "of", "for", "in", "on", "and", "to", "的"],
+    # 相似度不低于该阈值即视为重复
+    "threshold": {
+        "jaccard": 0.7,
+        "embedding": 0.9,
+    },
+}
 
+# 章节撰写时资料来源的装填策略：按与章节主题的 BM25 相关性排序，在 token 预算内装填
+CONTEXT_PACKING = {
+    # 各撰写模型的资料来源 token 预算
+    "token-budget": {
+        "deepseek-chat": 12000,
+        "qwen-max": 6000,
+        "qwen2.5-72b-instruct": 12000,
+        "default": 6000,
+    },
+    # 相关性低于最高得分该比例的来源直接丢弃
+    "min-score-ratio": 0.05,
+    # 剩余预算低于该 token 数时不再截断装填，直接丢弃
+    "min-truncated-tokens": 200,
+    # 来源带有网页正文片段（PAGE_CONTENT）时，按章节主题补充到摘要之后的最相关片段数
+    "chunks-per-source": 3,
+}
+
+# 网页正文抓取：联网搜索服务只返回几行摘要，开启后对每个查询排名靠前的网页抓取原始网页，
+# 在进程池中提取正文并切分为片段，与联网搜索结果一起缓存，撰写章节时补充与章节主题最相关的片段
+# 默认关闭，设置环境变量 PAGE_CONTENT=true 开启
+PAGE_CONTENT = {
+    "enabled": os.getenv("PAGE_CONTENT", "false").lower() == "true",
+    # 每个查询抓取排名前几的网页
+    "top-k": 2,
+    # 单个网页的超时时间（秒）与大小上限（字节），超过大小上限的部分直接丢弃
+    "timeout": 10,
+    "max-bytes": 2 * 1024 * 1024,
+    # 共享连接池的最大连接数，以及同一域名的最大并发数
+    "max-connections": 32,
+    "max-per-host": 2,
+    # 正文片段的字数、相邻片段重叠的字数，以及每个网页最多保留的片段数
+    "chunk-chars": 800,
+    "chunk-overlap": 100,
+    "max-chunks": 12,
+}
+
+# 共享进程池：网页正文提取、文本向量化等 CPU 密集型任务
+PROCESS_POOL = {
+    "workers": min(4, os.cpu_count() or 1),
+}
+
+# 撰写不需要研究的章节（简介、结论等）时使用的已完成章节上下文
+# digest：每个研究章节完成时抽取有限长度的要点摘要，再按报告级别的预算汇总；full：所有章节的完整内容
+SECTION_DIGEST = {
+    "mode": "digest",
+    # 单个章节摘要的 token 预算
+    "section-budget": 400,
+    # 报告摘要（所有章节摘要汇总）的 token 预算，章节较多时按比例压缩每个章节的摘要
+    "report-budget": 2400,
+}
+
+# 联网搜索服务的限流配置（进程内所有会话共享）
+# rate: 每秒请求数，burst: 令牌桶容量（允许的突发请求数），max-in-flight: 最大并发请求数
+# max-retries: 429/5xx/超时 的最大重试次数，base-delay/max-delay: 指数退避的初始/最大等待时间（秒）
+SEARCH_RATE_LIMITS = {
+    "tavily": {"rate": 5, "burst": 10, "max-in-flight": 8, "max-retries": 4, "base-delay": 0.5, "max-delay": 8},
+    "bocha": {"rate": 5, "burst": 10, "max-in-flight": 8, "max-retries": 4, "base-delay": 0.5, "max-delay": 8},
+    "duckduckgo": {"rate": 1, "burst": 3, "max-in-flight": 3, "max-retries": 2, "base-delay": 1, "max-delay": 8},
+    "fake": {"rate": 100, "burst": 100, "max-in-flight": 32, "max-retries": 2, "base-delay": 0.1, "max-delay": 1},
+    "default": {"rate": 2, "burst": 5, "max-in-flight": 4, "max-retries": 3, "base-delay": 0.5, "max-delay": 8},
+}
+
+# 联网搜索结果缓存（SQLite 持久化），单次运行可以通过 config 的 configurable.bypass_search_cache=True 跳过缓存
+SEARCH_CACHE = {
+    "enabled": True,
+    "path": os.getenv("SEARCH_CACHE_PATH", ".cache/search_cache.sqlite3"),
+    # 缓存条目上限，超过后按最近访问时间淘汰
+    "max-entries": 10000,
+    # 各联网搜索服务的缓存有效期（秒）
+    "ttl": {
+        "tavily": 60 * 60 * 12,
+        "bocha": 60 * 60 * 12,
+        "duckduckgo": 60 * 60 * 6,
+        "default": 60 * 60,
+    },
+}
+
+# 大模型结构化输出的响应缓存（SQLite 持久化），用于联网搜索查询生成等输入重复率高的调用
+# 单次运行可以通过 config 的 configurable.bypass_llm_cache=True 跳过缓存
+LLM_CACHE = {
+    "enabled": True,
+    "path": os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3"),
+    # 缓存有效期（秒）
+    "ttl": 60 * 60 * 24 * 7,
+    # 缓存条目上限，超过后按最近访问时间淘汰
+    "max-entries": 5000,
+    # 按节点开启 / 关闭缓存
+    "nodes": {
+        "generate_report_plan": True,
+        "generate_queries": True,
+    },
+    # 语义缓存：prompt 模版相同，且可变部分（主题、章节描述）与已缓存的足够相似时直接复用
+    "semantic": {
+        "enabled": False,
+        # 可变部分向量的余弦相似度不低于该阈值即视为命中
+        "similarity-threshold": 0.95,
+        # 参与相似度比较的最近缓存条目数
+        "max-candidates": 2000,
+    },
+}
+
+# 预研究：报告计划等待用户确认期间，提前为需要研究的章节生成联网搜索查询并搜索
+# 用户批准后章节直接采用预研究结果，提供反馈后取消未完成的预研究，已完成且仍然一致的章节直接复用
+# 单次运行可以通过 config 的 configurable.speculative_research 开启 / 关闭
+SPECULATIVE_RESEARCH = {
+    "enabled": os.getenv("SPECULATIVE_RESEARCH", "false").lower() == "true",
+}
 
-# 这里统一采用 通义 相关模型测试 目前仅提供 deepseek 和 tongyi 俩种选择，需要其他的 请自己去拓展
-MODEL_PROVIDER = "tongyi"
+# 文本向量化：字符 n-gram 特征哈希，无需网络与向量模型
+EMBEDDING = {
+    "dim": 512,
+    "ngram-sizes": [1, 2, 3],
+}
+
+# 报告级别的向量索引：汇总整个报告的所有来源（含网页正文片段），撰写章节时按章节主题检索最相关的片段，
+# 补充其他章节搜索到的来源
+VECTOR_INDEX = {
+    "enabled": True,
+    # 本地向量化函数，格式为 "模块:函数"，输入文本列表，返回二维向量数组（如封装本地部署的向量模型），
+    # 为空或加载失败时使用 EMBEDDING 的特征哈希（在共享的进程池中向量化）；
+    # 配置后在主进程的线程池中向量化，模型只在主进程中加载一次
+    "embedding-function": os.getenv("VECTOR_INDEX_EMBEDDING_FUNCTION") or None,
+    # 每个章节检索的片段数
+    "top-k": 8,
+}
+
+# 工作流运行状态的持久化（SQLite WAL 模式），进程崩溃或重启后可以通过 python -m deep_research.resume 继续运行
+CHECKPOINT = {
+    "path": os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite3"),
+    # 每个会话（含各章节子图）保留最近的 checkpoint 个数，恢复运行只需要最新的 checkpoint
+    "keep-last": 5,
+    # 超过该时长（秒）未更新的会话整体删除
+    "thread-ttl": 60 * 60 * 24 * 7,
+    # 两次压缩之间的最小间隔（秒）
+    "compact-interval": 60 * 10,
+    # 单次压缩删除的行数超过该值时执行 VACUUM 回收磁盘空间
+    "vacuum-threshold": 1000,
+}
+
+# 流式输出到前端的合并策略：token 先写入缓冲区，按时间或字符数合并为一条消息发送，避免每个 token 一条 websocket 消息
+STREAM_BUFFER = {
+    "enabled": True,
+    # 距离首个未发送的 token 超过该时长（秒）即发送
+    "flush-interval": 0.08,
+    # 缓冲区超过该字符数即发送
+    "flush-chars": 400,
+}
+
+# 节点级别的链路追踪：耗时、首 token 耗时、token 用量、费用、联网搜索指标
+TRACING = {
+    "enabled": True,
+    # 每个节点运行结束后追加一行 json 到该文件，为空则不写入
+    "jsonl-path": os.getenv("TRACE_JSONL_PATH", ".cache/traces.jsonl"),
+    # Prometheus 文本格式的指标文件（可配合 node_exporter 的 textfile collector 采集），为空则不写入
+    "prometheus-path": os.getenv("TRACE_PROMETHEUS_PATH", ".cache/metrics.prom"),
+    # 节点耗时直方图的分桶（秒）
+    "duration-buckets": [0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],
+    # 首 token 耗时直方图的分桶（秒）
+    "ttft-buckets": [0.1, 0.25, 0.5, 1, 2, 5, 10, 30],
+}
+
+# 模型价格（元 / 百万 token），用于估算费用，仅供参考，请以各平台官方价格为准
+# 思维链 token 按输出 token 计费，cached-input 为命中模型服务前缀缓存的输入 token 价格（未配置时按 input 计费）
+MODEL_PRICING = {
+    "deepseek-chat": {"input": 2, "cached-input": 0.5, "output": 8},
+    "deepseek-reasoner": {"input": 4, "cached-input": 1, "output": 16},
+    "qwen-max": {"input": 2.4, "cached-input": 0.96, "output": 9.6},
+    "qwq-32b": {"input": 2, "cached-input": 0.8, "output": 6},
+    "qwen2.5-72b-instruct": {"input": 4, "cached-input": 1.6, "output": 12},
+    "default": {"input": 0, "cached-input": 0, "output": 0},
+}
+
+# 离线模拟的延迟分布 distribution 支持：
+# fixed（value）、uniform（low, high）、lognormal（median, sigma，长尾，更接近真实的接口耗时）
+# 离线模拟的大模型（MODEL_PROVIDER=mock），无需网络与 api-key，用于端到端基准测试
+MOCK_MODEL = {
+    "model-name": "mock-chat",
+    # 首个 token 的耗时（秒）
+    "first-token-latency": {"distribution": "lognormal", "median": 0.4, "sigma": 0.3},
+    # 每秒生成的 token 数
+    "tokens-per-second": {"reasoner": 40, "writer": 80},
+    # 每个流式分块包含的 token 数
+    "chunk-tokens": 4,
+    # 深度思考模型每次输出的思维链 token 数
+    "reasoning-tokens": 60,
+    # 撰写模型每次输出的正文 token 数
+    "content-tokens": 300,
+    # 报告计划中需要研究的章节个数（另有不需要研究的 引言 与 结论）
+    "research-sections": 3,
+    # 章节评估为 fail 的概率，MAX_SEARCH_DEPTH 大于 1 时才会触发追加搜索
+    "fail-rate": 0.0,
+    # 随机数种子，设置后每次运行的延迟与评估结果一致
+    "seed": None,
+    # 模拟模型服务的前缀缓存：与之前请求相同的前缀消息计为命中缓存的 prompt token
+    "prefix-cache": True,
+}
+
+# 离线模拟的联网搜索（WEB_SEARCH_TYPE=fake）
+FAKE_SEARCH = {
+    # 单个查询的耗时（秒）
+    "latency": {"distribution": "lognormal", "median": 0.6, "sigma": 0.4},
+    # 每个网页摘要的字数
+    "content-chars": 600,
+    # 单个查询失败（超时）的概率
+    "error-rate": 0.0,
+    "seed": None,
+}
+
+# 这里统一采用 通义 相关模型测试 目前提供 deepseek 和 tongyi 俩种选择，mock 为离线模拟的大模型（基准测试使用），
+# 需要其他的 请自己去拓展
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "tongyi")
+
+# 按节点路由大模型：每个节点按角色（writer 撰写模型 / reasoner 深度思考模型）配置有序的候选模型服务提供商，
+# 第一个为主模型，其余依次为出错、超时时的降级模型（开启对冲请求时也作为对冲请求的目标），未配置的节点使用 default
+MODEL_ROUTING = {
+    "routes": {
+        "default": {
+            "writer": [MODEL_PROVIDER],
+            "reasoner": [MODEL_PROVIDER],
+        },
+        # 示例：联网搜索查询生成使用便宜快速的模型，章节撰写与评估出错或超时时降级到其他模型服务提供商
+        # "generate_queries": {"writer": ["deepseek", "tongyi"]},
+        # "write_section": {"writer": ["tongyi", "deepseek"], "reasoner": ["deepseek", "tongyi"]},
+    },
+    # 单次调用的超时时间（秒），流式调用为首个分块的超时时间，None 表示不限制
+    "timeout": {
+        "writer": 120,
+        "reasoner": 300,
+    },
+    # 对冲请求：主模型超过历史 p95 耗时（流式调用为首个分块的耗时）仍未返回时，向下一个候选模型发送相同的请求，
+    # 采用先返回的结果，另一个请求直接取消（两个请求均计费）
+    "hedging": {
+        "enabled": False,
+        # 开启对冲请求的节点
+        "nodes": ["write_section", "write_no_research_section"],
+        "percentile": 0.95,
+        # 计算分位数所需的最少样本数，样本不足时使用 default-delay
+        "min-samples": 20,
+        # 每个 (节点, 角色, 调用方式, 模型服务提供商) 保留的最近样本数
+        "window": 200,
+        # 对冲等待时间的下限与默认值（秒）
+        "min-delay": 1.0,
+        "default-delay": 30,
+    },
+}
+
+# 准入控制：进程内所有会话共享的大模型与联网搜索调用并发上限
+# 排队的调用按 thread_id 公平分配（优先放行当前在途调用最少的会话），章节很多的报告不会让其他报告一直排队
+# 联网搜索的并发上限见 SEARCH_RATE_LIMITS 的 max-in-flight
+ADMISSION_CONTROL = {
+    # 各模型服务提供商按角色（writer 撰写模型 / reasoner 深度思考模型）的最大在途调用数，未配置的使用 default
+    "llm": {
+        "tongyi": {"writer": 16, "reasoner": 8},
+        "deepseek": {"writer": 16, "reasoner": 8},
+        "mock": {"writer": 64, "reasoner": 64},
+        "default": {"writer": 8, "reasoner": 4},
+    },
+    # 任一大模型或联网搜索服务的排队调用数达到该值时视为过载
+    "max-queue-depth": int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "100")),
+    # 过载策略：
+    # queue 继续排队
+    # degrade 降低研究深度：章节评估未通过时不再追加联网搜索，直接完成章节
+    # reject 拒绝新的报告（已开始的报告继续排队）
+    "overload-policy": os.getenv("ADMISSION_OVERLOAD_POLICY", "queue"),
+}
@@ -0,0 +1,139 @@
+"""
+已完成章节的摘要
+
+撰写简介、结论等不需要研究的章节时，不再把所有章节的完整内容（含引用来源）放进 prompt：
+1. 章节摘要：每个研究章节完成时，从章节内容中抽取标题、每段的首句等要点，控制在 section-budget 个 token 以内，
+   预算不足时截断过长的首句，每段都保留开头
+2. 报告摘要：按报告计划的顺序汇总各章节摘要，总长度控制在 report-budget 以内，章节数较多时按比例压缩每个章节的摘要
+
+摘要为抽取式，不调用大模型，报告章节越多，不需要研究的章节的 prompt 长度也不会随之增长。
+"""
+import re
+
+from deep_research.state import Section
+from deep_research.tokenizer import estimate_tokens
+
+# 引用来源标题，之后的内容不进入摘要
+_SOURCES_HEADING = re.compile(r"^#+\s*(引用来源|参考来源|资料来源|来源|sources|references)\s*$", re.IGNORECASE)
+# 引用编号，如 [1]、[2][3]
+_CITATION = re.compile(r"\[\d+\]")
+# 中文标点直接断句，英文句号后需要有空白（或位于行尾），避免拆开小数与缩写中的点
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])|(?<=\.)(?=\s|$)")
+# 截断的首句至少保留的 token 数，预算不足时不再截断
+_MIN_LEAD_TOKENS = 4
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{3,}")
+
+# 要点的优先级：标题 > 段落 / 列表项的首句、表格的表头 > 其余句子 > 表格的数据行
+_HEADING, _LEAD, _BODY, _TABLE_ROW = range(4)
+
+
+def section_digest(section: Section, token_budget: int) -> str:
+    """ 抽取章节内容的要点，按原文顺序输出，总长度不超过 token_budget """
+    units = []
+    table_header = False
+    for line_idx, line in enumerate((section.content or "").splitlines()):
+        line = _CITATION.sub("", line).strip()
+        if _SOURCES_HEADING.match(line):
+            break
+        if not line or _TABLE_SEPARATOR.match(line):
+            continue
+        if line.startswith("#"):
+            units.append((_HEADING, line_idx, 0, line))
+        elif line.startswith("|"):
+            units.append((_TABLE_ROW if table_header else _LEAD, line_idx, 0, line))
+            table_header = True
+            continue
+        else:
+            for sentence_idx, sentence in enumerate(s for s in _SENTENCE_END.split(line) if s.strip()):
+                units.append((_LEAD if sentence_idx == 0 else _BODY, line_idx, sentence_idx, sentence.strip()))
+        table_header = False
+
+    selected = []
+    used_tokens = 0
+    for unit in sorted(unit for unit in units if unit[0] == _HEADING):
+        tokens = estimate_tokens(unit[3])
+        if used_tokens + tokens <= token_budget:
+            selected.append(unit)
+            used_tokens += tokens
+
+    # 每段的首句（以及表头）平分剩余的预算，过长的首句截断而不是整句丢弃，保证每段都保留开头
+    leads = [unit for unit in units if unit[0] == _LEAD]
+    lead_cap = _fair_share([estimate_tokens(unit[3]) for unit in leads], token_budget - used_tokens)
+    for level, line_idx, sentence_idx, text in leads:
+        tokens = estimate_tokens(text)
+        if tokens > lead_cap:
+            if lead_cap < _MIN_LEAD_TOKENS:
+                continue
+            text = _truncate(text, lead_cap)
+            tokens = estimate_tokens(text)
+        selected.append((level, line_idx, sentence_idx, text))
+        used_tokens += tokens
+
+    for unit in sorted(unit for unit in units if unit[0] > _LEAD):
+        tokens = estimate_tokens(unit[3])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(unit)
+        used_tokens += tokens
+
+    lines = {}
+    for _, line_idx, _, text in sorted(selected, key=lambda unit: (unit[1], unit[2])):
+        if line_idx in lines:
+            # 英文句子之间保留空格
+            lines[line_idx] += f" {text}" if lines[line_idx][-1].isascii() else text
+        else:
+            lines[line_idx] = text
+    return "\n".join(lines.values())
+
+
+def _fair_share(sizes: list[int], budget: int) -> int:
+    """ 平分预算（water-filling）：返回使 sum(min(size, cap)) 不超过 budget 的最大 cap """
+    remaining = max(budget, 0)
+    for idx, size in enumerate(sorted(sizes)):
+        share = remaining // (len(sizes) - idx)
+        if size > share:
+            return share
+        remaining -= size
+    return max(sizes, default=0)
+
+
+def _truncate(text: str, token_budget: int) -> str:
+    """ 截断文本（末尾加省略号），使其不超过 token_budget """
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle].rstrip() + "…") <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + "…"
+
+
+def report_digest(sections: list[Section], digests: dict, section_budget: int, report_budget: int) -> str:
+    """
+    按报告计划的顺序汇总已完成章节的摘要
+    digests 为章节名称 => 章节完成时生成的摘要，缺失（如从旧的 checkpoint 恢复）时重新生成
+    每个章节分到的预算不足 section_budget 时，按分到的预算重新抽取要点
+    """
+    completed = [section for section in sections if section.content]
+    if not completed:
+        return ""
+    headers = [f"""
+        {'============'}
+        章节 {idx} 名称: {section.name}
+        {'============'}
+        章节主题:
+        {section.description}
+        章节要点:
+        """ for idx, section in enumerate(completed, 1)]
+    # 章节名称与主题同样占用预算，剩余的预算平均分给每个章节的摘要
+    share = min(section_budget,
+                max(report_budget - sum(estimate_tokens(header) for header in headers), 0) // len(completed))
+
+    formatted_str = ""
+    for header, section in zip(headers, completed):
+        digest = digests.get(section.name)
+        if digest is None or estimate_tokens(digest) > share:
+            digest = section_digest(section, share)
+        formatted_str += f"{header}{digest if digest else '[无]'}\n"
+    return formatted_str
@@ -0,0 +1,62 @@
+import functools
+import hashlib
+import importlib
+import re
+import unicodedata
+from typing import Callable, Optional
+
+import numpy as np
+
+from deep_research.config.application_project import EMBEDDING
+
+
+class HashingEmbedder:
+    """
+    基于字符 n-gram 特征哈希的文本向量化，无需分词与向量模型，中文同样适用
+    每个 n-gram 哈希到固定维度中的一个位置（符号同样由哈希决定，减少冲突带来的偏差），向量做 L2 归一化，
+    两个向量的点积即为余弦相似度
+    """
+
+    def __init__(self, dim: int, ngram_sizes: list[int]):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    def embed(self, text: str) -> np.ndarray:
+        text = re.sub(r"[\W_]+", "", unicodedata.normalize("NFKC", text).casefold())
+        features = [self._feature(text[begin:begin + size]) for size in self.ngram_sizes
+                    for begin in range(max(len(text) - size + 1, 0))]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if features:
+            positions, signs = zip(*features)
+            np.add.at(vector, list(positions), signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @functools.lru_cache(maxsize=200_000)
+    def _feature(self, ngram: str) -> tuple[int, float]:
+        """ n-gram 的 (位置, 符号)，常见的 n-gram 反复出现，缓存后无需重复计算哈希 """
+        value = int.from_bytes(hashlib.blake2b(ngram.encode("utf-8"), digest_size=8).digest(), "big")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed_many(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
+
+
+def load_embed_function(path: Optional[str]) -> Callable[[list[str]], np.ndarray]:
+    """
+    加载本地向量化函数（"模块:函数"，输入文本列表，返回二维向量数组）
+    未配置或加载失败时使用特征哈希，离线同样可用
+    """
+    if path:
+        module_name, _, function_name = path.partition(":")
+        try:
+            return getattr(importlib.import_module(module_name), function_name)
+        except (ImportError, AttributeError) as e:
+            print(f"向量化函数 [{path}] 加载失败，使用特征哈希，原因是：{e}")
+    return embedder.embed_many
+
+
+# 全局共享的文本向量化
+embedder = HashingEmbedder(EMBEDDING.get("dim"), EMBEDDING.get("ngram-sizes"))
@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+from typing import AsyncContextManager, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+
+class BaseStep(ABC):
+    """ 节点执行步骤 基类，对应前端展示的一个步骤 """
+
+    id: str
+    input: str
+    output: str
+
+    @abstractmethod
+    async def stream_token(self, token: str):
+        """ 流式输出步骤内容 """
+        raise NotImplementedError("未实现")
+
+
+class BaseEventSink(ABC):
+    """
+    节点事件输出 基类
+    节点只通过事件输出与用户交互，不依赖具体的 UI 框架（chainlit 或者无界面的批量运行）
+    """
+
+    @abstractmethod
+    def step(self, name: str, parent_id: Optional[str] = None,
+             default_open: bool = False) -> AsyncContextManager[BaseStep]:
+        """ 创建一个执行步骤 """
+        raise NotImplementedError("未实现")
+
+    @abstractmethod
+    async def send_message(self, content: str):
+        """ 发送消息 """
+        raise NotImplementedError("未实现")
+
+    @abstractmethod
+    async def ask_user(self, content: str, timeout: int) -> Optional[str]:
+        """ 向用户提问并等待回复，超时返回 None """
+        raise NotImplementedError("未实现")
+
+
+def get_event_sink(config: RunnableConfig) -> BaseEventSink:
+    """ 获取当前运行配置的事件输出，未配置时默认输出到 chainlit """
+    event_sink = (config or {}).get("configurable", {}).get("event_sink")
+    if event_sink is None:
+        from deep_research.events.chainlit_sink import ChainlitEventSink
+        event_sink = ChainlitEventSink()
+    return event_sink
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Optional
+
+from deep_research.events import BaseStep
+from deep_research.tracing import current_span
+
+
+class BufferedStep(BaseStep):
+    """
+    合并流式输出的执行步骤，包装具体 UI 框架的步骤（如 cl.Step）
+    1. stream_token 只写入缓冲区，不等待网络发送，前端较慢时不会拖慢大模型的生成
+    2. 距离首个未发送的 token 超过 flush_interval 秒，或缓冲区超过 flush_chars 个字符时，合并为一条消息发送
+    3. 同一时刻只有一条消息在发送，发送期间新的 token 继续合并，发送完成后再决定是否立即发送（背压）
+    4. 收到的 token 分块数与实际发送的消息数记录到当前节点的追踪记录
+    """
+
+    def __init__(self, step, flush_interval: float, flush_chars: int):
+        self._step = step
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self._buffer = []
+        self._buffered_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: Optional[asyncio.Task] = None
+        # 步骤结束中，发送完成的回调不再发起新的发送，剩余内容由 __aexit__ 统一发送
+        self._closing = False
+        self._span = None
+
+    @property
+    def id(self) -> str:
+        return self._step.id
+
+    @property
+    def input(self) -> str:
+        return self._step.input
+
+    @input.setter
+    def input(self, value: str):
+        self._step.input = value
+
+    @property
+    def output(self) -> str:
+        return self._step.output
+
+    @output.setter
+    def output(self, value: str):
+        self._step.output = value
+
+    async def stream_token(self, token: str):
+        if not token:
+            return
+        self._buffer.append(token)
+        self._buffered_chars += len(token)
+        if self._span is not None:
+            self._span.stream_tokens += 1
+        if self._buffered_chars >= self.flush_chars:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+
+    async def __aenter__(self):
+        self._span = current_span()
+        await self._step.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # 步骤结束前 等待正在发送的消息完成，再发送缓冲区中剩余的内容，保证所有 token 都在步骤结束之前送达
+        self._closing = True
+        self._cancel_timer()
+        while self._sending is not None and not self._sending.done():
+            await asyncio.wait([self._sending])
+        if self._buffer:
+            await self._send(self._take())
+        return await self._step.__aexit__(exc_type, exc_val, exc_tb)
+
+    def _flush(self):
+        self._cancel_timer()
+        if self._closing:
+            return
+        # 上一条消息仍在发送中，新的 token 继续合并，发送完成后再处理
+        if not self._buffer or (self._sending is not None and not self._sending.done()):
+            return
+        self._sending = asyncio.create_task(self._send(self._take()))
+        self._sending.add_done_callback(self._on_sent)
+
+    def _on_sent(self, task: asyncio.Task):
+        if self._closing:
+            return
+        if self._buffered_chars >= self.flush_chars:
+            self._flush()
+        elif self._buffer and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+
+    def _take(self) -> str:
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        return text
+
+    async def _send(self, text: str):
+        try:
+            await self._step.stream_token(text)
+        except Exception as e:
+            # 前端连接异常时丢弃本次流式消息，不影响节点运行，步骤结束时仍会更新完整的输出
+            print(f"步骤流式输出发送失败，原因是：{e}")
+            return
+        if self._span is not None:
+            self._span.stream_messages += 1
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,26 @@
+from typing import Optional
+
+import chainlit as cl
+
+from deep_research.config.application_project import STREAM_BUFFER
+from deep_research.events import BaseEventSink
+from deep_research.events.buffered import BufferedStep
+
+
+class ChainlitEventSink(BaseEventSink):
+    """ chainlit 事件输出，步骤与消息均渲染到 chainlit 页面 """
+
+    def step(self, name: str, parent_id: Optional[str] = None, default_open: bool = False):
+        # cl.Step 本身即为异步上下文管理器，且具备 id、input、output 以及 stream_token
+        step = cl.Step(name=name, parent_id=parent_id, default_open=default_open)
+        if not STREAM_BUFFER.get("enabled"):
+            return step
+        # 合并流式输出的 token，减少 websocket 消息数
+        return BufferedStep(step, STREAM_BUFFER.get("flush-interval"), STREAM_BUFFER.get("flush-chars"))
+
+    async def send_message(self, content: str):
+        await cl.Message(content=content).send()
+
+    async def ask_user(self, content: str, timeout: int) -> Optional[str]:
+        resp = await cl.AskUserMessage(content=content, timeout=timeout).send()
+        return resp['output'] if resp else None
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+
+from deep_research.events import BaseEventSink, BaseStep
+
+
+class HeadlessStep(BaseStep):
+    """ 无界面运行的执行步骤，记录步骤的输入、输出以及耗时 """
+
+    def __init__(self, sink: "HeadlessEventSink", name: str, parent_id: Optional[str]):
+        self.sink = sink
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.parent_id = parent_id
+        self.input = ""
+        self.output = ""
+        self.started_at = None
+        self.elapsed = None
+
+    async def stream_token(self, token: str):
+        self.output += token
+
+    async def __aenter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.perf_counter() - self.started_at
+        self.sink.steps.append(self)
+        if self.sink.verbose:
+            print(f"[{self.sink.name}] 步骤 [{self.name}] 完成，耗时 {self.elapsed:.2f}s")
+        return False
+
+
+class HeadlessEventSink(BaseEventSink):
+    """
+    无界面事件输出，用于命令行 / 批量运行
+    - 步骤与消息保存在内存中，verbose=True 时打印步骤完成情况
+    - 向用户提问时等待 reply_delay 秒（模拟用户阅读报告计划的时间，默认不等待）后返回 auto_reply（默认 'true'，即自动批准报告计划）
+    """
+
+    def __init__(self, name: str = "headless", auto_reply: str = "true", verbose: bool = True,
+                 reply_delay: float = 0.0):
+        self.name = name
+        self.auto_reply = auto_reply
+        self.reply_delay = reply_delay
+        self.verbose = verbose
+        self.steps = []
+        self.messages = []
+
+    def step(self, name: str, parent_id: Optional[str] = None, default_open: bool = False):
+        return HeadlessStep(self, name, parent_id)
+
+    async def send_message(self, content: str):
+        self.messages.append(content)
+
+    async def ask_user(self, content: str, timeout: int) -> Optional[str]:
+        if self.reply_delay:
+            await asyncio.sleep(self.reply_delay)
+        if self.verbose:
+            print(f"[{self.name}] 自动回复：{self.auto_reply}")
+        return self.auto_reply
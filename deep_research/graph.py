@@ -17,6 +17,8 @@ from deep_research.nodes.section_nodes import (
     WriteSectionNode,
     SectionStepNode, WriteNoResearchSectionNode,
 )
+from deep_research.search.evidence import release_evidence_pool
+from deep_research.search.speculative import release_speculative_research
 from deep_research.state import (
     ReportStateOutput,
     SectionOutputState,
@@ -97,3 +99,13 @@ report_builder.add_conditional_edges("gather_completed_sections",
                                      ["write_no_research_section"])
 report_builder.add_edge("write_no_research_section", "compile_final_report")
 report_builder.add_edge("compile_final_report", END)
+
+
+def release_report_resources(config: RunnableConfig):
+    """
+    释放报告级别共享的资源（预研究与证据池），报告正常完成时由最终报告节点释放，
+    运行失败、被取消或会话被放弃时由运行工作流的入口在 finally 中释放，避免在长时间运行的进程中累积
+    """
+    # 先取消仍在运行的预研究任务，避免继续为已经结束的报告调用大模型与联网搜索
+    release_speculative_research(config)
+    release_evidence_pool(config)
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from langchain_core.runnables import RunnableConfig
+
+from deep_research.config.application_project import LLM_CACHE
+from deep_research.embedding import embedder
+from deep_research.tracing import current_span
+
+# prompt 中的日期（now()），不同日期的相同 prompt 视为同一个缓存键，过期由 ttl 控制
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def normalize_prompt(text: str) -> str:
+    """ 归一化 prompt：全半角、空白以及日期的差异不影响缓存键 """
+    text = unicodedata.normalize("NFKC", text)
+    text = _DATE_PATTERN.sub("<date>", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LLMResponseCache:
+    """
+    大模型结构化输出的响应缓存 基于 SQLite 持久化
+    1. 精确缓存：模型 + 结构化输出类型 + 归一化后的 prompt 的哈希
+    2. 语义缓存（可选）：prompt 去掉可变部分（主题、章节描述等）后的模版相同，
+       且可变部分的向量与已缓存的余弦相似度不低于阈值时命中
+    3. 过期即视为未命中，条目超过上限时按最近访问时间淘汰（LRU）
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int, semantic: dict):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def get(self, model_name: str, schema_name: str, prompt: str, variable_parts: list[str]):
+        """ 读取缓存，返回 (响应 json, 命中方式 exact / semantic)，未命中返回 (None, None) """
+        key, template_key, normalized_variable = self._keys(model_name, schema_name, prompt, variable_parts)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                return row[0], "exact"
+
+            if self.semantic.get("enabled") and normalized_variable:
+                rows = conn.execute(
+                    "SELECT key, response, embedding FROM llm_cache WHERE template_key = ? AND created_at >= ? "
+                    "ORDER BY accessed_at DESC LIMIT ?",
+                    (template_key, now - self.ttl, self.semantic.get("max-candidates"))).fetchall()
+                if rows:
+                    embeddings = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                    similarities = embeddings @ embedder.embed(normalized_variable)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.semantic.get("similarity-threshold"):
+                        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, rows[best][0]))
+                        conn.commit()
+                        self.semantic_hits += 1
+                        return rows[best][1], "semantic"
+            self.misses += 1
+            return None, None
+
+    def put(self, model_name: str, schema_name: str, prompt: str, variable_parts: list[str], response: str):
+        """ 写入缓存 并按 LRU 淘汰超出上限的条目 """
+        key, template_key, normalized_variable = self._keys(model_name, schema_name, prompt, variable_parts)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, template_key, model, schema, variable, embedding, response, "
+                "created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, template_key, model_name, schema_name, normalized_variable,
+                 embedder.embed(normalized_variable).tobytes(), response, now, now))
+            overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute("DELETE FROM llm_cache WHERE key IN "
+                             "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)", (overflow,))
+                self.evictions += overflow
+            conn.commit()
+
+    def stats(self) -> dict:
+        """ 缓存命中统计 """
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    template_key TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    schema TEXT NOT NULL,
+                    variable TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed_at ON llm_cache (accessed_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_template_key ON llm_cache (template_key)")
+        return self._conn
+
+    @staticmethod
+    def _keys(model_name: str, schema_name: str, prompt: str, variable_parts: list[str]) -> tuple[str, str, str]:
+        """ 返回 (精确缓存键, 模版键, 归一化后的可变部分) """
+        normalized = normalize_prompt(prompt)
+        template = normalized
+        normalized_parts = [normalize_prompt(part) for part in variable_parts if part and part.strip()]
+        for part in normalized_parts:
+            template = template.replace(part, "<variable>")
+        key = hashlib.sha256(f"{model_name}\x00{schema_name}\x00{normalized}".encode("utf-8")).hexdigest()
+        template_key = hashlib.sha256(f"{model_name}\x00{schema_name}\x00{template}".encode("utf-8")).hexdigest()
+        return key, template_key, "\n".join(normalized_parts)
+
+
+async def cached_structured_invoke(node_name: str, model_name: str, llm, schema, messages: list,
+                                   variable_parts: list[str], config: RunnableConfig = None):
+    """
+    带缓存的结构化输出调用
+    variable_parts 为 prompt 中随输入变化的部分（主题、章节描述等），用于语义缓存的相似度比较
+    """
+    configurable = (config or {}).get("configurable", {})
+    if (not LLM_CACHE.get("enabled") or not LLM_CACHE.get("nodes", {}).get(node_name)
+            or configurable.get("bypass_llm_cache")):
+        return await llm.with_structured_output(schema).ainvoke(messages)
+
+    prompt = "\n".join(str(message.content) for message in messages)
+    response, hit = await asyncio.to_thread(llm_cache.get, model_name, schema.__name__, prompt, variable_parts)
+    span = current_span()
+    if response is not None:
+        try:
+            result = schema.model_validate_json(response)
+        except ValueError as e:
+            print(f"大模型响应缓存 [{node_name}] 解析失败，重新调用大模型，原因是：{e}")
+        else:
+            if span is not None:
+                span.llm_cache_hits += 1
+            print(f"大模型响应缓存 [{node_name}] 命中（{hit}），累计统计：{llm_cache.stats()}")
+            return result
+
+    result = await llm.with_structured_output(schema).ainvoke(messages)
+    await asyncio.to_thread(llm_cache.put, model_name, schema.__name__, prompt, variable_parts,
+                            result.model_dump_json())
+    return result
+
+
+# 全局共享的大模型响应缓存
+llm_cache = LLMResponseCache(LLM_CACHE.get("path"), LLM_CACHE.get("ttl"), LLM_CACHE.get("max-entries"),
+                             LLM_CACHE.get("semantic"))
@@ -1,29 +1,74 @@
 from langchain_community.chat_models import ChatTongyi
 
-from deep_research.config.application_project import MODEL_PROVIDER, TONGYI_PLANNER_MODEL, TONGYI_WRITER_MODEL, \
-    DEEPSEEK_PLANNER_MODEL, DEEPSEEK_WRITER_MODEL
+from deep_research.config.application_project import TONGYI_PLANNER_MODEL, TONGYI_WRITER_MODEL, \
+    DEEPSEEK_PLANNER_MODEL, DEEPSEEK_WRITER_MODEL, MOCK_MODEL, MODEL_ROUTING
 from deep_research.llm import BaseModel
+from deep_research.llm.mock import MockChatModel
+from deep_research.llm.registry import model_client_registry
+from deep_research.llm.routing import ModelCandidate, RoutedModel
 from langchain_deepseek import ChatDeepSeek
 
 
 class ModelRouter(BaseModel):
-    """ 模型路由器 """
+    """
+    模型路由器
+    按节点与角色（writer 撰写模型 / reasoner 深度思考模型）从 MODEL_ROUTING 中获取有序的候选模型服务提供商，
+    返回支持准入控制、降级与对冲请求的 RoutedModel
+    """
+
+    def __init__(self, node_name: str = "default"):
+        self.node_name = node_name
 
     def get_reasoner_model(self):
-        if MODEL_PROVIDER == 'tongyi':
-            return TongyiModel().get_reasoner_model()
-        elif MODEL_PROVIDER == 'deepseek':
-            return DeepSeekModel().get_reasoner_model()
-        else:
-            raise ValueError(f"不存在此模型服务提供商(MODEL_PROVIDER): {MODEL_PROVIDER}，请检查")
+        return self._route("reasoner")
 
     def get_model(self):
-        if MODEL_PROVIDER == 'tongyi':
-            return TongyiModel().get_model()
-        elif MODEL_PROVIDER == 'deepseek':
-            return DeepSeekModel().get_model()
-        else:
-            raise ValueError(f"不存在此模型服务提供商(MODEL_PROVIDER): {MODEL_PROVIDER}，请检查")
+        return self._route("writer")
+
+    def get_model_name(self) -> str:
+        """ 获取撰写模型的名称（有多个候选模型时为主模型的名称） """
+        return _provider(self._providers("writer")[0]).get_model_name()
+
+    def _providers(self, role: str) -> list[str]:
+        routes = MODEL_ROUTING.get("routes")
+        return routes.get(self.node_name, {}).get(role) or routes.get("default").get(role)
+
+    def _route(self, role: str):
+        candidates = []
+        for provider in self._providers(role):
+            model = _provider(provider)
+            candidates.append(ModelCandidate(provider, model.get_model_name(role),
+                                             model.get_reasoner_model() if role == "reasoner" else model.get_model()))
+        hedging = MODEL_ROUTING.get("hedging")
+        hedging_enabled = hedging.get("enabled") and self.node_name in hedging.get("nodes") and len(candidates) > 1
+        return RoutedModel(self.node_name, role, candidates, MODEL_ROUTING.get("timeout").get(role), hedging_enabled)
+
+
+def _provider(provider: str) -> BaseModel:
+    if provider == 'tongyi':
+        return TongyiModel()
+    elif provider == 'deepseek':
+        return DeepSeekModel()
+    elif provider == 'mock':
+        return MockModel()
+    else:
+        raise ValueError(f"不存在此模型服务提供商: {provider}，请检查 MODEL_PROVIDER 与 MODEL_ROUTING 配置")
+
+
+def pooled_chat_deepseek(provider: str, role: str, model_config: dict):
+    """ 从客户端注册表中获取 ChatDeepSeek 客户端，同一 base_url 共享 keep-alive 连接池 """
+    model_name = model_config.get("model-name")
+    base_url = model_config.get("base-url")
+    return model_client_registry.get_or_create(
+        provider, model_name, role,
+        lambda: ChatDeepSeek(model=model_name,
+                             api_key=model_config.get("api-key"),
+                             api_base=base_url,
+                             temperature=0,
+                             # 流式调用也返回 token 用量（含命中前缀缓存的 token 数）
+                             stream_usage=True,
+                             http_client=model_client_registry.http_client(base_url),
+                             http_async_client=model_client_registry.http_async_client(base_url)))
 
 
 class TongyiModel(BaseModel):
@@ -31,34 +76,52 @@ class TongyiModel(BaseModel):
 
     def get_reasoner_model(self):
         # 因为ChatTongyi 还没有适配 思维链，因此这里使用ChatDeepSeek来替代
-        return ChatDeepSeek(model=TONGYI_PLANNER_MODEL.get("model-name"),
-                            api_key=TONGYI_PLANNER_MODEL.get("api-key"),
-                            api_base=TONGYI_PLANNER_MODEL.get("base-url"),
-                            temperature=0)
+        return pooled_chat_deepseek("tongyi", "reasoner", TONGYI_PLANNER_MODEL)
+
+    async def astream(self, inputs):
+        async for chunk in self.get_reasoner_model().astream(inputs):
+            yield chunk
 
-    async def stream(self, inputs):
-        yield self.get_reasoner_model().stream(inputs)
+    def get_model_name(self, role: str = "writer") -> str:
+        return (TONGYI_PLANNER_MODEL if role == "reasoner" else TONGYI_WRITER_MODEL).get("model-name")
 
     def get_model(self):
-        return ChatTongyi(model=TONGYI_WRITER_MODEL.get("model-name"),
-                          api_key=TONGYI_WRITER_MODEL.get("api-key"),
-                          temperature=0)
+        # ChatTongyi 基于 dashscope sdk，连接由 sdk 自行管理，这里只复用客户端实例
+        model_name = TONGYI_WRITER_MODEL.get("model-name")
+        return model_client_registry.get_or_create(
+            "tongyi", model_name, "writer",
+            lambda: ChatTongyi(model=model_name,
+                               api_key=TONGYI_WRITER_MODEL.get("api-key"),
+                               temperature=0))
 
 
 class DeepSeekModel(BaseModel):
     """ 深度求索模型 """
 
     def get_reasoner_model(self):
-        return ChatDeepSeek(model=DEEPSEEK_PLANNER_MODEL.get("model-name"),
-                            api_key=DEEPSEEK_PLANNER_MODEL.get("api-key"),
-                            api_base=DEEPSEEK_PLANNER_MODEL.get("base-url"),
-                            temperature=0)
+        return pooled_chat_deepseek("deepseek", "reasoner", DEEPSEEK_PLANNER_MODEL)
+
+    async def astream(self, inputs):
+        async for chunk in self.get_reasoner_model().astream(inputs):
+            yield chunk
+
+    def get_model_name(self, role: str = "writer") -> str:
+        return (DEEPSEEK_PLANNER_MODEL if role == "reasoner" else DEEPSEEK_WRITER_MODEL).get("model-name")
+
+    def get_model(self):
+        return pooled_chat_deepseek("deepseek", "writer", DEEPSEEK_WRITER_MODEL)
+
+
+class MockModel(BaseModel):
+    """ 离线模拟的大模型，用于无网络的端到端基准测试 """
+
+    def get_reasoner_model(self):
+        return model_client_registry.get_or_create("mock", MOCK_MODEL.get("model-name"), "reasoner",
+                                                   lambda: MockChatModel(role="reasoner"))
 
-    async def stream(self, inputs):
-        yield self.get_reasoner_model().stream(inputs)
+    def get_model_name(self, role: str = "writer") -> str:
+        return MOCK_MODEL.get("model-name")
 
     def get_model(self):
-        return ChatDeepSeek(model=DEEPSEEK_WRITER_MODEL.get("model-name"),
-                            api_key=DEEPSEEK_WRITER_MODEL.get("api-key"),
-                            api_base=DEEPSEEK_WRITER_MODEL.get("base-url"),
-                            temperature=0)
+        return model_client_registry.get_or_create("mock", MOCK_MODEL.get("model-name"), "writer",
+                                                   lambda: MockChatModel(role="writer"))
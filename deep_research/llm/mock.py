@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import Field
+
+from deep_research.config.application_project import MOCK_MODEL, NUMBER_OF_QUERIES
+from deep_research.state import Queries, Sections, Feedback, Section, SearchQuery
+from deep_research.tokenizer import estimate_tokens
+
+
+def sample_latency(spec: dict, rng: random.Random) -> float:
+    """ 按配置的延迟分布采样耗时（秒） """
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "fixed":
+        return spec.get("value", 0.0)
+    elif distribution == "uniform":
+        return rng.uniform(spec.get("low", 0.0), spec.get("high", 0.0))
+    elif distribution == "lognormal":
+        return rng.lognormvariate(math.log(spec.get("median")), spec.get("sigma", 0.0))
+    else:
+        raise ValueError(f"不支持此延迟分布(distribution): {distribution}，请检查")
+
+
+class MockChatModel(BaseChatModel):
+    """
+    离线模拟的大模型，无需网络与 api-key
+    1. 首个 token 的耗时按配置的延迟分布采样，之后按 tokens-per-second 的速度流式输出
+    2. 深度思考模型（reasoner）先通过 additional_kwargs.reasoning_content 输出思维链，再输出 json
+    3. 根据 prompt 返回预置的结构化结果：报告计划（Sections）、联网搜索查询（Queries）、章节评估（Feedback）
+    4. 返回估算的 token 用量（usage_metadata），与真实模型一样触发 langchain 回调
+    5. 模拟模型服务的前缀缓存（prefix-cache），命中的 token 数写入 usage_metadata.input_token_details.cache_read
+    """
+
+    model_name: str = MOCK_MODEL.get("model-name")
+    role: str = "writer"
+    config: dict = Field(default_factory=lambda: MOCK_MODEL)
+    rng: Any = Field(default_factory=lambda: _random, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+    def with_structured_output(self, schema, **kwargs):
+        """ 结构化输出：模型输出预置结构化结果的 json，再解析为对应的结构 """
+        return self.bind(structured_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content))
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        reasoning, content = self._respond(messages, kwargs.get("structured_schema"))
+        time.sleep(self._generation_seconds(reasoning + content))
+        return self._to_result(messages, reasoning, content)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        reasoning, content = self._respond(messages, kwargs.get("structured_schema"))
+        await asyncio.sleep(self._generation_seconds(reasoning + content))
+        return self._to_result(messages, reasoning, content)
+
+    def _stream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        reasoning, content = self._respond(messages, kwargs.get("structured_schema"))
+        time.sleep(sample_latency(self.config.get("first-token-latency"), self.rng))
+        for chunk, delay in self._chunks(messages, reasoning, content):
+            time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        reasoning, content = self._respond(messages, kwargs.get("structured_schema"))
+        await asyncio.sleep(sample_latency(self.config.get("first-token-latency"), self.rng))
+        for chunk, delay in self._chunks(messages, reasoning, content):
+            await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    def _chunks(self, messages: list[BaseMessage], reasoning: str, content: str):
+        """ 按 chunk-tokens 切分流式分块，返回 (分块, 生成该分块的耗时) """
+        size = self.config.get("chunk-tokens")
+        seconds_per_token = 1 / self._tokens_per_second()
+        for begin in range(0, len(reasoning), size):
+            text = reasoning[begin:begin + size]
+            yield (ChatGenerationChunk(message=AIMessageChunk(content="", additional_kwargs={"reasoning_content": text})),
+                   estimate_tokens(text) * seconds_per_token)
+        for begin in range(0, len(content), size):
+            text = content[begin:begin + size]
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text)), estimate_tokens(text) * seconds_per_token
+        # 最后一个分块携带 token 用量
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(messages, reasoning, content))), 0.0
+
+    def _respond(self, messages: list[BaseMessage], structured_schema=None) -> tuple[str, str]:
+        """ 生成 (思维链, 正文)，深度思考模型输出报告计划或章节评估的 json，撰写模型输出章节正文 """
+        if structured_schema is not None:
+            return "", self._structured_result(structured_schema, messages).model_dump_json()
+        if self.role != "reasoner":
+            return "", self._section_content(messages)
+        reasoning = "模拟思考" * (self.config.get("reasoning-tokens") // 4)
+        schema = Sections if "sections" in _prompt_text(messages) else Feedback
+        return reasoning, self._structured_result(schema, messages).model_dump_json()
+
+    def _structured_result(self, schema, messages: list[BaseMessage]):
+        digest = hashlib.sha256(_prompt_text(messages).encode("utf-8")).hexdigest()[:8]
+        if schema is Queries:
+            return Queries(queries=[SearchQuery(search_query=f"模拟查询 {digest} 第{idx}个")
+                                    for idx in range(1, NUMBER_OF_QUERIES + 1)])
+        if schema is Sections:
+            research_sections = [Section(name=f"研究章节{idx}", description=f"模拟研究主题{idx}号",
+                                         research=True, content="")
+                                 for idx in range(1, self.config.get("research-sections") + 1)]
+            return Sections(sections=[Section(name="简介", description="主题领域的简要概述", research=False, content=""),
+                                      *research_sections,
+                                      Section(name="结论", description="报告的简明摘要", research=False, content="")])
+        if schema is Feedback:
+            if self.rng.random() < self.config.get("fail-rate"):
+                return Feedback(grade="fail", follow_up_queries=[
+                    SearchQuery(search_query=f"模拟追加查询 {digest} 第{idx}个")
+                    for idx in range(1, NUMBER_OF_QUERIES + 1)])
+            return Feedback(grade="pass", follow_up_queries=[])
+        raise ValueError(f"离线模拟的大模型不支持此结构化输出: {schema}")
+
+    def _section_content(self, messages: list[BaseMessage]) -> str:
+        sentence = "这是离线模拟生成的章节正文内容。"
+        repeat = max(self.config.get("content-tokens") // len(sentence), 1)
+        return "## 模拟章节\n\n" + sentence * repeat
+
+    def _generation_seconds(self, text: str) -> float:
+        return (sample_latency(self.config.get("first-token-latency"), self.rng)
+                + estimate_tokens(text) / self._tokens_per_second())
+
+    def _tokens_per_second(self) -> float:
+        return self.config.get("tokens-per-second").get(self.role)
+
+    def _usage(self, messages: list[BaseMessage], reasoning: str, content: str) -> dict:
+        input_tokens = estimate_tokens(_prompt_text(messages))
+        output_tokens = estimate_tokens(reasoning + content)
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+        if self.config.get("prefix-cache"):
+            usage["input_token_details"] = {"cache_read": min(_cached_prefix_tokens(messages), input_tokens)}
+        return usage
+
+    def _to_result(self, messages: list[BaseMessage], reasoning: str, content: str) -> ChatResult:
+        message = AIMessage(content=content,
+                            additional_kwargs={"reasoning_content": reasoning} if reasoning else {},
+                            usage_metadata=self._usage(messages, reasoning, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _cached_prefix_tokens(messages) -> int:
+    """ 按消息粒度模拟前缀缓存：从第一条消息开始，与之前的请求完全相同的连续前缀消息计为命中缓存 """
+    if isinstance(messages, str):
+        return 0
+    cached = 0
+    hit = True
+    digest = hashlib.sha256()
+    with _prefix_lock:
+        for message in messages:
+            digest.update(f"{message.type}\n{message.content}\0".encode("utf-8"))
+            key = digest.hexdigest()
+            if hit and key in _prefixes:
+                cached += estimate_tokens(str(message.content))
+                _prefixes.move_to_end(key)
+            else:
+                hit = False
+                _prefixes[key] = None
+        while len(_prefixes) > _MAX_PREFIXES:
+            _prefixes.popitem(last=False)
+    return cached
+
+
+# 模拟的前缀缓存：前缀哈希，按最近访问淘汰
+_MAX_PREFIXES = 4096
+_prefixes = OrderedDict()
+_prefix_lock = threading.Lock()
+
+# 进程内共享的随机数生成器，设置 seed 后每次运行的延迟与评估结果一致
+_random = random.Random(MOCK_MODEL.get("seed"))
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+from typing import Callable
+
+import httpx
+
+from deep_research.config.application_project import MODEL_HTTP_POOL
+
+
+class ConnectionStats:
+    """
+    模型客户端的 HTTP 连接统计
+    通过 httpcore 的 trace 扩展统计新建的 TCP 连接数，请求数减去新建连接数即为复用的 keep-alive 连接数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.opened = 0
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def on_trace(self, event_name: str):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.opened += 1
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.opened, 0)
+
+    def to_dict(self) -> dict:
+        return {"requests": self.requests, "opened": self.opened, "reused": self.reused}
+
+
+class ModelClientRegistry:
+    """
+    进程级别的模型客户端注册表
+    1. 按 (provider, model, role) 缓存大模型客户端，避免每次节点调度都重新创建客户端
+    2. 按 base_url 共享 keep-alive 的 HTTP 连接池，连接池上限由 MODEL_HTTP_POOL 配置
+    3. 首次获取时才创建（懒加载），进程退出时统一关闭连接池
+
+    httpx.AsyncClient 的连接只能在创建它的事件循环中使用，因此异步连接池与依赖它的模型客户端均按事件循环隔离
+    """
+
+    def __init__(self, pool_config: dict):
+        self.pool_config = pool_config
+        self.stats = ConnectionStats()
+        # 创建模型客户端时会再次获取连接池，因此使用可重入锁
+        self._lock = threading.RLock()
+        self._models = {}
+        self._sync_clients = {}
+        self._async_clients = {}
+
+    def get_or_create(self, provider: str, model_name: str, role: str, factory: Callable):
+        """ 获取（或懒加载创建）模型客户端 """
+        key = (provider, model_name, role, self._loop_key())
+        with self._lock:
+            self._discard_closed_loops()
+            model = self._models.get(key)
+            if model is None:
+                model = factory()
+                self._models[key] = model
+            return model
+
+    def http_client(self, base_url: str) -> httpx.Client:
+        """ 获取指定 base_url 共享的同步连接池 """
+        with self._lock:
+            client = self._sync_clients.get(base_url)
+            if client is None:
+                client = httpx.Client(limits=self._limits(),
+                                      timeout=self.pool_config.get("timeout"),
+                                      event_hooks={"request": [self._trace_sync_request]})
+                self._sync_clients[base_url] = client
+            return client
+
+    def http_async_client(self, base_url: str) -> httpx.AsyncClient:
+        """ 获取指定 base_url 在当前事件循环中共享的异步连接池 """
+        key = (base_url, self._loop_key())
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = httpx.AsyncClient(limits=self._limits(),
+                                           timeout=self.pool_config.get("timeout"),
+                                           event_hooks={"request": [self._trace_async_request]})
+                self._async_clients[key] = client
+            return client
+
+    def connection_stats(self) -> dict:
+        """ 获取连接复用情况 以及当前缓存的客户端个数 """
+        return {**self.stats.to_dict(), "models": len(self._models),
+                "pools": len(self._sync_clients) + len(self._async_clients)}
+
+    async def aclose(self):
+        """ 在事件循环中关闭当前事件循环的异步连接池 以及所有同步连接池 """
+        loop_key = self._loop_key()
+        with self._lock:
+            async_clients = [client for (_, key), client in self._async_clients.items() if key == loop_key]
+            self._async_clients = {key: client for key, client in self._async_clients.items()
+                                   if key[1] != loop_key}
+            self._models = {key: model for key, model in self._models.items() if key[3] != loop_key}
+        for client in async_clients:
+            await client.aclose()
+        self.close()
+
+    def close(self):
+        """ 进程退出时关闭连接池，已关闭事件循环中的异步连接池 随事件循环一起释放 """
+        with self._lock:
+            sync_clients = list(self._sync_clients.values())
+            self._sync_clients.clear()
+            self._discard_closed_loops()
+        for client in sync_clients:
+            client.close()
+        print(f"模型客户端连接池已关闭，连接统计：{self.connection_stats()}")
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.pool_config.get("max-connections"),
+                            max_keepalive_connections=self.pool_config.get("max-keepalive-connections"),
+                            keepalive_expiry=self.pool_config.get("keepalive-expiry"))
+
+    def _trace_sync_request(self, request: httpx.Request):
+        self.stats.on_request()
+
+        def trace(event_name, info):
+            self.stats.on_trace(event_name)
+
+        request.extensions["trace"] = trace
+
+    async def _trace_async_request(self, request: httpx.Request):
+        self.stats.on_request()
+
+        async def trace(event_name, info):
+            self.stats.on_trace(event_name)
+
+        request.extensions["trace"] = trace
+
+    def _discard_closed_loops(self):
+        """ 丢弃已关闭事件循环中的客户端，其连接已不可用 """
+        closed = {key for key, loop in _loops.items() if loop.is_closed()}
+        if not closed:
+            return
+        self._models = {key: model for key, model in self._models.items() if key[3] not in closed}
+        self._async_clients = {key: client for key, client in self._async_clients.items() if key[1] not in closed}
+        for key in closed:
+            _loops.pop(key, None)
+
+    @staticmethod
+    def _loop_key():
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        _loops.setdefault(id(loop), loop)
+        return id(loop)
+
+
+# 事件循环 id => 事件循环，用于判断事件循环是否已关闭
+_loops = {}
+
+# 全局共享的模型客户端注册表
+model_client_registry = ModelClientRegistry(MODEL_HTTP_POOL)
@@ -0,0 +1,207 @@
+import asyncio
+import collections
+import threading
+import time
+from typing import Optional
+
+from deep_research.admission import admission_controller
+from deep_research.config.application_project import MODEL_ROUTING
+from deep_research.tracing import current_span
+
+
+class ModelCandidate:
+    """ 路由中的一个候选模型 """
+
+    def __init__(self, provider: str, model_name: str, model):
+        self.provider = provider
+        self.model_name = model_name
+        self.model = model
+
+
+class LatencyTracker:
+    """
+    记录各 (节点, 角色, 调用方式, 模型服务提供商) 最近的调用耗时，用于计算对冲请求的等待时间
+    流式调用记录首个分块的耗时，非流式调用记录完整的调用耗时
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, key: tuple, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, collections.deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: tuple, ratio: float, min_samples: int) -> Optional[float]:
+        """ 样本数不足 min_samples 时返回 None """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * ratio), len(samples) - 1)]
+
+
+class RoutedModel:
+    """
+    按节点路由的大模型，支持 ainvoke / astream / with_structured_output
+    1. 降级：候选模型按顺序调用，出错或超时（流式调用为首个分块超时）时切换到下一个候选模型
+    2. 对冲请求（可选）：当前候选模型超过历史 p95 耗时仍未返回时，向下一个候选模型发送相同的请求，采用先返回的结果，
+       另一个请求直接取消；流式调用以首个分块为准，之后只读取先返回首个分块的流
+    3. 准入控制：每次调用先向准入控制器申请 (模型服务提供商, 角色) 的在途名额，流式调用读取结束后才归还，
+       超时时间从获得名额后开始计算，排队时间不计入超时
+    """
+
+    def __init__(self, node_name: str, role: str, candidates: list[ModelCandidate], timeout: Optional[float],
+                 hedging: bool):
+        self.node_name = node_name
+        self.role = role
+        self.candidates = candidates
+        self.timeout = timeout
+        self.hedging = hedging
+
+    def with_structured_output(self, schema, **kwargs):
+        """ 各候选模型分别设置结构化输出 """
+        return RoutedModel(self.node_name, self.role,
+                           [ModelCandidate(candidate.provider, candidate.model_name,
+                                           candidate.model.with_structured_output(schema, **kwargs))
+                            for candidate in self.candidates],
+                           self.timeout, self.hedging)
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        async def call(candidate: ModelCandidate):
+            async with admission_controller.llm(candidate.provider, self.role).slot():
+                return await asyncio.wait_for(candidate.model.ainvoke(inputs, config, **kwargs), self.timeout)
+
+        return await self._race("invoke", call)
+
+    async def astream(self, inputs, config=None, **kwargs):
+        async def first_chunk(candidate: ModelCandidate):
+            iterator = self._admitted_stream(candidate, inputs, config, **kwargs).__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+            except BaseException:
+                await _close(iterator)
+                raise
+
+        iterator, chunk = await self._race("stream", first_chunk, on_discard=lambda result: _close(result[0]))
+        if chunk is None:
+            return
+        yield chunk
+        try:
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await _close(iterator)
+
+    async def _admitted_stream(self, candidate: ModelCandidate, inputs, config, **kwargs):
+        """ 获得在途名额后开始流式调用，首个分块超时抛出 asyncio.TimeoutError """
+        async with admission_controller.llm(candidate.provider, self.role).slot():
+            iterator = candidate.model.astream(inputs, config, **kwargs).__aiter__()
+            try:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+                async for chunk in iterator:
+                    yield chunk
+            finally:
+                await _close(iterator)
+
+    async def _race(self, kind: str, call, on_discard=None):
+        """
+        按顺序调用候选模型，返回第一个成功的结果
+        开启对冲请求时，当前候选模型超过等待时间仍未返回，则同时调用下一个候选模型
+        """
+        span = current_span()
+        pending = {}
+        next_idx = 0
+        errors = []
+
+        def launch():
+            nonlocal next_idx
+            candidate = self.candidates[next_idx]
+            next_idx += 1
+            task = asyncio.create_task(call(candidate))
+            pending[task] = (candidate, time.perf_counter())
+
+        launch()
+        try:
+            while pending:
+                wait_seconds = None
+                # 同一时刻最多只有一个对冲请求
+                if self.hedging and next_idx < len(self.candidates) and len(pending) == 1:
+                    primary, started = next(iter(pending.values()))
+                    wait_seconds = max(self._hedge_delay(kind, primary) - (time.perf_counter() - started), 0.0)
+                done, _ = await asyncio.wait(pending, timeout=wait_seconds, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过对冲等待时间仍未返回，向下一个候选模型发送相同的请求
+                    print(f"节点 [{self.node_name}] 模型 [{primary.model_name}] 超过对冲等待时间，"
+                          f"同时请求 [{self.candidates[next_idx].model_name}]")
+                    if span is not None:
+                        span.llm_hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    candidate, started = pending.pop(task)
+                    if task.exception() is None:
+                        latency_tracker.observe(self._latency_key(kind, candidate), time.perf_counter() - started)
+                        if span is not None and candidate is not self.candidates[0]:
+                            if errors:
+                                span.llm_fallbacks += 1
+                            else:
+                                span.llm_hedge_wins += 1
+                        # 仍未返回的请求按已等待的时间记录耗时（实际耗时只会更长），避免分位数只统计较快的请求
+                        for other_candidate, other_started in pending.values():
+                            latency_tracker.observe(self._latency_key(kind, other_candidate),
+                                                    time.perf_counter() - other_started)
+                        # 同时完成的其他请求直接丢弃
+                        for other in done - {task}:
+                            pending.pop(other, None)
+                            if on_discard is not None and not other.cancelled() and other.exception() is None:
+                                await on_discard(other.result())
+                        return task.result()
+                    error = task.exception()
+                    errors.append(error)
+                    reason = "超时" if isinstance(error, asyncio.TimeoutError) else f"出错：{error}"
+                    print(f"节点 [{self.node_name}] 模型 [{candidate.model_name}] {reason}")
+                if not pending and next_idx < len(self.candidates):
+                    print(f"节点 [{self.node_name}] 降级到模型 [{self.candidates[next_idx].model_name}]")
+                    launch()
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    result = await task
+                except BaseException:
+                    continue
+                if on_discard is not None:
+                    await on_discard(result)
+
+    def _hedge_delay(self, kind: str, candidate: ModelCandidate) -> float:
+        hedging = MODEL_ROUTING.get("hedging")
+        delay = latency_tracker.percentile(self._latency_key(kind, candidate), hedging.get("percentile"),
+                                           hedging.get("min-samples"))
+        if delay is None:
+            return hedging.get("default-delay")
+        return max(delay, hedging.get("min-delay"))
+
+    def _latency_key(self, kind: str, candidate: ModelCandidate) -> tuple:
+        return self.node_name, self.role, kind, candidate.provider
+
+
+async def _close(iterator):
+    try:
+        await iterator.aclose()
+    except Exception:
+        pass
+
+
+# 进程内共享的调用耗时统计
+latency_tracker = LatencyTracker(MODEL_ROUTING.get("hedging").get("window"))
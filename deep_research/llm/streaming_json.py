@@ -0,0 +1,66 @@
+import json
+
+
+class StreamingArrayParser:
+    """
+    增量解析大模型流式输出的 json，每当根对象中第一个数组（如 {"sections": [...]}）的元素对象完整输出时立即返回
+    1. 只扫描新输出的字符，记录括号层级以及是否处于字符串内（字符串中的括号与转义字符不影响层级）
+    2. 根对象之前的内容（如 ```json）直接忽略
+    3. 元素对象解析失败时跳过，最终结果仍以完整输出的解析为准
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        # 当前的括号栈，如 ['{', '[', '{']
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        # 当前元素对象的起始位置
+        self._item_begin = None
+        # 已经完成扫描的第一个数组之后不再返回元素
+        self._array_closed = False
+
+    def feed(self, text: str) -> list[dict]:
+        """ 输入新输出的文本，返回本次完整输出的元素对象 """
+        self._text += text
+        items = []
+        for position in range(self._position, len(self._text)):
+            char = self._text[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._is_array_item_level():
+                    self._item_begin = position
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._item_begin is not None and self._is_array_item_level():
+                    item = self._parse(self._text[self._item_begin:position + 1])
+                    self._item_begin = None
+                    if item is not None:
+                        items.append(item)
+                elif char == "]" and self._stack == ["{"]:
+                    self._array_closed = True
+        self._position = len(self._text)
+        return items
+
+    def _is_array_item_level(self) -> bool:
+        return not self._array_closed and self._stack == ["{", "["]
+
+    @staticmethod
+    def _parse(text: str):
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
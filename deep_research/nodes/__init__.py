@@ -3,10 +3,16 @@ from abc import ABC, abstractmethod
 from langchain_core.runnables import RunnableConfig
 
 from deep_research.state import ReportState, SectionState
+from deep_research.tracing import trace_node
 
 
 class BaseNode(ABC):
-    """ 报告流程节点 基类 """
+    """ 报告流程节点 基类，子类的 ainvoke 会自动包装追踪（耗时、token 用量、联网搜索指标） """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "ainvoke" in cls.__dict__:
+            cls.ainvoke = trace_node(cls.ainvoke)
 
     @abstractmethod
     def get_node_name(self) -> str:
@@ -20,7 +26,12 @@ class BaseNode(ABC):
 
 
 class BaseSectionNode(ABC):
-    """ 章节流程节点 基类 """
+    """ 章节流程节点 基类，子类的 ainvoke 会自动包装追踪（耗时、token 用量、联网搜索指标） """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "ainvoke" in cls.__dict__:
+            cls.ainvoke = trace_node(cls.ainvoke)
 
     @abstractmethod
     def get_node_name(self) -> str:
@@ -1,18 +1,43 @@
 from typing import Literal
 
-import chainlit as cl
-from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.types import Command, Send
+from pydantic import ValidationError
 
-from deep_research.config.application_project import REPORT_STRUCTURE, NUMBER_OF_QUERIES
+from deep_research.admission import admission_controller
+from deep_research.config.application_project import SECTION_DIGEST
+from deep_research.digest import report_digest
+from deep_research.events import get_event_sink
+from deep_research.llm.cache import cached_structured_invoke
 from deep_research.llm.llm import ModelRouter
+from deep_research.llm.streaming_json import StreamingArrayParser
 from deep_research.nodes import BaseNode
-from deep_research.prompts import REPORT_PLANNER_QUERY_WRITER_PROMPT, REPORT_PLANNER_PROMPT
-from deep_research.state import ReportState, Queries
-from deep_research.utils import to_sections, format_sections, now, \
-    web_search
+from deep_research.nodes.section_nodes import SpeculativeResearchNode
+from deep_research.prompts import REPORT_PLANNER_QUERY_WRITER, REPORT_PLANNER
+from deep_research.state import ReportState, Queries, Section
+from deep_research.search.dedup import deduplicate_sources
+from deep_research.search.evidence import get_evidence_pool, release_evidence_pool
+from deep_research.search.speculative import get_speculative_research, release_speculative_research, \
+    speculative_research_enabled
+from deep_research.utils import to_sections, format_sections, now, format_sources
+
+
+def start_speculative_research(topic: str, sections: list[Section], config: RunnableConfig):
+    """ 为需要研究的章节启动预研究，已完成或正在进行的相同章节不重复启动 """
+    get_speculative_research(config).start(topic, sections, lambda section: SpeculativeResearchNode().ainvoke(
+        {"topic": topic, "section": section, "search_iterations": 0}, config))
+
+
+def _to_sections(items: list[dict]) -> list[Section]:
+    """ 流式解析出的章节对象转换为 Section，字段不完整的跳过 """
+    sections = []
+    for item in items:
+        try:
+            sections.append(Section(**{**item, "content": item.get("content") or ""}))
+        except ValidationError:
+            continue
+    return sections
 
 
 class GenerateReportPlanNode(BaseNode):
@@ -31,34 +56,26 @@ class GenerateReportPlanNode(BaseNode):
         return "generate_report_plan"
 
     async def ainvoke(self, state: ReportState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         # 获取状态机 相关属性
         topic = state["topic"]
         feedback = state.get("feedback_on_report_plan", None)
+        if feedback is None:
+            # 新的报告：系统过载且过载策略为 reject 时直接拒绝，已开始的报告根据反馈重新规划时不受影响
+            admission_controller.admit_report(config.get("configurable", {}).get("thread_id"))
 
-        report_structure = REPORT_STRUCTURE
-
-        writer_model = ModelRouter().get_model()
-        # 设置生成联网搜索查询的 system prompt
-        generate_query_system_prompt = REPORT_PLANNER_QUERY_WRITER_PROMPT.format(topic=topic,
-                                                                                 report_organization=report_structure,
-                                                                                 number_of_queries=NUMBER_OF_QUERIES,
-                                                                                 now=now())
-
-        # 设置生成联网搜索查询的 user prompt
-        generate_query_user_prompt = "生成有助于规划报告章节的搜索查询"
-
-        # 设置模型结构化输出
-        query_structured_llm = writer_model.with_structured_output(Queries)
+        model_router = ModelRouter(self.get_node_name())
+        writer_model = model_router.get_model()
+        # 生成联网搜索查询的 prompt：静态指令（含报告组织结构）在前，主题与日期在后
+        generate_query_prompts = REPORT_PLANNER_QUERY_WRITER.messages(topic=topic, now=now())
 
-        async with cl.Step(name="生成报告规划联网搜索查询",
-                           default_open=True) as query_step:
+        async with event_sink.step(name="生成报告规划联网搜索查询",
+                                   default_open=True) as query_step:
             query_step.input = topic
 
-            # 调用大模型 用于生成联网搜索查询列表
-            results = query_structured_llm.invoke([
-                SystemMessage(content=generate_query_system_prompt),
-                HumanMessage(content=generate_query_user_prompt)
-            ])
+            # 调用大模型 用于生成联网搜索查询列表（相同或相近的主题直接复用缓存的查询）
+            results = await cached_structured_invoke(self.get_node_name(), model_router.get_model_name(),
+                                                     writer_model, Queries, generate_query_prompts, [topic], config)
 
             # 进行联网搜索
             query_list = [query.search_query for query in results.queries]
@@ -67,63 +84,64 @@ class GenerateReportPlanNode(BaseNode):
             print(f"规划报告联网搜索查询：\n{queries_str}")
             query_step.output = f"规划报告联网搜索查询：\n{queries_str}"
 
-        async with cl.Step(name="报告规划联网搜索",
-                           default_open=True) as search_step:
+        async with event_sink.step(name="报告规划联网搜索",
+                                   default_open=True) as search_step:
             search_step.input = queries_str
-            # 使用联网搜索
-            source_str = await web_search(query for query in query_list)
+            # 使用联网搜索，搜索结果写入报告级别的证据池，供后续章节复用
+            sources = await get_evidence_pool(config).search(query_list, config, self.get_node_name())
+            unique_sources, _ = deduplicate_sources(sources)
+            source_str = "内容来源:\n" + format_sources(unique_sources)
             # 将检索结果 返回给前端展示
             search_step.output = f"规划报告联网搜索结果：\n\n{source_str}"
 
-        # 设置规划的 user prompt
-        planner_user_prompt = """请生成报告的各章节。您的响应json最外层包含一个“sections”字段，该字段包含一个章节列表。
-                                每个章节必须包含：名称（name）、描述(description)、研究(research)和内容(content)字段。
-                                """
-
-        # 设置报告规划的system prompt
-        planner_system_prompt = REPORT_PLANNER_PROMPT.format(topic=topic,
-                                                             report_organization=report_structure,
-                                                             context=source_str,
-                                                             feedback=feedback,
-                                                             now=now(),
-                                                             )
+        # 设置报告规划的 prompt：规划要求与输出格式在前，主题、反馈与联网搜索结果在后
+        prompts = REPORT_PLANNER.messages(topic=topic, feedback=feedback, context=source_str, now=now())
 
         # 初始化 规划大模型
-        planner_llm = ModelRouter().get_reasoner_model()
+        planner_llm = ModelRouter(self.get_node_name()).get_reasoner_model()
 
         sections_json_str = ""
         begin = False
-        async with cl.Step(name="报告规划深度思考",
-                           default_open=True) as deep_step:
-            # 这里进行简单的流式输出 展示思维链过程
-            prompts = [
-                SystemMessage(content=planner_system_prompt),
-                HumanMessage(content=planner_user_prompt)
-            ]
-            for chunk in planner_llm.stream(prompts):
-                if chunk.additional_kwargs.get("reasoning_content", ""):
-                    await deep_step.stream_token(chunk.additional_kwargs["reasoning_content"])
-                else:
-                    if not begin and chunk.content:
-                        await deep_step.stream_token("\n\n")
-                    if chunk.content:
-                        begin = True
-                        await deep_step.stream_token(chunk.content)
-                        sections_json_str += chunk.content
-
-        chain = JsonOutputParser() | to_sections
-        report_sections = chain.invoke(sections_json_str)
+        speculative = speculative_research_enabled(config)
+        sections_parser = StreamingArrayParser()
+        try:
+            async with event_sink.step(name="报告规划深度思考",
+                                       default_open=True) as deep_step:
+                # 这里进行简单的流式输出 展示思维链过程
+                async for chunk in planner_llm.astream(prompts):
+                    if chunk.additional_kwargs.get("reasoning_content", ""):
+                        await deep_step.stream_token(chunk.additional_kwargs["reasoning_content"])
+                    else:
+                        if not begin and chunk.content:
+                            await deep_step.stream_token("\n\n")
+                        if chunk.content:
+                            begin = True
+                            await deep_step.stream_token(chunk.content)
+                            sections_json_str += chunk.content
+                            # 开启预研究时，章节一旦完整输出就开始预研究，与报告规划剩余内容的生成重叠
+                            if speculative:
+                                start_speculative_research(topic,
+                                                           _to_sections(sections_parser.feed(chunk.content)),
+                                                           config)
+
+            chain = JsonOutputParser() | to_sections
+            report_sections = chain.invoke(sections_json_str)
+        except BaseException:
+            # 报告规划生成失败（包括输出无法解析）或被取消时，取消已经启动的预研究
+            if speculative:
+                get_speculative_research(config).cancel_pending()
+            raise
         # 因为deepseek-r1不支持function calling 需要使用prompt来完善
         # planner_chain = planner_llm | JsonOutputParser() | to_sections
         # structured_planner_llm = planner_llm.with_structured_output(Sections)
-        # report_sections = await planner_chain.ainvoke([
-        #     SystemMessage(content=planner_system_prompt),
-        #     HumanMessage(content=planner_user_prompt)
-        # ])
+        # report_sections = await planner_chain.ainvoke(prompts)
 
         sections = report_sections.sections
+        if speculative:
+            # 以完整解析的报告计划为准，取消不在报告计划中的预研究
+            get_speculative_research(config).cancel_pending(topic, keep=sections)
 
-        async with cl.Step(name="生成报告规划大纲") as report_step:
+        async with event_sink.step(name="生成报告规划大纲") as report_step:
             # 将生成的章节内容进行展示
             sections_str = "\n\n".join(
                 f"章节: {section.name}\n"
@@ -131,7 +149,7 @@ class GenerateReportPlanNode(BaseNode):
                 f"是否需要进行研究: {'Yes' if section.research else 'No'}\n"
                 for section in sections
             )
-            await cl.Message(content=f"规划报告大纲：\n{sections_str}").send()
+            await event_sink.send_message(f"规划报告大纲：\n{sections_str}")
 
         # 添加到状态机中
         return {"sections": sections}
@@ -161,23 +179,30 @@ class HumanFeedbackNode(BaseNode):
     async def ainvoke(self, state: ReportState, config: RunnableConfig) -> Command[
         Literal["generate_report_plan", "build_section_with_web_research"]]:
 
+        event_sink = get_event_sink(config)
         topic = state["topic"]
         sections = state["sections"]
 
-        async with cl.Step(name="用户反馈",
-                           default_open=True) as feedback_step:
+        # 开启预研究时，等待用户确认期间提前研究需要研究的章节
+        speculative_research = get_speculative_research(config)
+        if speculative_research_enabled(config):
+            start_speculative_research(topic, sections, config)
+
+        async with event_sink.step(name="用户反馈",
+                                   default_open=True) as feedback_step:
             # 中断消息 提供给用户进一步审查 然后提供反馈建议
             interrupt_message = f"""请对报告计划提供反馈：
                             \n该报告计划是否符合您的需求？\n如果通过，请输入 'true' 以批准该报告计划。\n或者，提供反馈以重新生成报告计划：
                         """
-            resp = await cl.AskUserMessage(content=interrupt_message, timeout=60 * 5).send()
-            feedback = resp['output']
+            feedback = await event_sink.ask_user(interrupt_message, timeout=60 * 5)
             feedback_step.output = f"用户反馈已完成 => {feedback}"
 
+        if not (isinstance(feedback, bool) and feedback is True) and feedback not in ('true', 'True'):
+            # 用户未批准报告计划，取消未完成的预研究，已完成的预研究在重新生成的报告计划中仍然一致时直接复用
+            speculative_research.cancel_pending()
+
         if not feedback:
-            await cl.Message(
-                content=f"服务错误了，因为你提供的{feedback}不合法",
-            ).send()
+            await event_sink.send_message(f"服务错误了，因为你提供的{feedback}不合法")
             raise TypeError("提供反馈的信息不完整或者类型不被支持！")
         else:
             if (isinstance(feedback, bool) and feedback is True) or (
@@ -213,13 +238,31 @@ class GatherCompletedSectionsNode(BaseNode):
         return "gather_completed_sections"
 
     async def ainvoke(self, state: ReportState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         completed_sections = state["completed_sections"]
-        # 对章节进行格式化 返回一个最终的字符串
-        completed_report_sections = format_sections(completed_sections)
-        async with cl.Step(name="格式化所有章节内容",
-                           default_open=True) as gather_step:
+        if SECTION_DIGEST.get("mode") == "full":
+            # 对章节进行格式化 返回一个最终的字符串
+            completed_report_sections = format_sections(completed_sections)
+        else:
+            # 按报告计划的顺序汇总章节摘要，长度不随章节数增长
+            completed = {section.name: section for section in completed_sections}
+            completed_report_sections = report_digest(
+                [completed[section.name] for section in state["sections"] if section.name in completed],
+                {digest["name"]: digest["digest"] for digest in state.get("section_digests") or []},
+                SECTION_DIGEST.get("section-budget"), SECTION_DIGEST.get("report-budget"))
+        async with event_sink.step(name="格式化所有章节内容",
+                                   default_open=True) as gather_step:
             gather_step.output = completed_report_sections
 
+        evidence_stats = get_evidence_pool(config).stats()
+        print(f"报告证据池复用统计：{evidence_stats}")
+        async with event_sink.step(name="报告证据池复用统计") as evidence_step:
+            evidence_step.output = (f"查询总数：{evidence_stats['requested_queries']}，"
+                                    f"实际联网搜索：{evidence_stats['searched_queries']}，"
+                                    f"复用已有结果：{evidence_stats['reused_queries']}"
+                                    f"（其中等待搜索中的相同查询：{evidence_stats['joined_in_flight']}，"
+                                    f"跨章节复用：{evidence_stats['cross_section_reused']}）")
+
         return {"report_sections_from_research": completed_report_sections}
 
 
@@ -236,6 +279,7 @@ class CompileFinalReportNode(BaseNode):
         return "compile_final_report"
 
     async def ainvoke(self, state: ReportState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         sections = state["sections"]
         completed_sections = {s.name: s.content for s in state["completed_sections"]}
         for section in sections:
@@ -243,9 +287,15 @@ class CompileFinalReportNode(BaseNode):
 
         all_sections = "\n\n".join([s.content for s in sections])
         final_report = f"最终报告：\n{all_sections}"
+        # 报告已完成，释放报告级别的证据池与预研究
+        release_evidence_pool(config)
+        speculative_stats = get_speculative_research(config).stats()
+        if speculative_stats["started"]:
+            print(f"报告预研究统计：{speculative_stats}")
+        release_speculative_research(config)
         print(final_report)
-        async with cl.Step(name="生成最终报告") as final_step:
-            await cl.Message(content=final_report).send()
+        async with event_sink.step(name="生成最终报告") as final_step:
+            await event_sink.send_message(final_report)
 
         return {"final_report": all_sections}
 
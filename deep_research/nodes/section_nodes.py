@@ -1,30 +1,51 @@
 from typing import Literal
 
-import chainlit as cl
-from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.constants import END
 from langgraph.types import Command
 
-from deep_research.config.application_project import NUMBER_OF_QUERIES, MAX_SEARCH_DEPTH
+from deep_research.admission import admission_controller
+from deep_research.config.application_project import MAX_SEARCH_DEPTH, SECTION_DIGEST, VECTOR_INDEX
+from deep_research.digest import section_digest
+from deep_research.events import get_event_sink
+from deep_research.llm.cache import cached_structured_invoke
 from deep_research.llm.llm import ModelRouter
 from deep_research.nodes import BaseSectionNode
-from deep_research.prompts import QUERY_WRITER_PROMPT, SECTION_WRITER_INPUTS, SECTION_WRITER_USER_PROMPT, \
-    SECTION_GRADER_PROMPT, FINAL_SECTION_WRITER_PROMPT
-from deep_research.state import SectionState, Queries, NoResearchSectionState
-from deep_research.utils import web_search, to_feedback, now
+from deep_research.prompts import QUERY_WRITER, SECTION_WRITER, SECTION_GRADER, FINAL_SECTION_WRITER
+from deep_research.state import SectionState, Queries, NoResearchSectionState, Section
+from deep_research.search.cache import normalize_query
+from deep_research.search.dedup import merge_sources
+from deep_research.search.packer import pack_sources, context_token_budget
+from deep_research.search.query_dedup import deduplicate_queries
+from deep_research.search.evidence import get_evidence_pool
+from deep_research.search.speculative import get_speculative_research
+from deep_research.utils import format_sources, to_feedback, now
+
+
+async def generate_section_queries(topic: str, section: Section, config: RunnableConfig) -> Queries:
+    """ 调用大模型生成章节的联网搜索查询（相同或相近的主题与章节描述直接复用缓存的查询） """
+    # 模型路由与大模型响应缓存均按 generate_queries 节点配置
+    model_router = ModelRouter("generate_queries")
+    generate_query_llm = model_router.get_model()
+
+    # 生成当前章节的联网搜索查询的 prompt：静态指令在前，主题等可变内容在后
+    prompts = QUERY_WRITER.messages(topic=topic, section_topic=section.description, now=now())
+
+    return await cached_structured_invoke("generate_queries", model_router.get_model_name(), generate_query_llm,
+                                          Queries, prompts, [topic, section.description], config)
 
 
 class SectionStepNode(BaseSectionNode):
     """ 主要是为了结合chainlit 来生成 章节的step 根节点 """
 
     def get_node_name(self) -> str:
-        pass
+        return "init_section_step"
 
     async def ainvoke(self, state: SectionState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         section = state["section"]
-        async with cl.Step(name=f"章节 [{section.name}] 深度研究", default_open=True) as section_step:
+        async with event_sink.step(name=f"章节 [{section.name}] 深度研究", default_open=True) as section_step:
             pass
         return {"parent_step_id": section_step.id}
 
@@ -39,37 +60,41 @@ class GenerateQueriesNode(BaseSectionNode):
         return "generate_queries"
 
     async def ainvoke(self, state: SectionState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         topic = state["topic"]
         section = state["section"]
         parent_step_id = state["parent_step_id"]
 
-        generate_query_llm = ModelRouter().get_model()
+        # 报告计划确认期间已经完成（或正在进行）预研究的章节，直接采用预研究的查询，搜索结果从证据池复用
+        queries = await get_speculative_research(config).adopt(topic, section)
+        speculative = queries is not None
+        if not speculative:
+            queries = await generate_section_queries(topic, section, config)
+        query_str = "\n\n".join(query.search_query for query in queries.queries)
+        print(f"获取章节[{section.name}]检索查询：\n{query_str}")
+        async with event_sink.step(name=f"章节 [{section.name}] 生成联网搜索查询",
+                                   parent_id=parent_step_id) as generate_query_step:
+            generate_query_step.output = f"（采用报告计划确认期间的预研究结果）\n{query_str}" if speculative else query_str
 
-        structured_generate_query_llm = generate_query_llm.with_structured_output(Queries)
+        return {"search_queries": queries.queries}
 
-        # 设置生成当前章节的联网搜索查询的 system prompt
-        generate_section_query_system_prompt = QUERY_WRITER_PROMPT.format(topic=topic,
-                                                                          section_topic=section.description,
-                                                                          number_of_queries=NUMBER_OF_QUERIES,
-                                                                          now=now(),
-                                                                          )
-        # 设置生成当前章节的联网搜索查询的 user prompt
-        generate_section_query_user_prompt = "请生成关于所提供主题的联网搜索查询。"
 
-        prompts = [
-            SystemMessage(content=generate_section_query_system_prompt),
-            HumanMessage(content=generate_section_query_user_prompt)
-        ]
+class SpeculativeResearchNode(BaseSectionNode):
+    """
+    章节预研究：报告计划等待用户确认期间，提前生成章节的联网搜索查询并搜索，搜索结果写入报告级别的证据池。
+    用户批准报告计划后，由 GenerateQueriesNode 采用预研究的查询。
+    """
 
-        # 调用大模型生成查询
-        queries = structured_generate_query_llm.invoke(prompts)
-        query_str = "\n\n".join(query.search_query for query in queries.queries)
-        print(f"获取章节[{section.name}]检索查询：\n{query_str}")
-        async with cl.Step(name=f"章节 [{section.name}] 生成联网搜索查询",
-                           parent_id=parent_step_id) as generate_query_step:
-            generate_query_step.output = query_str
+    def get_node_name(self) -> str:
+        return "speculative_research"
 
-        return {"search_queries": queries.queries}
+    async def ainvoke(self, state: SectionState, config: RunnableConfig) -> Queries:
+        section = state["section"]
+        queries = await generate_section_queries(state["topic"], section, config)
+        await get_evidence_pool(config).search([query.search_query for query in queries.queries], config,
+                                               section.name)
+        print(f"章节 [{section.name}] 预研究完成")
+        return queries
 
 
 class SearchWebNode(BaseSectionNode):
@@ -85,20 +110,63 @@ class SearchWebNode(BaseSectionNode):
         return "search_web"
 
     async def ainvoke(self, state: SectionState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         section = state["section"]
         search_queries = state["search_queries"]
         parent_step_id = state["parent_step_id"]
         search_iterations = state["search_iterations"]
-
-        # 使用联网搜索
-        source_str = await web_search([query.search_query for query in search_queries])
-
-        async with cl.Step(name=f"章节 [{section.name}] 联网搜索查询结果",
-                           parent_id=parent_step_id) as search_web_step:
+        sources = state.get("sources") or []
+        searched_queries = state.get("searched_queries") or []
+
+        # 跳过之前迭代中已经搜索过的查询
+        new_queries = []
+        skipped_queries = []
+        seen_queries = set(searched_queries)
+        for query in search_queries:
+            normalized = normalize_query(query.search_query)
+            if normalized in seen_queries:
+                skipped_queries.append(query.search_query)
+            else:
+                seen_queries.add(normalized)
+                new_queries.append(query.search_query)
+
+        # 跳过与之前迭代已搜索的查询（或同一批次中靠前的查询）语义重复的查询
+        new_queries, similar_queries = deduplicate_queries(new_queries, searched_queries)
+        # 与报告中其他章节（或报告规划）已搜索的查询语义重复的查询，替换为该查询，直接复用其搜索结果
+        evidence_pool = get_evidence_pool(config)
+        original_queries = new_queries
+        new_queries, merged_queries = evidence_pool.merge_similar_queries(new_queries)
+
+        # 使用联网搜索 并将新的来源增量合并到已有来源中
+        # 通过报告级别的证据池搜索，其他章节已经搜索过（或正在搜索）的查询直接复用
+        new_sources = await evidence_pool.search(new_queries, config, section.name) if new_queries else []
+        new_sources = [{**source, "search_iteration": search_iterations + 1} for source in new_sources]
+        merged_sources, merge_stats = merge_sources(sources, new_sources)
+        added_sources = merged_sources[len(sources):]
+        source_str = "内容来源:\n" + format_sources(added_sources)
+
+        async with event_sink.step(name=f"章节 [{section.name}] 联网搜索查询结果",
+                                   parent_id=parent_step_id) as search_web_step:
             print(f"章节 [{section.name}] 联网搜索查询结果: \n{source_str}")
-            search_web_step.output = source_str
-
-        return {"source_str": source_str, "search_iterations": search_iterations + 1}
+            skipped_str = "、".join(skipped_queries) if skipped_queries else "无"
+            similar_str = "、".join(f"{item['query']}（与已搜索的「{item['matched']}」相似度 {item['similarity']:.2f}）"
+                                   for item in similar_queries) or "无"
+            merged_str = "、".join(f"{item['query']} => {item['matched']}（相似度 {item['similarity']:.2f}）"
+                                  for item in merged_queries) or "无"
+            search_web_step.output = (f"第{search_iterations + 1}次联网搜索，跳过已搜索的查询：{skipped_str}\n"
+                                      f"跳过语义重复的查询：{similar_str}\n"
+                                      f"合并到报告中已搜索的相似查询：{merged_str}\n"
+                                      f"新增来源 {len(added_sources)} 个，累计来源 {len(merged_sources)} 个，"
+                                      f"来源去重统计：{merge_stats}\n\n{source_str}")
+
+        return {"sources": merged_sources,
+                # 搜索失败的查询不计入已搜索的查询，下一次迭代可以重新搜索
+                "searched_queries": searched_queries + list(dict.fromkeys(
+                    normalize_query(query)
+                    for original_query, new_query in zip(original_queries, new_queries)
+                    if evidence_pool.is_searched(new_query)
+                    for query in (original_query, new_query))),
+                "search_iterations": search_iterations + 1}
 
 
 class WriteSectionNode(BaseSectionNode):
@@ -116,33 +184,52 @@ class WriteSectionNode(BaseSectionNode):
         return "write_section"
 
     async def ainvoke(self, state: SectionState, config: RunnableConfig) -> Command[Literal[END, "search_web"]]:
+        event_sink = get_event_sink(config)
         topic = state["topic"]
         section = state["section"]
-        source_str = state["source_str"]
+        sources = state["sources"]
         search_iterations = state["search_iterations"]
         parent_step_id = state["parent_step_id"]
 
-        # 报告章节写作 system prompt
-        section_writer_system_prompt = SECTION_WRITER_INPUTS.format(topic=topic,
-                                                                    section_name=section.name,
-                                                                    section_topic=section.description,
-                                                                    context=source_str,
-                                                                    section_content=section.content)
+        # 按撰写模型的 token 预算 装填与章节主题最相关的资料来源
+        section_writer_router = ModelRouter(self.get_node_name())
+        token_budget = context_token_budget(section_writer_router.get_model_name())
+        section_query = f"{section.name} {section.description}"
+        # 从整个报告的证据中检索与章节主题最相关的片段，补充其他章节（以及报告规划）搜索到的来源
+        retrieved_sources = []
+        if VECTOR_INDEX.get("enabled"):
+            try:
+                retrieved_sources = await get_evidence_pool(config).retrieve(section_query,
+                                                                             VECTOR_INDEX.get("top-k"), sources)
+            except Exception as e:
+                # 报告证据检索只是补充来源，失败时（进程池异常、向量化函数出错等）只使用章节自身的来源
+                print(f"章节 [{section.name}] 报告证据检索失败，只使用章节自身的来源，原因是：{type(e).__name__}: {e}")
+        source_str, packing_stats = pack_sources(sources + retrieved_sources, section_query, token_budget)
+        async with event_sink.step(name=f"章节 [{section.name}] 资料来源装填",
+                                   parent_id=parent_step_id) as packing_step:
+            packing_step.output = (f"token 预算：{packing_stats['token_budget']}，"
+                                   f"报告证据检索补充来源：{len(retrieved_sources)} 个，"
+                                   f"装填 token 数：{packing_stats['used_tokens']}/{packing_stats['input_tokens']}，"
+                                   f"来源个数：保留 {packing_stats['kept_sources']}（截断 {packing_stats['truncated_sources']}），"
+                                   f"丢弃 {packing_stats['dropped_sources']}")
+
+        # 报告章节写作 prompt：写作指南在前，章节信息与资料来源在后
+        prompts = SECTION_WRITER.messages(topic=topic,
+                                          section_name=section.name,
+                                          section_topic=section.description,
+                                          section_content=section.content,
+                                          context=source_str,
+                                          now=now())
 
         # llm生成章节内容
-        section_writer_llm = ModelRouter().get_model()
-
-        prompts = [
-            SystemMessage(content=section_writer_system_prompt),
-            HumanMessage(content=SECTION_WRITER_USER_PROMPT.format(now=now()))
-        ]
+        section_writer_llm = section_writer_router.get_model()
 
         section_content_resp_str = ""
 
-        async with cl.Step(name=f"生成章节: [{section.name}] 内容",
-                           parent_id=parent_step_id,
-                           default_open=True) as section_step:
-            for chunk in section_writer_llm.stream(prompts):
+        async with event_sink.step(name=f"生成章节: [{section.name}] 内容",
+                                   parent_id=parent_step_id,
+                                   default_open=True) as section_step:
+            async for chunk in section_writer_llm.astream(prompts):
                 if chunk.content:
                     section_content_resp_str += chunk.content
                     await section_step.stream_token(chunk.content)
@@ -151,33 +238,22 @@ class WriteSectionNode(BaseSectionNode):
         section.content = section_content_resp_str
 
         # 评估专家对当前章节的内容进行审查
-        section_grader_user_message = """
-                对报告进行评分，并考虑针对缺失信息的后续问题。
-                如果评分为'pass'，则为所有后续查询返回空字符串。
-                如果评分为'fail'，则提供具体的搜索查询以收集缺失信息。
-            """
-
-        section_grader_system_message = SECTION_GRADER_PROMPT.format(topic=topic,
-                                                                     section_topic=section.description,
-                                                                     section=section.content,
-                                                                     number_of_follow_up_queries=NUMBER_OF_QUERIES,
-                                                                     now=now(), )
+        prompts = SECTION_GRADER.messages(topic=topic,
+                                          section_topic=section.description,
+                                          section=section.content,
+                                          now=now())
 
         # 这里就很重要了，这里需要使用深度思考模型来进行反思 所以我们用deepseek-r1来进行反思
-        reflection_llm = ModelRouter().get_reasoner_model()
-        prompts = [
-            SystemMessage(content=section_grader_system_message),
-            HumanMessage(content=section_grader_user_message)
-        ]
+        reflection_llm = ModelRouter(self.get_node_name()).get_reasoner_model()
 
         is_answering = False
         reflection_content = ""
 
-        async with cl.Step(name=f"章节: [{section.name}] 章节评估 深度思考",
-                           parent_id=parent_step_id,
-                           default_open=True) as grade_section_step:
+        async with event_sink.step(name=f"章节: [{section.name}] 章节评估 深度思考",
+                                   parent_id=parent_step_id,
+                                   default_open=True) as grade_section_step:
             # 深度思考模型开始反思
-            for chunk in reflection_llm.stream(prompts):
+            async for chunk in reflection_llm.astream(prompts):
                 if chunk.additional_kwargs.get("reasoning_content", ""):
                     # 返回深度思考流式内容
                     await grade_section_step.stream_token(chunk.additional_kwargs["reasoning_content"])
@@ -192,22 +268,29 @@ class WriteSectionNode(BaseSectionNode):
         feedback_chain = JsonOutputParser() | to_feedback
         feedback = feedback_chain.invoke(reflection_content)
 
-        if feedback.grade == "pass" or search_iterations >= MAX_SEARCH_DEPTH:
+        # 系统过载且过载策略为 degrade 时 不再追加联网搜索
+        degraded = (feedback.grade != "pass" and search_iterations < MAX_SEARCH_DEPTH
+                    and admission_controller.should_degrade())
+        if feedback.grade == "pass" or search_iterations >= MAX_SEARCH_DEPTH or degraded:
             # 如果评估结果通过 或者 超过了检索的最大深度 则对当前章节的撰写直接退出
-            async with cl.Step(name=f"章节: [{section.name}] 章节评估",
-                               parent_id=parent_step_id) as grade_pass_step:
-                grade_pass_step.output = f"当前检索迭代深度：{search_iterations}, 评估结果：通过"
+            async with event_sink.step(name=f"章节: [{section.name}] 章节评估",
+                                       parent_id=parent_step_id) as grade_pass_step:
+                grade_pass_step.output = f"当前检索迭代深度：{search_iterations}, " + (
+                    "评估结果：未通过，系统繁忙，不再追加联网搜索" if degraded else "评估结果：通过")
             return Command(
-                # 更新当前的状态机
-                update={"completed_sections": [section]},
+                # 更新当前的状态机，同时生成章节摘要，供撰写不需要研究的章节时使用
+                update={"completed_sections": [section],
+                        "section_digests": [{"name": section.name,
+                                             "digest": section_digest(section,
+                                                                      SECTION_DIGEST.get("section-budget"))}]},
                 goto=END
             )
         else:
             # 如果评估结果未通过，则根据提供的新的检索查询 路由到检索节点 重新检索 来补充缺失的主题内容
             feedback_up_queries_str = "\n".join(feedback_up_query.search_query
                                                 for feedback_up_query in feedback.follow_up_queries)
-            async with cl.Step(name=f"章节: [{section.name}] 章节评估",
-                               parent_id=parent_step_id) as grade_fail_step:
+            async with event_sink.step(name=f"章节: [{section.name}] 章节评估",
+                                       parent_id=parent_step_id) as grade_fail_step:
                 grade_fail_step.output = f"评估结果：未通过，当前检索迭代深度：{state['search_iterations']}, 重新生成的联网搜索查询：\n{feedback_up_queries_str}"
 
             return Command(
@@ -232,29 +315,24 @@ class WriteNoResearchSectionNode(BaseSectionNode):
         return "write_no_research_section"
 
     async def ainvoke(self, state: NoResearchSectionState, config: RunnableConfig):
+        event_sink = get_event_sink(config)
         topic = state["topic"]
         section = state["section"]
         completed_report_sections = state["sections_from_research"]
 
-        # 设置撰写总结 这一章节 的 system prompt
-        no_research_section_writer_system_prompt = FINAL_SECTION_WRITER_PROMPT.format(topic=topic,
-                                                                                      section_name=section.name,
-                                                                                      section_topic=section.description,
-                                                                                      context=completed_report_sections,
-                                                                                      now=now(), )
-
-        no_research_section_writer_user_prompt = f"请根据已经提供的资料生成{section.name}报告部分。"
+        # 设置撰写总结 这一章节 的 prompt
+        prompts = FINAL_SECTION_WRITER.messages(topic=topic,
+                                                section_name=section.name,
+                                                section_topic=section.description,
+                                                context=completed_report_sections,
+                                                now=now())
 
-        final_writer_llm = ModelRouter().get_model()
-        prompts = [
-            SystemMessage(content=no_research_section_writer_system_prompt),
-            HumanMessage(content=no_research_section_writer_user_prompt)
-        ]
+        final_writer_llm = ModelRouter(self.get_node_name()).get_model()
 
         no_research_section_content = ""
-        async with cl.Step(name=f"生成不需要研究的章节 [{section.name}] 内容",
-                           default_open=True) as section_no_research_step:
-            for chunk in final_writer_llm.stream(prompts):
+        async with event_sink.step(name=f"生成不需要研究的章节 [{section.name}] 内容",
+                                   default_open=True) as section_no_research_step:
+            async for chunk in final_writer_llm.astream(prompts):
                 if chunk.content:
                     await section_no_research_step.stream_token(chunk.content)
                     no_research_section_content += chunk.content
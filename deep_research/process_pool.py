@@ -0,0 +1,46 @@
+"""
+进程内共享的进程池，用于网页正文提取、文本向量化等 CPU 密集型任务，既不占用事件循环，也不与事件循环争抢 GIL
+
+使用 spawn 方式启动子进程，避免在多线程的服务进程中 fork，子进程只导入任务函数所在的模块，
+自定义的启动脚本需要 if __name__ == '__main__': 保护。子进程异常退出后进程池不可再用，下次使用时重新创建
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from deep_research.config.application_project import PROCESS_POOL
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """ 获取共享的进程池，首次使用时创建 """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PROCESS_POOL.get("workers"),
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _discard_process_pool(executor: ProcessPoolExecutor):
+    """ 丢弃已经损坏的进程池（仍是当前进程池时），下次使用时重新创建 """
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_process(func, *args):
+    """ 在共享的进程池中运行函数，函数与参数需要可以被 pickle """
+    executor = get_process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        print("进程池中的子进程异常退出，进程池将在下次使用时重新创建")
+        _discard_process_pool(executor)
+        raise
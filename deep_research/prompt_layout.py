@@ -0,0 +1,43 @@
+"""
+prompt 组装
+
+DeepSeek、DashScope 等模型服务对请求的公共前缀做缓存（KV 缓存），前缀命中的 token 首 token 更快、计费更低。
+日期、主题、资料来源等可变内容一旦出现在 system 消息开头，每次请求的前缀都不一样，缓存无法命中。
+这里把 prompt 拆成两部分，并在导入时编译一次：
+1. 静态指令：角色、任务、输出格式以及进程内不变的配置（查询个数、报告组织结构），作为 system 消息放在最前面，
+   同一个 prompt 的所有调用完全相同
+2. 输入模版：主题、章节、资料来源、当前日期等可变内容，渲染为最后一条 user 消息
+"""
+from string import Formatter
+
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
+
+
+class CompiledPrompt:
+    """ 预编译的 prompt：静态的 system 消息 + 按输入模版渲染的 user 消息 """
+
+    def __init__(self, instructions: str, inputs: str, **constants):
+        # 静态指令只在导入时格式化一次，之后每次调用复用同一个 system 消息
+        self.system_message = SystemMessage(content=instructions.format(**constants).strip())
+        self.inputs = inputs.strip()
+        self.fields = _parse_fields(self.inputs)
+
+    def render(self, **values) -> str:
+        """ 按输入模版渲染可变内容 """
+        return self.inputs.format(**values)
+
+    def messages(self, **values) -> list[BaseMessage]:
+        """ [静态 system 消息, 可变内容的 user 消息] """
+        return [self.system_message, HumanMessage(content=self.render(**values))]
+
+
+def _parse_fields(template: str) -> set[str]:
+    """ 导入时校验输入模版，只支持简单的 {参数名}，返回参数名集合 """
+    fields = set()
+    for _, field, format_spec, conversion in Formatter().parse(template):
+        if field is None:
+            continue
+        if not field.isidentifier() or format_spec or conversion:
+            raise ValueError(f"prompt 输入模版只支持简单的 {{参数名}}，不支持: {{{field}}}")
+        fields.add(field)
+    return fields
@@ -1,10 +1,14 @@
+from deep_research.config.application_project import NUMBER_OF_QUERIES, REPORT_STRUCTURE
+from deep_research.prompt_layout import CompiledPrompt
+
+# 每个 prompt 拆成静态指令（*_PROMPT，作为 system 消息）与可变内容的输入模版（*_INPUTS，作为最后一条 user 消息），
+# 静态指令在前，模型服务的前缀缓存才能命中，详见 deep_research/prompt_layout.py
+
+# 报告规划 联网搜索查询生成 prompt
 REPORT_PLANNER_QUERY_WRITER_PROMPT = """
 # 角色
 你是一位专业的报告研究者，你非常擅长对一个报告进行研究，然后生成对应的网络搜索查询。
 
-## 报告主题
-{topic}
-
 ## 报告组织结构
 {report_organization}
 
@@ -16,9 +20,16 @@ REPORT_PLANNER_QUERY_WRITER_PROMPT = """
 
 ## 注意事项
 请注意，确保查询足够具体，以便找到高质量、相关的信息，同时涵盖报告所需的广度。
+"""
+
+REPORT_PLANNER_QUERY_WRITER_INPUTS = """
+## 报告主题
+{topic}
 
 ## 当前时间
 {now}
+
+生成有助于规划报告章节的搜索查询
 """
 
 # 主题报告规划 prompt
@@ -26,18 +37,10 @@ REPORT_PLANNER_PROMPT = """
 # 需求设定
 我需要一个简洁且聚焦的报告计划。
 
-## 报告主题
-报告的主题是：
-{topic}
-
 ## 报告的组织结构
 报告应当遵循一下组织结构：
 {report_organization}
 
-## 上下文信息
-以下适用于规划报告各个部分的上下文信息：
-{context}
-
 ## 任务
 你的任务是生成报告的各个章节的列表，你的计划应当简洁且集中，避免出现重复的章节或者不必要的填充内容。
 例如，一个好的报告结构应当如下：
@@ -52,10 +55,6 @@ REPORT_PLANNER_PROMPT = """
     - research(字段类型：布尔 true/false) => 是否需要对这一章节进行联网搜索研究，推荐研究。
     - content(字段类型：字符串) => 该部分的内容，目前留空。
 
-## 反馈
-这是对报告结构的评审反馈（如果有）： 
-{feedback}
-
 ## 输出结果格式示例
 ```json
 {{
@@ -88,9 +87,26 @@ REPORT_PLANNER_PROMPT = """
     - 合并相关概念，而不是分开处理。 
     - 在提交前，审查你的结构，确保没有冗余章节内容，并且逻辑流畅。 
     - 输出结果为json，而不添加任何额外的解释说明。
+"""
+
+REPORT_PLANNER_INPUTS = """
+## 报告主题
+报告的主题是：
+{topic}
+
+## 反馈
+这是对报告结构的评审反馈（如果有）：
+{feedback}
 
 ## 当前时间
 {now}
+
+## 上下文信息
+以下适用于规划报告各个部分的上下文信息：
+{context}
+
+请生成报告的各章节。您的响应json最外层包含一个“sections”字段，该字段包含一个章节列表。
+每个章节必须包含：名称（name）、描述(description)、研究(research)和内容(content)字段。
 """
 
 # 联网搜索查询生成 prompt
@@ -98,26 +114,30 @@ QUERY_WRITER_PROMPT = """
 # 角色
 你是一位专业的技术作家，负责制定有针对性的联网搜索查询，用来收集撰写技术报告章节所需的全面信息。
 
-## 报告主题
-报告的主题是：
-{topic}
-
-## 章节（section）主题
-{section_topic}
-
 ## 任务
 你的目标是生成{number_of_queries}个联网搜索查询，这些查询将帮助收集关于章节主题的全面信息。
 这些查询应该遵循一下规则：
 1. 与主题相关
 2. 考察主题的不同方面
 确保能使查询具体到找到高质量、相关的信息来源。
+"""
+
+QUERY_WRITER_INPUTS = """
+## 报告主题
+报告的主题是：
+{topic}
+
+## 章节（section）主题
+{section_topic}
 
 ## 当前时间
 {now}
+
+请生成关于所提供主题的联网搜索查询。
 """
 
 # 章节 写作 prompt
-SECTION_WRITER_USER_PROMPT = """
+SECTION_WRITER_PROMPT = """
 # 需求设定
 请撰写研究报告的章节内容。
 
@@ -148,13 +168,10 @@ SECTION_WRITER_USER_PROMPT = """
 1. 验证每一条陈述都基于提供的资料来源
 2. 确认每个URL仅在来源列表中出现一次
 3. 验证来源按顺序编号（1,2,3...），没有空缺
-
-## 当前时间
-{now}
 """
 
 # 章节写作输入格式要求
-SECTION_WRITER_INPUTS = """ 
+SECTION_WRITER_INPUTS = """
 # 报告主题
 {topic}
 
@@ -167,8 +184,13 @@ SECTION_WRITER_INPUTS = """
 ## 现有的章节内容（如果已填充）
 {section_content}
 
+## 当前时间
+{now}
+
 ## 引用的资料来源
 {context}
+
+请撰写该章节的内容。
 """
 
 # 章节内容评估prompt
@@ -176,15 +198,6 @@ SECTION_GRADER_PROMPT = """
 # 需求设定
 请根据指定的报告主题，来审查报告中的章节是否与主题相关。
 
-## 报告主题
-{topic}
-
-## 章节主题
-{section_topic}
-
-## 章节内容
-{section}
-
 ## 任务
 请评估章节内容是否充分涵盖了章节主题。
 如果章节内容未能充分涵盖章节主题，生成 {number_of_follow_up_queries} 个后续搜索查询以收集缺失信息。
@@ -209,27 +222,30 @@ SECTION_GRADER_PROMPT = """
 
 # 注意事项
     - 输出结果为json，而不添加任何额外的解释说明。
-    
-## 当前时间
-{now}
 """
 
-# 最终及简介等以其他章节为素材而生成的章节写作prompt
-FINAL_SECTION_WRITER_PROMPT = """
-# 角色
-你是一位专业的技术文档撰写专家，结合其他研究报告章节的内容来整合撰写当前章节内容。
-
+SECTION_GRADER_INPUTS = """
 ## 报告主题
 {topic}
 
-## 章节名称
-{section_name}
-
 ## 章节主题
 {section_topic}
 
-## 可用的报告内容
-{context}
+## 当前时间
+{now}
+
+## 章节内容
+{section}
+
+对报告进行评分，并考虑针对缺失信息的后续问题。
+如果评分为'pass'，则为所有后续查询返回空字符串。
+如果评分为'fail'，则提供具体的搜索查询以收集缺失信息。
+"""
+
+# 最终及简介等以其他章节为素材而生成的章节写作prompt
+FINAL_SECTION_WRITER_PROMPT = """
+# 角色
+你是一位专业的技术文档撰写专家，结合其他研究报告章节的内容来整合撰写当前章节内容。
 
 ## 任务
 1. 特定章节撰写方式：
@@ -269,7 +285,34 @@ FINAL_SECTION_WRITER_PROMPT = """
 - 对于结论章节：100-250 字，使用 ## 表示章节标题，最多仅使用一个结构性元素，无“来源”部分
 - 使用 Markdown 格式
 - 不要在回复中包含字数统计或任何前言
+"""
+
+FINAL_SECTION_WRITER_INPUTS = """
+## 报告主题
+{topic}
+
+## 章节名称
+{section_name}
+
+## 章节主题
+{section_topic}
 
 ## 当前时间
 {now}
+
+## 可用的报告内容
+{context}
+
+请根据已经提供的资料生成{section_name}报告部分。
 """
+
+# 导入时编译，节点中直接调用 messages(...) 组装 prompt
+REPORT_PLANNER_QUERY_WRITER = CompiledPrompt(REPORT_PLANNER_QUERY_WRITER_PROMPT, REPORT_PLANNER_QUERY_WRITER_INPUTS,
+                                             report_organization=REPORT_STRUCTURE,
+                                             number_of_queries=NUMBER_OF_QUERIES)
+REPORT_PLANNER = CompiledPrompt(REPORT_PLANNER_PROMPT, REPORT_PLANNER_INPUTS, report_organization=REPORT_STRUCTURE)
+QUERY_WRITER = CompiledPrompt(QUERY_WRITER_PROMPT, QUERY_WRITER_INPUTS, number_of_queries=NUMBER_OF_QUERIES)
+SECTION_WRITER = CompiledPrompt(SECTION_WRITER_PROMPT, SECTION_WRITER_INPUTS)
+SECTION_GRADER = CompiledPrompt(SECTION_GRADER_PROMPT, SECTION_GRADER_INPUTS,
+                                number_of_follow_up_queries=NUMBER_OF_QUERIES)
+FINAL_SECTION_WRITER = CompiledPrompt(FINAL_SECTION_WRITER_PROMPT, FINAL_SECTION_WRITER_INPUTS)
@@ -0,0 +1,84 @@
+"""
+恢复中断的研究
+
+从持久化的 checkpoint 中读取会话最近完成的节点，继续运行工作流。
+并行的章节中已完成的章节会直接复用其结果，只有未完成的章节会重新执行。
+恢复运行时不依赖 chainlit 页面，若中断发生在报告计划确认之前，会自动批准报告计划。
+
+运行方式（项目根目录）：
+    python -m deep_research.resume --list
+    python -m deep_research.resume <thread_id> --output-dir reports
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from deep_research.batch import report_file_name
+from deep_research.checkpoint import open_checkpointer
+from deep_research.events.headless import HeadlessEventSink
+from deep_research.graph import report_builder, release_report_resources
+from deep_research.llm.registry import model_client_registry
+from deep_research.tracing import tracer
+
+
+async def list_threads():
+    """ 列出所有会话 以及是否已完成 """
+    async with open_checkpointer() as checkpointer:
+        workflow = report_builder.compile(checkpointer=checkpointer)
+        for thread in await checkpointer.list_threads():
+            state = await workflow.aget_state({"configurable": {"thread_id": thread["thread_id"]}})
+            status = f"未完成，下一步：{', '.join(state.next)}" if state.next else "已完成"
+            updated_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(thread["updated_at"]))
+            print(f"{thread['thread_id']}  {updated_at}  {status}  主题：{state.values.get('topic')}")
+
+
+async def resume_thread(thread_id: str, output_dir: str, verbose: bool) -> int:
+    """ 从会话最近完成的节点继续运行，并将最终报告写入输出目录 """
+    async with open_checkpointer() as checkpointer:
+        workflow = report_builder.compile(checkpointer=checkpointer)
+        config = {"configurable": {"thread_id": thread_id,
+                                   "event_sink": HeadlessEventSink(name=thread_id[:8], verbose=verbose)}}
+        state = await workflow.aget_state(config)
+        if not state.values:
+            print(f"会话 [{thread_id}] 不存在")
+            return 1
+
+        if state.next:
+            print(f"会话 [{thread_id}] 从 {', '.join(state.next)} 继续运行，"
+                  f"已完成的章节数：{len(state.values.get('completed_sections', []))}")
+            begin = time.perf_counter()
+            try:
+                await workflow.ainvoke(None, config)
+            finally:
+                release_report_resources(config)
+                await model_client_registry.aclose()
+                tracer.write_prometheus()
+            print(f"会话 [{thread_id}] 运行完成，耗时 {time.perf_counter() - begin:.2f}s")
+            state = await workflow.aget_state(config)
+        else:
+            print(f"会话 [{thread_id}] 已完成，直接导出最终报告")
+
+    final_report = state.values.get("final_report")
+    if not final_report:
+        print(f"会话 [{thread_id}] 没有生成最终报告")
+        return 1
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, report_file_name(0, state.values.get("topic") or thread_id))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(final_report)
+    print(f"最终报告：{path}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="恢复中断的研究")
+    parser.add_argument("thread_id", nargs="?", help="需要恢复的会话 thread_id")
+    parser.add_argument("--list", action="store_true", help="列出所有会话")
+    parser.add_argument("--output-dir", default="reports", help="报告输出目录")
+    parser.add_argument("--verbose", action="store_true", help="打印每个步骤的完成情况")
+    args = parser.parse_args()
+    if args.list or not args.thread_id:
+        asyncio.run(list_threads())
+    else:
+        raise SystemExit(asyncio.run(resume_thread(args.thread_id, args.output_dir, args.verbose)))
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from deep_research.config.application_project import SEARCH_CACHE
+
+
+def normalize_query(query: str) -> str:
+    """
+    归一化联网搜索查询，使仅有大小写、全半角、空白或结尾标点差异的查询命中同一缓存
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip("?？。.!！;；,，")
+
+
+class SearchCache:
+    """
+    联网搜索结果缓存 基于 SQLite 持久化
+    1. 缓存键：联网搜索服务 + 归一化后的查询 + 单次最多获取的网页个数
+    2. 每个联网搜索服务可以配置不同的有效期（ttl），过期即视为未命中
+    3. 缓存条目超过上限时，按最近访问时间淘汰（LRU）
+    """
+
+    def __init__(self, path: str, ttl: dict, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def get_many(self, provider: str, queries: list[str], max_results: int) -> dict:
+        """ 批量读取缓存，返回 查询 => 联网搜索结果，未命中或过期的查询不在返回结果中 """
+        ttl = self.ttl.get(provider, self.ttl.get("default"))
+        now = time.time()
+        cached = {}
+        with self._lock:
+            conn = self._connect()
+            for query in queries:
+                key = self._key(provider, query, max_results)
+                row = conn.execute("SELECT response, created_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+                if row is None or now - row[1] > ttl:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                cached[query] = json.loads(row[0])
+            conn.commit()
+        return cached
+
+    def put_many(self, provider: str, responses: dict, max_results: int):
+        """ 批量写入缓存 并按 LRU 淘汰超出上限的条目 """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO search_cache (key, provider, query, max_results, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(self._key(provider, query, max_results), provider, query, max_results,
+                  json.dumps(response, ensure_ascii=False), now, now)
+                 for query, response in responses.items()])
+            overflow = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute("DELETE FROM search_cache WHERE key IN "
+                             "(SELECT key FROM search_cache ORDER BY accessed_at LIMIT ?)", (overflow,))
+                self.evictions += overflow
+            conn.commit()
+
+    def stats(self) -> dict:
+        """ 缓存命中统计 """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    max_results INTEGER NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed_at ON search_cache (accessed_at)")
+        return self._conn
+
+    @staticmethod
+    def _key(provider: str, query: str, max_results: int) -> str:
+        raw = f"{provider}\x00{normalize_query(query)}\x00{max_results}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 全局共享的联网搜索结果缓存
+search_cache = SearchCache(SEARCH_CACHE.get("path"), SEARCH_CACHE.get("ttl"), SEARCH_CACHE.get("max-entries"))
@@ -0,0 +1,185 @@
+"""
+网页正文抓取
+
+联网搜索服务只返回几行摘要，章节内容单薄时评估容易不通过，触发额外的检索迭代。
+开启 PAGE_CONTENT 后，对每个查询排名靠前的网页抓取原始网页：
+1. 抓取：所有会话共享的异步连接池，同一域名限制并发数，超过大小上限的部分直接丢弃，只处理 HTML / 纯文本
+2. 提取：HTML 解析与正文切分在共享的进程池中运行，不阻塞事件循环
+3. 存储：正文片段写入搜索结果（results[].chunks），与联网搜索结果一起缓存，撰写章节时按章节主题挑选最相关的片段
+"""
+import asyncio
+import hashlib
+import codecs
+import random
+import re
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from deep_research.config.application_project import PAGE_CONTENT, WEB_SEARCH_TYPE, FAKE_SEARCH
+from deep_research.llm.mock import sample_latency
+from deep_research.process_pool import run_in_process
+from deep_research.search.extract import extract_chunks
+from deep_research.tracing import current_span
+
+_USER_AGENT = "Mozilla/5.0 (compatible; deep-research/1.0)"
+_TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+# <meta charset="gbk"> 或 <meta http-equiv="Content-Type" content="text/html; charset=gb2312">
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([a-zA-Z0-9_-]+)", re.IGNORECASE)
+# GB2312 / GBK 网页中经常混有超出其字符集的字符，统一按超集 GB18030 解码
+_SUPERSET_ENCODINGS = {"gb2312": "gb18030", "gbk": "gb18030"}
+
+
+class PageFetcher:
+    """
+    网页正文抓取器，进程内所有会话共享
+    连接池与信号量按事件循环隔离，指标全局共享
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.fetched = 0
+        self.failed = 0
+        self.skipped = 0
+        self.truncated = 0
+        self.bytes = 0
+        self.chunks = 0
+        # 事件循环 => (连接池, 域名 => 信号量)
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def fetch_chunks(self, url: str) -> Optional[list[str]]:
+        """ 抓取网页并提取正文片段，失败或不是文本网页时返回 None """
+        try:
+            html = await (self._fetch_fake(url) if WEB_SEARCH_TYPE == "fake" else self._fetch(url))
+            if html is None:
+                return None
+            chunks = await run_in_process(extract_chunks, html, self.config.get("chunk-chars"),
+                                          self.config.get("chunk-overlap"), self.config.get("max-chunks"))
+        except Exception as e:
+            self.failed += 1
+            print(f"网页正文抓取失败 [{url}]，原因是：{type(e).__name__}: {e}")
+            return None
+        self.fetched += 1
+        self.chunks += len(chunks)
+        span = current_span()
+        if span is not None:
+            span.page_fetches += 1
+        return chunks
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        client, host_semaphores = self._get_client()
+        host = urlsplit(url).hostname or ""
+        semaphore = host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = host_semaphores.setdefault(host, asyncio.Semaphore(self.config.get("max-per-host")))
+        max_bytes = self.config.get("max-bytes")
+        async with semaphore:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").lower()
+                if content_type and not content_type.startswith(_TEXT_CONTENT_TYPES):
+                    self.skipped += 1
+                    return None
+                body = bytearray()
+                async for data in response.aiter_bytes():
+                    body += data
+                    if len(body) >= max_bytes:
+                        self.truncated += 1
+                        break
+                self.bytes += min(len(body), max_bytes)
+                body = bytes(body[:max_bytes])
+                # 响应头没有声明编码时（中文网站常见），按网页 <meta> 中声明的编码解码，都没有时按 UTF-8
+                encoding = response.charset_encoding or sniff_encoding(body) or "utf-8"
+                return body.decode(encoding, errors="replace")
+
+    async def _fetch_fake(self, url: str) -> str:
+        """ 离线模拟的网页（WEB_SEARCH_TYPE=fake），同一 URL 返回相同的网页，用于无网络的基准测试 """
+        await asyncio.sleep(sample_latency(FAKE_SEARCH.get("latency"), _fake_page_random))
+        page_random = random.Random(hashlib.sha256(url.encode("utf-8")).hexdigest())
+        paragraphs = "".join(f"<p>{''.join(page_random.choices(_FAKE_PAGE_WORDS, k=120))}。</p>"
+                             for _ in range(page_random.randint(8, 20)))
+        html = (f"<html><head><title>{url}</title><script>var tracking = 1;</script></head><body>"
+                f"<nav>首页 | 产品 | 关于我们</nav><article><h1>模拟网页正文</h1>{paragraphs}</article>"
+                f"<footer>版权所有</footer></body></html>")
+        self.bytes += len(html.encode("utf-8"))
+        return html
+
+    def _get_client(self) -> tuple[httpx.AsyncClient, dict]:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            max_connections = self.config.get("max-connections")
+            client = (httpx.AsyncClient(headers={"User-Agent": _USER_AGENT},
+                                        timeout=self.config.get("timeout"),
+                                        follow_redirects=True,
+                                        limits=httpx.Limits(max_connections=max_connections,
+                                                            max_keepalive_connections=max_connections)),
+                      {})
+            self._clients[loop] = client
+        return client
+
+    def stats(self) -> dict:
+        return {
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "truncated": self.truncated,
+            "bytes": self.bytes,
+            "chunks": self.chunks,
+        }
+
+
+def sniff_encoding(body: bytes) -> Optional[str]:
+    """ 从网页开头的 <meta> 标签中识别编码，无法识别时返回 None """
+    match = _META_CHARSET.search(body[:4096])
+    if match is None:
+        return None
+    try:
+        encoding = codecs.lookup(match.group(1).decode("ascii")).name
+    except LookupError:
+        return None
+    return _SUPERSET_ENCODINGS.get(encoding, encoding)
+
+
+def needs_page_contents(search_doc: dict) -> bool:
+    """ 开启网页正文抓取，且搜索结果还没有抓取过（如开启之前缓存的结果） """
+    return PAGE_CONTENT.get("enabled") and not search_doc.get("error") and not search_doc.get("page_contents")
+
+
+async def attach_page_contents(search_docs: list[dict]) -> list[dict]:
+    """
+    为每个查询排名前 top-k 的网页抓取正文片段，写入对应搜索结果的 chunks 字段
+    多个查询返回相同的网页时只抓取一次，抓取失败的网页保留原有的摘要
+    至少有一个网页抓取成功（或没有可抓取的网页）时才标记为已抓取，全部失败时下次读取缓存会重新抓取
+    """
+    if not any(needs_page_contents(doc) for doc in search_docs):
+        return search_docs
+    top_k = PAGE_CONTENT.get("top-k")
+    urls = list(dict.fromkeys(result["url"] for doc in search_docs if needs_page_contents(doc)
+                              for result in doc.get("results", [])[:top_k] if result.get("url")))
+    chunks = dict(zip(urls, await asyncio.gather(*[page_fetcher.fetch_chunks(url) for url in urls])))
+    print(f"网页正文抓取：本次 {len(urls)} 个网页，累计统计：{page_fetcher.stats()}")
+
+    enriched = []
+    for doc in search_docs:
+        if not needs_page_contents(doc):
+            enriched.append(doc)
+            continue
+        results = [{**result, "chunks": chunks[result.get("url")]} if chunks.get(result.get("url")) else result
+                   for result in doc.get("results", [])]
+        doc_urls = [result["url"] for result in doc.get("results", [])[:top_k] if result.get("url")]
+        # 抓取成功但没有提取到正文（空列表）同样算已抓取，只有全部失败（None）时才留待下次重新抓取
+        fetched = not doc_urls or any(chunks.get(url) is not None for url in doc_urls)
+        enriched.append({**doc, "results": results, "page_contents": True} if fetched else {**doc, "results": results})
+    return enriched
+
+
+_fake_page_random = random.Random(FAKE_SEARCH.get("seed"))
+
+_FAKE_PAGE_WORDS = ["模型", "推理", "数据", "训练", "性能", "成本", "市场", "产品", "用户", "技术",
+                    "架构", "部署", "开源", "评测", "应用", "场景", "生态", "趋势", "安全", "效率"]
+
+# 进程内共享的网页正文抓取器
+page_fetcher = PageFetcher(PAGE_CONTENT)
@@ -0,0 +1,140 @@
+import hashlib
+import re
+import unicodedata
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import numpy as np
+
+from deep_research.config.application_project import SOURCE_DEDUP
+from deep_research.tokenizer import estimate_tokens
+
+# 移动端、镜像等子域名前缀，归一化时去掉
+_HOST_PREFIXES = ("www.", "m.", "mobile.", "wap.", "amp.")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    URL 归一化，使同一网页的不同链接形式得到相同的结果：
+    1. 统一 http/https，去掉默认端口、移动端子域名、锚点以及结尾的斜杠。
+       去掉子域名后必须仍是带点的域名（amp.dev 不变）；#/、#! 开头的锚点是单页应用的路由，保留
+    2. 去掉 utm_* 等追踪参数，其余查询参数按名称排序
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and "." in host[len(prefix):]:
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    tracking_params = SOURCE_DEDUP.get("tracking-params")
+    params = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+              if not key.lower().startswith("utm_") and key.lower() not in tracking_params]
+    path = re.sub(r"/+", "/", parts.path).rstrip("/")
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit(("https", host, path, urlencode(sorted(params)), fragment))
+
+
+def char_shingles(text: str, ngram_size: int) -> set[str]:
+    """ 字符 n-gram 集合，不需要分词，中文同样适用，空文本返回空集合 """
+    text = _normalize_text(text)
+    if not text:
+        return set()
+    if len(text) <= ngram_size:
+        return {text}
+    return {text[i:i + ngram_size] for i in range(len(text) - ngram_size + 1)}
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or "").casefold())
+
+
+class MinHasher:
+    """
+    基于字符 n-gram 的 MinHash，签名中相同位置取值相等的比例 即为两段文本 n-gram 集合 Jaccard 相似度的估计
+    使用 numpy 对所有哈希函数做向量化计算
+    """
+
+    # 大于 2^32 的素数，哈希函数为 (a * x + b) mod p
+    _PRIME = np.uint64(4294967311)
+
+    def __init__(self, num_perm: int, ngram_size: int, seed: int = 42):
+        self.ngram_size = ngram_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+             for shingle in char_shingles(text, self.ngram_size)),
+            dtype=np.uint64)
+        return ((self._a * hashes + self._b) % self._PRIME).min(axis=1)
+
+    @staticmethod
+    def similarity(left: np.ndarray, right: np.ndarray) -> float:
+        return float(np.mean(left == right))
+
+
+def source_size(source: dict) -> int:
+    return len(f"{source.get('title') or ''}{source.get('url') or ''}{source.get('content') or ''}".encode("utf-8"))
+
+
+def source_tokens(source: dict) -> int:
+    return estimate_tokens(f"{source.get('title') or ''}{source.get('url') or ''}{source.get('content') or ''}")
+
+
+def deduplicate_sources(sources: list[dict]) -> tuple[list[dict], dict]:
+    """
+    联网搜索来源去重
+    1. 按归一化后的 URL 去重
+    2. 按标题 + 内容的 MinHash 相似度去掉镜像、转载等近似重复的来源（过短的标题 + 内容只按 URL 去重）
+    先出现的来源优先保留，返回保留的来源列表 以及去重统计（去掉的来源个数、字节数、token 数）
+    """
+    threshold = SOURCE_DEDUP.get("similarity-threshold")
+
+    kept = []
+    seen_urls = set()
+    signatures = []
+    stats = {"input_sources": len(sources), "url_duplicates": 0, "near_duplicates": 0,
+             "removed_bytes": 0, "removed_tokens": 0}
+    for source in sources:
+        url = canonicalize_url(source["url"])
+        if url in seen_urls:
+            duplicate_type = "url_duplicates"
+        else:
+            seen_urls.add(url)
+            duplicate_type = None
+            text = f"{source.get('title') or ''}{source.get('content') or ''}"
+            # 标题与内容过短（如空内容）的来源没有可比较的内容，只按 URL 去重
+            if SOURCE_DEDUP.get("near-duplicate") and len(_normalize_text(text)) >= SOURCE_DEDUP.get("min-chars"):
+                signature = _min_hasher.signature(text)
+                if any(MinHasher.similarity(signature, other) >= threshold for other in signatures):
+                    duplicate_type = "near_duplicates"
+                else:
+                    signatures.append(signature)
+
+        if duplicate_type:
+            stats[duplicate_type] += 1
+            stats["removed_bytes"] += source_size(source)
+            stats["removed_tokens"] += source_tokens(source)
+        else:
+            kept.append(source)
+
+    stats["kept_sources"] = len(kept)
+    return kept, stats
+
+
+def merge_sources(existing: list[dict], new: list[dict]) -> tuple[list[dict], dict]:
+    """
+    将新的来源增量合并到已有来源中，与已有来源重复（URL 或近似内容）的新来源直接跳过
+    已有来源均已去重且排在前面，因此会全部保留，返回合并后的来源列表 以及新来源的去重统计
+    """
+    merged, stats = deduplicate_sources(existing + new)
+    stats["input_sources"] = len(new)
+    stats["kept_sources"] = len(merged) - len(existing)
+    return merged, stats
+
+
+_min_hasher = MinHasher(SOURCE_DEDUP.get("num-perm"), SOURCE_DEDUP.get("ngram-size"))
@@ -0,0 +1,239 @@
+import asyncio
+
+from langchain_core.runnables import RunnableConfig
+
+from deep_research.config.application_project import VECTOR_INDEX, QUERY_DEDUP
+from deep_research.embedding import load_embed_function
+from deep_research.process_pool import run_in_process
+from deep_research.search.cache import normalize_query
+from deep_research.search.dedup import source_size, canonicalize_url
+from deep_research.search.query_dedup import find_similar_query, record_query_dedups
+from deep_research.search.vector_index import VectorIndex
+from deep_research.tracing import current_span
+from deep_research.utils import cached_search
+
+
+class SearchAbortedError(Exception):
+    """ 发起查询的章节搜索失败或被取消 """
+
+
+class EvidencePool:
+    """
+    报告级别共享的证据池，规划节点的搜索结果首先写入证据池，各章节共同读写
+    1. 已完成的查询直接复用搜索结果
+    2. 正在搜索中的相同查询只发起一次请求（single-flight），其他章节等待同一个结果
+    3. 统计跨章节的复用情况
+    4. 证据池中的所有来源（含网页正文片段）建立向量索引，章节可以检索整个报告中与章节主题最相关的片段
+    """
+
+    def __init__(self, report_id: str):
+        self.report_id = report_id
+        # 归一化查询 => 来源列表
+        self._results = {}
+        # 归一化查询 => 最先发起该查询的章节（规划阶段为 planner）
+        self._owners = {}
+        # 归一化查询 => 搜索中的 Future
+        self._in_flight = {}
+        self.requested_queries = 0
+        self.searched_queries = 0
+        self.reused_queries = 0
+        self.joined_in_flight = 0
+        self.cross_section_reused = 0
+        self.retrieved_sources = 0
+        self._index = None
+        # 已经写入向量索引的查询
+        self._indexed_queries = set()
+        self._index_lock = None
+
+    async def search(self, search_queries: list[str], config: RunnableConfig, requester: str) -> list[dict]:
+        """ 通过证据池进行联网搜索，返回所有查询的来源列表 """
+        waiting = {}
+        missing = {}
+        for query in search_queries:
+            normalized = normalize_query(query)
+            self.requested_queries += 1
+            if normalized in waiting or normalized in missing:
+                continue
+            if normalized in self._results:
+                self._count_reuse(normalized, requester)
+            elif normalized in self._in_flight:
+                self.joined_in_flight += 1
+                self._count_reuse(normalized, requester)
+                waiting[normalized] = (query, self._in_flight[normalized])
+            else:
+                missing[normalized] = query
+                self._owners[normalized] = requester
+                self._in_flight[normalized] = asyncio.get_running_loop().create_future()
+
+        if missing:
+            try:
+                search_docs = await cached_search(list(missing.values()), config)
+            except BaseException as e:
+                # 搜索失败或被取消时 通知等待同一查询的其他章节自行重新搜索
+                self._abort(missing, str(e))
+                raise
+            self.searched_queries += len(missing)
+            failed = {}
+            for (normalized, query), search_doc in zip(missing.items(), search_docs):
+                if search_doc.get("error"):
+                    failed[normalized] = search_doc["error"]
+                else:
+                    self._add_results(normalized, [{**source, "query": query}
+                                                   for source in search_doc.get("results", [])])
+            # 搜索失败的查询不写入证据池，之后的章节（以及等待中的章节）重新搜索
+            for normalized, error in failed.items():
+                self._abort({normalized: None}, str(error))
+
+        for normalized, (query, future) in waiting.items():
+            try:
+                await future
+            except SearchAbortedError:
+                await self.search([query], config, requester)
+
+        sources = []
+        for query in dict.fromkeys(normalize_query(query) for query in search_queries):
+            sources.extend(self._results.get(query, []))
+
+        span = current_span()
+        if span is not None:
+            span.search_queries += len(search_queries)
+            span.search_bytes += sum(source_size(source) for source in sources)
+        return sources
+
+    def stats(self) -> dict:
+        """ 证据池复用统计 """
+        return {
+            "requested_queries": self.requested_queries,
+            "searched_queries": self.searched_queries,
+            "reused_queries": self.reused_queries,
+            "joined_in_flight": self.joined_in_flight,
+            "cross_section_reused": self.cross_section_reused,
+            "pooled_queries": len(self._results),
+            "indexed_chunks": len(self._index) if self._index is not None else 0,
+            "retrieved_sources": self.retrieved_sources,
+        }
+
+    def merge_similar_queries(self, search_queries: list[str]) -> tuple[list[str], list[dict]]:
+        """
+        与证据池中已搜索（或正在搜索）的查询语义重复的查询，替换为证据池中的查询，直接复用其搜索结果
+        返回替换后的查询 以及合并记录 [{query, matched, similarity}]
+        """
+        if not QUERY_DEDUP.get("enabled"):
+            return list(search_queries), []
+        pooled = list(dict.fromkeys([*self._results, *self._in_flight]))
+        resolved = []
+        merged = []
+        for query in search_queries:
+            normalized = normalize_query(query)
+            # 完全相同的查询由 search 直接复用
+            if normalized in self._results or normalized in self._in_flight:
+                resolved.append(query)
+                continue
+            match = find_similar_query(normalized, pooled)
+            if match is None:
+                resolved.append(query)
+            else:
+                resolved.append(match[0])
+                merged.append({"query": query, "matched": match[0], "similarity": match[1]})
+        record_query_dedups(len(merged))
+        return resolved, merged
+
+    async def retrieve(self, query: str, top_k: int, exclude: list[dict] = ()) -> list[dict]:
+        """
+        从整个报告的证据中检索与查询最相关的 top_k 个片段，按来源合并后返回（片段按原文顺序拼接为来源内容）
+        exclude 中已有的来源（URL 相同）不再返回，新的搜索结果在检索前才写入向量索引
+        """
+        if self._index_lock is None:
+            self._index = VectorIndex(load_embed_function(VECTOR_INDEX.get("embedding-function")))
+            self._index_lock = asyncio.Lock()
+        async with self._index_lock:
+            pending = [normalized for normalized in self._results if normalized not in self._indexed_queries]
+            records = self._index.pending([record for normalized in pending
+                                           for record in _chunk_records(self._results[normalized])])
+            if records:
+                vectors = await self._embed(self._index.embed_many, [record["text"] for record in records])
+                self._index.add(records, vectors)
+            self._indexed_queries.update(pending)
+            # 查询同样不在事件循环中向量化，矩阵乘法只需几毫秒，直接在事件循环中运行
+            query_vectors = await self._embed(self._index.embed_many, [query])
+            hits = self._index.search([query], top_k, query_vectors)[0]
+
+        excluded_urls = {canonicalize_url(source["url"]) for source in exclude}
+        grouped = {}
+        for _, record in hits:
+            url = canonicalize_url(record["url"])
+            if url not in excluded_urls:
+                grouped.setdefault(url, []).append(record)
+        sources = []
+        for records in grouped.values():
+            records.sort(key=lambda record: record["chunk"])
+            sources.append({"title": records[0]["title"], "url": records[0]["url"],
+                            "content": "\n".join(record["text"] for record in records)})
+        self.retrieved_sources += len(sources)
+        return sources
+
+    @staticmethod
+    async def _embed(embed_many, texts: list[str]):
+        """
+        默认的特征哈希为纯 Python 的 CPU 密集型任务，在共享的进程池中运行，不与事件循环争抢 GIL；
+        自定义的向量化函数（如本地向量模型）在线程池中运行，模型只在主进程中加载一次，而不是在每个子进程中各加载一份
+        """
+        if VECTOR_INDEX.get("embedding-function"):
+            return await asyncio.to_thread(embed_many, texts)
+        return await run_in_process(embed_many, texts)
+
+    def _add_results(self, normalized: str, sources: list[dict]):
+        self._results[normalized] = sources
+        future = self._in_flight.pop(normalized, None)
+        if future is not None and not future.done():
+            future.set_result(sources)
+
+    def _abort(self, queries: dict, reason: str):
+        for normalized in queries:
+            self._owners.pop(normalized, None)
+            future = self._in_flight.pop(normalized)
+            future.set_exception(SearchAbortedError(reason))
+            # 没有其他章节等待时，避免出现 Future exception was never retrieved
+            future.exception()
+
+    def is_searched(self, query: str) -> bool:
+        """ 查询是否已经成功搜索并写入证据池（搜索失败的查询可以重新搜索） """
+        return normalize_query(query) in self._results
+
+    def _count_reuse(self, normalized: str, requester: str):
+        self.reused_queries += 1
+        if self._owners.get(normalized) != requester:
+            self.cross_section_reused += 1
+
+
+def _chunk_records(sources: list[dict]) -> list[dict]:
+    """ 来源的网页正文片段（没有时为摘要，片段序号记为 -1）转换为向量索引的记录 """
+    records = []
+    for source in sources:
+        chunks = enumerate(source["chunks"]) if source.get("chunks") else [(-1, source.get("content") or "")]
+        for idx, chunk in chunks:
+            if chunk.strip():
+                records.append({"key": (canonicalize_url(source["url"]), idx), "title": source.get("title") or "",
+                                "url": source["url"], "chunk": idx, "text": chunk})
+    return records
+
+
+# 报告（thread_id） => 证据池
+_evidence_pools = {}
+
+
+def get_evidence_pool(config: RunnableConfig) -> EvidencePool:
+    """ 获取当前报告的证据池，没有 thread_id 时返回一个不共享的临时证据池 """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    if thread_id is None:
+        return EvidencePool("temporary")
+    pool = _evidence_pools.get(thread_id)
+    if pool is None:
+        pool = _evidence_pools.setdefault(thread_id, EvidencePool(thread_id))
+    return pool
+
+
+def release_evidence_pool(config: RunnableConfig):
+    """ 报告完成后释放证据池 """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    _evidence_pools.pop(thread_id, None)
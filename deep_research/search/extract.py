@@ -0,0 +1,94 @@
+"""
+网页正文提取与切分
+
+只依赖标准库，在进程池的子进程中运行（spawn 方式启动，子进程只需导入本模块），HTML 解析不占用事件循环
+"""
+import re
+from html.parser import HTMLParser
+
+# 内容不属于正文的标签，标签内的文本全部丢弃
+# header、form 不在其中：不少网页的标题写在 header 里，ASP.NET 等网页整个正文都包在 form 里
+_SKIPPED_TAGS = {"script", "style", "noscript", "svg", "template", "iframe", "nav", "footer", "aside", "button",
+                 "select"}
+# 块级标签，前后换行
+_BLOCK_TAGS = {"p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "main", "blockquote",
+               "pre", "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "hr", "figcaption"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TextExtractor(HTMLParser):
+    """ 按块级标签换行，丢弃脚本、样式、导航栏、页脚等非正文内容 """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        # head 单独处理：HTML5 允许省略 </head>，遇到 <body> 即视为 head 结束
+        self._in_head = False
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "head":
+            self._in_head = True
+        elif tag == "body":
+            self._in_head = False
+        elif tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._in_head = False
+        elif tag in _SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._in_head:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """ 提取网页正文，每个块级元素一行，重复出现的行（菜单、版权声明等）只保留第一次 """
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = {}
+    for line in "".join(extractor.parts).split("\n"):
+        line = _WHITESPACE.sub(" ", line).strip()
+        if line:
+            lines.setdefault(line, None)
+    return "\n".join(lines)
+
+
+def chunk_text(text: str, chunk_chars: int, overlap: int, max_chunks: int) -> list[str]:
+    """ 按段落切分为不超过 chunk_chars 个字符的片段，过长的段落直接截断，相邻片段重叠 overlap 个字符 """
+    # 截断后的长度要为重叠部分留出空间
+    piece_chars = max(chunk_chars - overlap - 1, 1)
+    pieces = []
+    for paragraph in text.split("\n"):
+        pieces.extend(paragraph[idx:idx + piece_chars] for idx in range(0, len(paragraph), piece_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > chunk_chars:
+            chunks.append(current)
+            if len(chunks) >= max_chunks:
+                return chunks
+            current = f"{current[-overlap:]}\n{piece}" if overlap else piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks[:max_chunks]
+
+
+def extract_chunks(html: str, chunk_chars: int, overlap: int, max_chunks: int) -> list[str]:
+    """ 进程池的任务入口：提取网页正文并切分为片段 """
+    return chunk_text(html_to_text(html), chunk_chars, overlap, max_chunks)
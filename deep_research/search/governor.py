@@ -0,0 +1,169 @@
+import asyncio
+import random
+import time
+import weakref
+
+import httpx
+from duckduckgo_search.exceptions import RatelimitException, TimeoutException
+from tavily.errors import UsageLimitExceededError
+
+from deep_research.admission import admission_controller
+from deep_research.config.application_project import SEARCH_RATE_LIMITS
+
+
+class RetryableSearchError(Exception):
+    """ 联网搜索服务返回了可重试的状态码（429 / 5xx） """
+
+    def __init__(self, status_code: int, message: str = "", response: httpx.Response = None):
+        super().__init__(f"状态码: {status_code}, 错误信息: {message}")
+        self.status_code = status_code
+        self.response = response
+
+
+def is_retryable(error: Exception) -> bool:
+    """ 判断联网搜索异常是否可以重试：限流（429）、服务端错误（5xx）、超时以及网络连接异常 """
+    if isinstance(error, (RetryableSearchError, UsageLimitExceededError, RatelimitException, TimeoutException,
+                          asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+def retry_after_seconds(error: Exception):
+    """ 读取服务端建议的重试等待时间（Retry-After） """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """ 令牌桶：以 rate 个/秒 的速度补充令牌，最多积攒 burst 个令牌 """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProviderScheduler:
+    """
+    单个联网搜索服务的调度器，进程内所有会话、所有章节共享
+    1. 令牌桶控制请求速率，准入控制器控制最大并发数（排队的请求按会话公平分配）
+    2. 遇到 429 / 5xx / 超时 时按带抖动的指数退避重试
+    3. 记录排队与重试指标
+
+    asyncio 的同步原语只能在创建它的事件循环中使用，因此令牌桶按事件循环隔离，指标全局共享
+    """
+
+    def __init__(self, provider: str, limits: dict):
+        self.provider = provider
+        self.limits = limits
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_wait_seconds = 0.0
+        # 并发控制由准入控制器按会话公平分配
+        self._admission = admission_controller.search(provider, limits.get("max-in-flight"))
+        self._buckets = weakref.WeakKeyDictionary()
+
+    async def run(self, func, *args, **kwargs):
+        """ 在限流与并发控制下调用联网搜索，可重试的异常会按退避策略重试 """
+        max_retries = self.limits.get("max-retries")
+        attempt = 0
+        while True:
+            try:
+                return await self._run_once(func, *args, **kwargs)
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = retry_after_seconds(e) or self._backoff(attempt)
+                print(f"联网搜索服务 [{self.provider}] 请求失败，{delay:.2f}秒后进行第{attempt}次重试，原因：{e}")
+                await asyncio.sleep(delay)
+
+    async def _run_once(self, func, *args, **kwargs):
+        bucket = self._get_bucket()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        enqueued_at = time.monotonic()
+        admitted = False
+        try:
+            async with self._admission.slot():
+                await bucket.acquire()
+                admitted = True
+                self.queued -= 1
+                self.total_wait_seconds += time.monotonic() - enqueued_at
+                self.requests += 1
+                self.in_flight += 1
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            # 排队期间被取消
+            if not admitted:
+                self.queued -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        """ 带抖动的指数退避，在 [上限/2, 上限] 之间随机取值 """
+        ceiling = min(self.limits.get("max-delay"), self.limits.get("base-delay") * 2 ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def _get_bucket(self) -> TokenBucket:
+        loop = asyncio.get_running_loop()
+        bucket = self._buckets.get(loop)
+        if bucket is None:
+            bucket = TokenBucket(self.limits.get("rate"), self.limits.get("burst"))
+            self._buckets[loop] = bucket
+        return bucket
+
+    def stats(self) -> dict:
+        """ 排队与重试指标 """
+        return {
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "avg_wait_seconds": self.total_wait_seconds / self.requests if self.requests else 0.0,
+        }
+
+
+_schedulers = {}
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    """ 获取联网搜索服务共享的调度器 """
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        limits = SEARCH_RATE_LIMITS.get(provider, SEARCH_RATE_LIMITS.get("default"))
+        scheduler = _schedulers.setdefault(provider, ProviderScheduler(provider, limits))
+    return scheduler
+
+
+def scheduler_stats() -> dict:
+    """ 所有联网搜索服务调度器的指标 """
+    return {provider: scheduler.stats() for provider, scheduler in _schedulers.items()}
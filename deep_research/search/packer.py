@@ -0,0 +1,127 @@
+import math
+import re
+from collections import Counter
+
+from deep_research.config.application_project import CONTEXT_PACKING
+from deep_research.tokenizer import estimate_tokens
+
+_LATIN_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_CJK_RUN_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+
+
+def lexical_terms(text: str) -> list[str]:
+    """
+    词法检索用的词项：英文/数字按单词切分，中日韩文本按相邻两个字符（bigram）切分，无需分词器
+    """
+    text = (text or "").casefold()
+    terms = _LATIN_WORD_PATTERN.findall(text)
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def bm25_scores(query: str, documents: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+    """ 计算每个文档相对查询的 BM25 得分 """
+    query_terms = set(lexical_terms(query))
+    doc_terms = [Counter(lexical_terms(document)) for document in documents]
+    if not documents or not query_terms:
+        return [0.0] * len(documents)
+
+    avg_length = sum(sum(terms.values()) for terms in doc_terms) / len(documents) or 1
+    scores = []
+    for terms in doc_terms:
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            frequency = terms.get(term, 0)
+            if not frequency:
+                continue
+            document_frequency = sum(1 for other in doc_terms if term in other)
+            idf = math.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+def format_source(source: dict) -> str:
+    """ 格式化单个来源，与 deduplicate_and_format_sources 的格式保持一致 """
+    return (f"\n\n标题: {source['title']}\n"
+            f"链接地址: {source['url']}\n"
+            f"链接内容摘要: {source['content']}\n\n\n")
+
+
+def context_token_budget(model_name: str) -> int:
+    """ 获取模型对应的资料来源 token 预算 """
+    budgets = CONTEXT_PACKING.get("token-budget")
+    return budgets.get(model_name, budgets.get("default"))
+
+
+def with_relevant_chunks(source: dict, query: str, max_chunks: int) -> dict:
+    """ 来源带有网页正文片段时，按 BM25 挑选与查询最相关的片段，按原文顺序补充到摘要之后 """
+    chunks = source.get("chunks")
+    if not chunks or max_chunks <= 0:
+        return source
+    scores = bm25_scores(query, chunks)
+    selected = sorted(sorted(range(len(chunks)), key=lambda idx: (-scores[idx], idx))[:max_chunks])
+    content = "\n".join([source.get("content") or "", "网页正文节选:"] + [chunks[idx] for idx in selected])
+    return {**source, "content": content}
+
+
+def pack_sources(sources: list[dict], query: str, token_budget: int) -> tuple[str, dict]:
+    """
+    按 token 预算装填资料来源
+    1. 来源带有网页正文片段时，先补充与查询（章节主题）最相关的片段
+    2. 使用 BM25 计算每个来源与查询的相关性并排序
+    3. 按相关性从高到低装填，预算不足时截断来源内容，剩余预算过少或相关性过低的来源直接丢弃
+    返回装填后的资料来源字符串 以及装填统计
+    """
+    sources = [with_relevant_chunks(source, query, CONTEXT_PACKING.get("chunks-per-source")) for source in sources]
+    scores = bm25_scores(query, [f"{source.get('title') or ''} {source.get('content') or ''}"
+                                 for source in sources])
+    ranked = sorted(zip(scores, range(len(sources)), sources), key=lambda item: (-item[0], item[1]))
+    top_score = ranked[0][0] if ranked else 0.0
+    min_score = top_score * CONTEXT_PACKING.get("min-score-ratio")
+    min_truncated_tokens = CONTEXT_PACKING.get("min-truncated-tokens")
+
+    formatted_text = "内容来源:"
+    used_tokens = estimate_tokens(formatted_text)
+    stats = {"token_budget": token_budget, "input_sources": len(sources), "kept_sources": 0,
+             "truncated_sources": 0, "dropped_sources": 0,
+             "input_tokens": sum(estimate_tokens(format_source(source)) for source in sources)}
+    for score, _, source in ranked:
+        if top_score > 0 and score < min_score:
+            stats["dropped_sources"] += 1
+            continue
+
+        text = format_source(source)
+        tokens = estimate_tokens(text)
+        remaining = token_budget - used_tokens
+        if tokens > remaining:
+            if remaining < min_truncated_tokens:
+                stats["dropped_sources"] += 1
+                continue
+            text = truncate_source(source, remaining)
+            tokens = estimate_tokens(text)
+            stats["truncated_sources"] += 1
+
+        formatted_text += text
+        used_tokens += tokens
+        stats["kept_sources"] += 1
+
+    stats["used_tokens"] = used_tokens
+    return formatted_text.rstrip(), stats
+
+
+def truncate_source(source: dict, token_budget: int) -> str:
+    """ 截断来源内容，使格式化后的来源不超过 token 预算 """
+    content = source.get("content") or ""
+    overhead = estimate_tokens(format_source({**source, "content": ""})) + 1
+    keep_chars = len(content)
+    while keep_chars > 0:
+        keep_chars = int(keep_chars * min(0.9, (token_budget - overhead) / max(estimate_tokens(content[:keep_chars]), 1)))
+        if estimate_tokens(content[:keep_chars]) + overhead <= token_budget:
+            break
+    return format_source({**source, "content": content[:max(keep_chars, 0)] + "…"})
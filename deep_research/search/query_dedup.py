@@ -0,0 +1,101 @@
+"""
+联网搜索查询的语义去重
+
+大模型在不同章节、不同评估迭代中生成的查询经常只是换了说法（调整词序、增减修饰词），
+归一化后的完全匹配识别不出来，重复搜索既浪费搜索配额，又会带回高度重叠的来源。
+在调用联网搜索之前按字符 n-gram 的 Jaccard 相似度（或本地向量的余弦相似度）过滤，阈值可调。
+只差一个词的查询（出口/进口、GPT-4o/GPT-4、年份不同）搜索的是不同的内容，相似度再高也不能视为重复，
+因此只有两个查询用词相同、仅词序或空格不同时才计算相似度，否则相似度为 0
+"""
+import re
+from typing import Optional
+
+from deep_research.config.application_project import QUERY_DEDUP
+from deep_research.embedding import embedder
+from deep_research.search.cache import normalize_query
+from deep_research.tracing import current_span
+
+
+# 英文单词、数字、型号（4o）整体作为一个词；中文等其他文字不分词，逐字处理
+_WORD = re.compile(r"[a-z0-9]+|[^\W_]")
+
+
+def _words(query: str) -> tuple[frozenset[str], tuple[str, ...]]:
+    """
+    查询的用词，与词序、空格无关：(英文单词与数字的集合, 中文等逐字排序后的序列)
+    忽略 QUERY_DEDUP 的 ignored-words 中的虚词，英文单词去掉复数的结尾 s
+    """
+    ignored = set(QUERY_DEDUP.get("ignored-words"))
+    words = set()
+    chars = []
+    for token in _WORD.findall(normalize_query(query)):
+        if token in ignored:
+            continue
+        if token.isascii():
+            words.add(token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token)
+        else:
+            chars.append(token)
+    return frozenset(words), tuple(sorted(chars))
+
+
+def _shingles(query: str, ngram_size: int) -> set[str]:
+    """
+    归一化后按空白与标点切词，取每个词内部的字符 n-gram（短于 n 的词整体保留），调整词序不影响结果
+    数字整体作为一个 n-gram
+    """
+    shingles = set()
+    for token in re.findall(r"\d+|[^\W\d_]+", normalize_query(query)):
+        if token.isdigit() or len(token) <= ngram_size:
+            shingles.add(token)
+        else:
+            shingles.update(token[begin:begin + ngram_size] for begin in range(len(token) - ngram_size + 1))
+    return shingles
+
+
+def query_similarity(left: str, right: str) -> float:
+    """ 两个联网搜索查询的相似度，方法见 QUERY_DEDUP 的 method，用词不同（任何一个词只出现在其中一个查询）时为 0 """
+    if _words(left) != _words(right):
+        return 0.0
+    if QUERY_DEDUP.get("method") == "embedding":
+        return float(embedder.embed(left) @ embedder.embed(right))
+    left_shingles = _shingles(left, QUERY_DEDUP.get("ngram-size"))
+    right_shingles = _shingles(right, QUERY_DEDUP.get("ngram-size"))
+    if not left_shingles or not right_shingles:
+        return 0.0
+    return len(left_shingles & right_shingles) / len(left_shingles | right_shingles)
+
+
+def find_similar_query(query: str, candidates) -> Optional[tuple[str, float]]:
+    """ 在候选查询中找出与查询最相似且不低于阈值的查询，返回 (候选查询, 相似度)，没有时返回 None """
+    threshold = QUERY_DEDUP.get("threshold").get(QUERY_DEDUP.get("method"))
+    best = None
+    for candidate in candidates:
+        similarity = query_similarity(query, candidate)
+        if similarity >= threshold and (best is None or similarity > best[1]):
+            best = (candidate, similarity)
+    return best
+
+
+def deduplicate_queries(queries: list[str], searched_queries: list[str]) -> tuple[list[str], list[dict]]:
+    """
+    跳过与已搜索的查询或同一批次中靠前的查询语义重复的查询
+    返回保留的查询 以及跳过的查询 [{query, matched, similarity}]
+    """
+    if not QUERY_DEDUP.get("enabled"):
+        return list(queries), []
+    kept = []
+    skipped = []
+    for query in queries:
+        match = find_similar_query(query, list(searched_queries) + kept)
+        if match is None:
+            kept.append(query)
+        else:
+            skipped.append({"query": query, "matched": match[0], "similarity": match[1]})
+    record_query_dedups(len(skipped))
+    return kept, skipped
+
+
+def record_query_dedups(count: int):
+    span = current_span()
+    if span is not None and count:
+        span.search_query_dedups += count
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from deep_research.config.application_project import SPECULATIVE_RESEARCH
+from deep_research.search.cache import normalize_query
+from deep_research.state import Queries, Section
+
+
+def section_key(topic: str, section: Section) -> str:
+    """ 章节的预研究键：主题 + 章节名称 + 章节描述，重新生成的报告计划中三者一致的章节才复用预研究结果 """
+    return "\x00".join(normalize_query(text) for text in (topic, section.name, section.description))
+
+
+class SpeculativeResearch:
+    """
+    报告级别的预研究：报告计划等待用户确认期间，提前为需要研究的章节生成联网搜索查询并搜索（结果写入证据池）
+    1. 用户批准报告计划后，章节直接采用预研究的查询，搜索结果从证据池复用（搜索中的查询等待同一个结果）
+    2. 用户提供反馈后，取消未完成的预研究；已完成的预研究在重新生成的报告计划中仍然一致时直接复用
+    """
+
+    def __init__(self, report_id: str):
+        self.report_id = report_id
+        # 章节预研究键 => 预研究任务（返回章节的联网搜索查询）
+        self._tasks = {}
+        self.started = 0
+        self.reused = 0
+        self.adopted = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def start(self, topic: str, sections: list[Section],
+              research: Callable[[Section], Awaitable[Queries]]):
+        """ 为需要研究的章节启动预研究，已完成或正在进行的相同章节不重复启动 """
+        for section in sections:
+            if not section.research:
+                continue
+            key = section_key(topic, section)
+            task = self._tasks.get(key)
+            if task is not None and not task.cancelled() and (not task.done() or task.exception() is None):
+                self.reused += 1
+                continue
+            task = asyncio.create_task(research(section))
+            task.add_done_callback(lambda done, name=section.name: _log_failure(name, done))
+            self._tasks[key] = task
+            self.started += 1
+
+    async def adopt(self, topic: str, section: Section) -> Optional[Queries]:
+        """ 采用章节的预研究结果，没有预研究或预研究失败时返回 None """
+        task = self._tasks.pop(section_key(topic, section), None)
+        if task is None:
+            return None
+        try:
+            queries = await task
+        except asyncio.CancelledError:
+            # 仅预研究任务被取消时降级为正常研究，当前节点被取消时继续向上抛出
+            if not task.cancelled():
+                raise
+            self.failed += 1
+            return None
+        except Exception:
+            self.failed += 1
+            return None
+        self.adopted += 1
+        return queries
+
+    def cancel_pending(self, topic: str = None, keep: list[Section] = ()):
+        """ 取消未完成的预研究（keep 中的章节除外），已完成的结果保留 """
+        keep_keys = {section_key(topic, section) for section in keep}
+        for key, task in list(self._tasks.items()):
+            if not task.done() and key not in keep_keys:
+                task.cancel()
+                self._tasks.pop(key)
+                self.cancelled += 1
+
+    def stats(self) -> dict:
+        """ 预研究统计 """
+        return {
+            "started": self.started,
+            "reused": self.reused,
+            "adopted": self.adopted,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
+
+
+def _log_failure(section_name: str, task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"章节 [{section_name}] 预研究失败，章节研究时将重新生成联网搜索查询，原因是：{task.exception()}")
+
+
+# 报告（thread_id） => 预研究
+_speculative_researches = {}
+
+
+def speculative_research_enabled(config: RunnableConfig) -> bool:
+    """ 是否开启预研究，单次运行可以通过 config 的 configurable.speculative_research 覆盖默认配置 """
+    enabled = (config or {}).get("configurable", {}).get("speculative_research")
+    return SPECULATIVE_RESEARCH.get("enabled") if enabled is None else enabled
+
+
+def get_speculative_research(config: RunnableConfig) -> SpeculativeResearch:
+    """ 获取当前报告的预研究，没有 thread_id 时返回一个不共享的临时预研究 """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    if thread_id is None:
+        return SpeculativeResearch("temporary")
+    return _speculative_researches.setdefault(thread_id, SpeculativeResearch(thread_id))
+
+
+def release_speculative_research(config: RunnableConfig):
+    """ 报告完成（或失败、被取消）后释放预研究，取消仍未完成的预研究 """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    speculative_research = _speculative_researches.pop(thread_id, None)
+    if speculative_research is not None:
+        speculative_research.cancel_pending()
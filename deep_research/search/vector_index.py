@@ -0,0 +1,85 @@
+import threading
+from typing import Callable
+
+import numpy as np
+
+
+class VectorIndex:
+    """
+    内存向量索引
+    1. 向量按行存放在一个二维数组中，容量不足时按倍数扩容，追加的均摊成本为常数
+    2. 向量与查询向量均做 L2 归一化，点积即为余弦相似度
+    3. 检索为一次矩阵乘法 + argpartition 选出 top-k，多个查询一起检索，数千个片段毫秒级返回
+    """
+
+    def __init__(self, embed_many: Callable[[list[str]], np.ndarray]):
+        self.embed_many = embed_many
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._size = 0
+        self._keys = set()
+        # 与矩阵的行一一对应
+        self.records: list[dict] = []
+
+    def __len__(self):
+        return self._size
+
+    def pending(self, records: list[dict]) -> list[dict]:
+        """ 过滤掉 key 重复或已经添加过的记录 """
+        return [record for record in {record["key"]: record for record in records}.values()
+                if record["key"] not in self._keys]
+
+    def add(self, records: list[dict], vectors=None) -> int:
+        """
+        添加记录（需包含 key 与 text 字段），返回实际添加的记录数
+        vectors 为调用方预先计算好的、与 records 一一对应的向量（先通过 pending 过滤，再在进程池中向量化），
+        为空时过滤掉已添加的记录后直接向量化
+        """
+        if vectors is None:
+            records = self.pending(records)
+            vectors = self.embed_many([record["text"] for record in records]) if records else None
+        if not records:
+            return 0
+        vectors = _normalize(vectors)
+        with self._lock:
+            self._reserve(len(records), vectors.shape[1])
+            self._matrix[self._size:self._size + len(records)] = vectors
+            self._size += len(records)
+            self.records.extend(records)
+            self._keys.update(record["key"] for record in records)
+        return len(records)
+
+    def search(self, queries: list[str], top_k: int, query_vectors=None) -> list[list[tuple[float, dict]]]:
+        """
+        批量检索，返回每个查询按相似度从高到低排列的 (相似度, 记录) 列表
+        query_vectors 为调用方预先计算好的查询向量（如在事件循环之外向量化），为空时直接向量化
+        """
+        if not queries or not self._size or top_k <= 0:
+            return [[] for _ in queries]
+        query_vectors = _normalize(self.embed_many(queries) if query_vectors is None else query_vectors)
+        with self._lock:
+            size = self._size
+            scores = query_vectors @ self._matrix[:size].T
+        top_k = min(top_k, size)
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [[(float(score), self.records[idx]) for score, idx in zip(row_scores, row)]
+                for row_scores, row in zip(top_scores, top)]
+
+    def _reserve(self, count: int, dim: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if self._size + count <= capacity:
+            return
+        matrix = np.zeros((max(capacity * 2, self._size + count, 64), dim), dtype=np.float32)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
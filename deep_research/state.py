@@ -53,6 +53,8 @@ class ReportState(TypedDict):
     sections: list[Section]
     # 已完成的章节列表
     completed_sections: Annotated[list, operator.add]
+    # 已完成的研究章节的摘要列表（name / digest），章节完成时生成
+    section_digests: Annotated[list, operator.add]
     # 根据研究完成的章节内容字符串，用来撰写最终章节 报告级别
     report_sections_from_research: str
     # 最终报告
@@ -69,10 +71,14 @@ class SectionState(TypedDict):
     search_iterations: int
     # 联网搜索查询列表
     search_queries: list[SearchQuery]
-    # 从联网搜索中获取的格式化来源内容的字符串
-    source_str: str
+    # 历次联网搜索累积的结构化来源列表（title/url/content/query/search_iteration），撰写章节时才按 token 预算格式化
+    sources: list[dict]
+    # 已经执行过的联网搜索查询（归一化后），重复的查询不再搜索
+    searched_queries: list[str]
     # 最终章节列表
     completed_sections: list[Section]
+    # 最终章节的摘要列表（name / digest）
+    section_digests: list[dict]
     # 当前父节点 step
     parent_step_id: str
 
@@ -93,6 +99,8 @@ class SectionOutputState(TypedDict):
     """ 章节输出状态机 """
     #  已完成的章节
     completed_sections: list[Section]
+    # 已完成的章节的摘要
+    section_digests: list[dict]
 
 
 
@@ -0,0 +1,15 @@
+import re
+
+# 中日韩字符，大模型分词时通常一个字符约为一个 token
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数，不依赖具体模型的分词器
+    中日韩字符按 1 个字符 1 个 token 计算，其余字符按 4 个字符 1 个 token 计算
+    """
+    if not text:
+        return 0
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
@@ -0,0 +1,393 @@
+"""
+节点级别的链路追踪
+
+BaseNode / BaseSectionNode 的子类在定义时会自动包装 ainvoke，每次节点运行记录一个 NodeSpan：
+1. 耗时、首 token 耗时、prompt / completion / 思维链 token 数、命中模型服务前缀缓存的 prompt token 数、
+   大模型调用次数与估算费用
+2. 联网搜索的查询数、实际请求数、缓存命中数、返回的来源字节数、抓取正文的网页数
+3. 流式输出收到的 token 分块数与实际发送到前端的消息数
+4. 大模型与联网搜索调用的准入排队耗时
+5. 标签：thread_id、章节名称、检索迭代次数
+
+节点运行结束后，NodeSpan 追加写入 JSONL 文件，同时汇总为 Prometheus 文本格式的指标。
+大模型的 token 用量通过 langchain 的回调获取，节点内的大模型调用无需传递任何参数。
+
+汇总 JSONL 文件，找出最慢的节点以及费用最高的章节（项目根目录）：
+    python -m deep_research.tracing .cache/traces.jsonl
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from deep_research.config.application_project import TRACING, MODEL_PRICING
+from deep_research.tokenizer import estimate_tokens
+
+
+class NodeSpan:
+    """ 单次节点运行的追踪记录 """
+
+    def __init__(self, node: str, thread_id: Optional[str], section: Optional[str],
+                 search_iteration: Optional[int]):
+        self.node = node
+        self.thread_id = thread_id
+        self.section = section
+        self.search_iteration = search_iteration
+        self.started_at = time.time()
+        self._begin = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.ttft = None
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reasoning_tokens = 0
+        self.cost = 0.0
+        self.search_queries = 0
+        self.search_requests = 0
+        self.search_cache_hits = 0
+        self.search_query_dedups = 0
+        self.search_bytes = 0
+        self.page_fetches = 0
+        self.llm_cache_hits = 0
+        self.llm_fallbacks = 0
+        self.llm_hedges = 0
+        self.llm_hedge_wins = 0
+        self.stream_tokens = 0
+        self.stream_messages = 0
+        self.admission_wait_seconds = 0.0
+
+    def finish(self, error: BaseException = None):
+        self.duration = time.perf_counter() - self._begin
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in vars(self).items() if not key.startswith("_")}
+
+
+class SpanCallbackHandler(BaseCallbackHandler):
+    """ 将节点内大模型调用的首 token 耗时、token 用量与费用记录到当前 NodeSpan """
+
+    # 在事件循环中直接执行，不放到线程池
+    run_inline = True
+
+    def __init__(self, span: NodeSpan):
+        self.span = span
+        # run_id => (开始时间, 模型名称, 是否已收到首个 token, 输入 token 估算值)
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            metadata: Optional[dict] = None, **kwargs):
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._runs[run_id] = [time.perf_counter(), (metadata or {}).get("ls_model_name"), False,
+                              estimate_tokens(prompt)]
+
+    def on_llm_new_token(self, token: str, *, chunk=None, run_id: UUID, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None or run[2]:
+            return
+        message = getattr(chunk, "message", None)
+        reasoning = getattr(message, "additional_kwargs", {}).get("reasoning_content") if message else None
+        if token or reasoning:
+            run[2] = True
+            if self.span.ttft is None:
+                self.span.ttft = time.perf_counter() - run[0]
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        begin, model_name, _, estimated_prompt_tokens = run
+        self.span.llm_calls += 1
+        self.span.llm_seconds += time.perf_counter() - begin
+
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        reasoning_content = (getattr(message, "additional_kwargs", None) or {}).get("reasoning_content") or ""
+        # 流式调用时部分模型服务不返回 token 用量，按文本估算
+        prompt_tokens = usage.get("input_tokens") or estimated_prompt_tokens
+        reasoning_tokens = ((usage.get("output_token_details") or {}).get("reasoning")
+                            or estimate_tokens(reasoning_content))
+        completion_tokens = usage.get("output_tokens")
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(generation.text if generation else "") + reasoning_tokens
+        completion_tokens -= min(reasoning_tokens, completion_tokens)
+        cached_tokens = min(cached_prompt_tokens(generation, usage), prompt_tokens)
+
+        self.span.prompt_tokens += prompt_tokens
+        self.span.cached_prompt_tokens += cached_tokens
+        self.span.completion_tokens += completion_tokens
+        self.span.reasoning_tokens += reasoning_tokens
+        pricing = MODEL_PRICING.get(model_name, MODEL_PRICING.get("default"))
+        # 命中前缀缓存的 prompt token 按缓存命中的价格计费
+        self.span.cost += ((prompt_tokens - cached_tokens) * pricing.get("input")
+                           + cached_tokens * pricing.get("cached-input", pricing.get("input"))
+                           + (completion_tokens + reasoning_tokens) * pricing.get("output")) / 1_000_000
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+def cached_prompt_tokens(generation, usage: dict) -> int:
+    """
+    命中模型服务前缀缓存的 prompt token 数
+    1. langchain 统一的 usage_metadata.input_token_details.cache_read（OpenAI 兼容接口的 prompt_tokens_details.cached_tokens）
+    2. 模型服务原始的 token 用量：DeepSeek 的 prompt_cache_hit_tokens，DashScope 的 prompt_tokens_details.cached_tokens
+    """
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached:
+        return cached
+    message = getattr(generation, "message", None)
+    for metadata in (getattr(generation, "generation_info", None), getattr(message, "response_metadata", None)):
+        token_usage = (metadata or {}).get("token_usage") or {}
+        cached = (token_usage.get("prompt_cache_hit_tokens")
+                  or (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens"))
+        if cached:
+            return cached
+    return 0
+
+
+class Histogram:
+    """ Prometheus 直方图 """
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+
+
+class Tracer:
+    """
+    追踪记录的导出：JSONL 文件 + Prometheus 文本格式
+    Prometheus 指标只按节点（以及 token 类型）打标签，thread_id、章节等高基数的标签只写入 JSONL
+    """
+
+    COUNTERS = {
+        "llm_calls": ("deep_research_llm_calls_total", "大模型调用次数"),
+        "cost": ("deep_research_llm_cost_total", "大模型调用的估算费用（元）"),
+        "cached_prompt_tokens": ("deep_research_llm_cached_prompt_tokens_total", "命中模型服务前缀缓存的 prompt token 数"),
+        "search_queries": ("deep_research_search_queries_total", "节点发起的联网搜索查询数"),
+        "search_requests": ("deep_research_search_requests_total", "实际请求联网搜索服务的查询数"),
+        "search_cache_hits": ("deep_research_search_cache_hits_total", "联网搜索缓存命中数"),
+        "search_query_dedups": ("deep_research_search_query_dedups_total", "跳过或合并的语义重复查询数"),
+        "search_bytes": ("deep_research_search_bytes_total", "联网搜索返回给节点的来源字节数"),
+        "page_fetches": ("deep_research_page_fetches_total", "抓取并提取正文的网页数"),
+        "llm_cache_hits": ("deep_research_llm_cache_hits_total", "大模型响应缓存命中数"),
+        "llm_fallbacks": ("deep_research_llm_fallbacks_total", "主模型出错或超时后由降级模型完成的调用数"),
+        "llm_hedges": ("deep_research_llm_hedges_total", "发送的对冲请求数"),
+        "llm_hedge_wins": ("deep_research_llm_hedge_wins_total", "对冲请求先于主模型返回的次数"),
+        "stream_tokens": ("deep_research_stream_tokens_total", "节点流式输出收到的 token 分块数"),
+        "stream_messages": ("deep_research_stream_messages_total", "节点流式输出实际发送到前端的消息数"),
+        "admission_wait_seconds": ("deep_research_admission_wait_seconds_total", "节点内大模型与联网搜索调用的准入排队耗时（秒）"),
+    }
+    TOKEN_TYPES = {"prompt": "prompt_tokens", "completion": "completion_tokens", "reasoning": "reasoning_tokens"}
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._durations = {}
+        self._ttfts = {}
+        self._counters = {}
+        self._tokens = {}
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """ 注册额外的指标采集函数，返回 Prometheus 文本格式的行，如准入控制的排队指标 """
+        self._collectors.append(collector)
+
+    def record(self, span: NodeSpan):
+        """ 汇总指标 并追加写入 JSONL 文件 """
+        record = span.to_dict()
+        with self._lock:
+            self._observe(record)
+            path = self.config.get("jsonl-path")
+            if path:
+                _ensure_dir(path)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def load_jsonl(self, path: str, offset: int = 0):
+        """ 从 JSONL 文件的指定位置开始汇总指标，用于汇总多进程运行时子进程写入的追踪记录 """
+        with open(path, encoding="utf-8") as f:
+            f.seek(offset)
+            records = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            for record in records:
+                self._observe(record)
+
+    def _observe(self, record: dict):
+        node = record["node"]
+        key = (node, record["status"])
+        self._runs[key] = self._runs.get(key, 0) + 1
+        self._durations.setdefault(node, Histogram(self.config.get("duration-buckets"))).observe(record["duration"])
+        if record["ttft"] is not None:
+            self._ttfts.setdefault(node, Histogram(self.config.get("ttft-buckets"))).observe(record["ttft"])
+        for attribute in self.COUNTERS:
+            key = (attribute, node)
+            self._counters[key] = self._counters.get(key, 0) + record.get(attribute, 0)
+        for token_type, attribute in self.TOKEN_TYPES.items():
+            key = (node, token_type)
+            self._tokens[key] = self._tokens.get(key, 0) + record[attribute]
+
+    def render_prometheus(self) -> str:
+        """ Prometheus 文本格式的指标 """
+        lines = []
+        with self._lock:
+            lines += ["# HELP deep_research_node_runs_total 节点运行次数",
+                      "# TYPE deep_research_node_runs_total counter"]
+            lines += [f'deep_research_node_runs_total{{node="{node}",status="{status}"}} {count}'
+                      for (node, status), count in sorted(self._runs.items())]
+            lines += _render_histograms("deep_research_node_duration_seconds", "节点耗时（秒）", self._durations)
+            lines += _render_histograms("deep_research_llm_ttft_seconds", "节点内首次大模型调用的首 token 耗时（秒）",
+                                        self._ttfts)
+            lines += ["# HELP deep_research_llm_tokens_total 大模型 token 用量",
+                      "# TYPE deep_research_llm_tokens_total counter"]
+            lines += [f'deep_research_llm_tokens_total{{node="{node}",type="{token_type}"}} {count}'
+                      for (node, token_type), count in sorted(self._tokens.items())]
+            for attribute, (name, description) in self.COUNTERS.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{node="{node}"}} {value}'
+                          for (counter, node), value in sorted(self._counters.items()) if counter == attribute]
+        for collector in self._collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str = None):
+        """ 将指标写入 Prometheus 文本文件，先写临时文件再替换，避免采集到写了一半的文件 """
+        path = path or self.config.get("prometheus-path")
+        if not path:
+            return
+        _ensure_dir(path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _render_histograms(name: str, description: str, histograms: dict) -> list[str]:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for node, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{node="{node}",le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{node="{node}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{node="{node}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{node="{node}"}} {histogram.count}')
+    return lines
+
+
+def _ensure_dir(path: str):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+# 当前节点的追踪记录，每个节点运行在独立的 asyncio 任务中，互不影响
+_current_span: ContextVar[Optional[NodeSpan]] = ContextVar("deep_research_span", default=None)
+# 当前节点的回调，注册为 langchain 的 configure hook 后，节点内所有大模型调用都会自动带上该回调
+_span_handler: ContextVar[Optional[SpanCallbackHandler]] = ContextVar("deep_research_span_handler", default=None)
+register_configure_hook(_span_handler, inheritable=True)
+
+# 全局共享的追踪记录导出器
+tracer = Tracer(TRACING)
+
+
+def current_span() -> Optional[NodeSpan]:
+    """ 获取当前节点的追踪记录，不在节点内或未开启追踪时返回 None """
+    return _current_span.get()
+
+
+def trace_node(ainvoke):
+    """ 包装节点的 ainvoke，记录节点运行的追踪信息 """
+
+    @functools.wraps(ainvoke)
+    async def traced_ainvoke(self, state, config):
+        if not TRACING.get("enabled"):
+            return await ainvoke(self, state, config)
+        section = state.get("section")
+        span = NodeSpan(node=self.get_node_name(),
+                        thread_id=(config or {}).get("configurable", {}).get("thread_id"),
+                        section=getattr(section, "name", None),
+                        search_iteration=state.get("search_iterations"))
+        span_token = _current_span.set(span)
+        handler_token = _span_handler.set(SpanCallbackHandler(span))
+        error = None
+        try:
+            return await ainvoke(self, state, config)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _span_handler.reset(handler_token)
+            _current_span.reset(span_token)
+            span.finish(error)
+            tracer.record(span)
+
+    return traced_ainvoke
+
+
+def summarize_traces(path: str, top: int = 10):
+    """ 汇总 JSONL 追踪文件：按节点统计耗时，按章节统计费用与 token 用量 """
+    with open(path, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+
+    nodes = {}
+    prompt_caches = {}
+    sections = {}
+    for span in spans:
+        nodes.setdefault(span["node"], []).append(span["duration"])
+        if span["prompt_tokens"]:
+            prompt_cache = prompt_caches.setdefault(span["node"], [0, 0])
+            prompt_cache[0] += span.get("cached_prompt_tokens", 0)
+            prompt_cache[1] += span["prompt_tokens"]
+        if span.get("section"):
+            key = (span.get("thread_id"), span["section"])
+            stats = sections.setdefault(key, {"cost": 0.0, "tokens": 0, "duration": 0.0, "search_queries": 0})
+            stats["cost"] += span["cost"]
+            stats["tokens"] += span["prompt_tokens"] + span["completion_tokens"] + span["reasoning_tokens"]
+            stats["duration"] += span["duration"]
+            stats["search_queries"] += span["search_queries"]
+
+    print(f"节点耗时（共 {len(spans)} 条记录）：")
+    for node, durations in sorted(nodes.items(), key=lambda item: -sum(item[1]) / len(item[1])):
+        durations.sort()
+        print(f"  {node:<36} 次数 {len(durations):>5}  平均 {sum(durations) / len(durations):>8.2f}s  "
+              f"p95 {durations[min(int(len(durations) * 0.95), len(durations) - 1)]:>8.2f}s  "
+              f"最大 {durations[-1]:>8.2f}s")
+    print("prompt 前缀缓存命中：")
+    for node, (cached, prompt) in sorted(prompt_caches.items(), key=lambda item: -item[1][1]):
+        print(f"  {node:<36} prompt token {prompt:>9}  命中缓存 {cached:>9}  命中率 {cached / prompt:>6.1%}")
+    print(f"费用最高的 {top} 个章节：")
+    for (thread_id, section), stats in sorted(sections.items(), key=lambda item: -item[1]["cost"])[:top]:
+        print(f"  [{thread_id}] {section}  费用 {stats['cost']:.4f} 元  token {stats['tokens']}  "
+              f"耗时 {stats['duration']:.2f}s  搜索查询 {stats['search_queries']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="汇总节点追踪记录")
+    parser.add_argument("path", nargs="?", default=TRACING.get("jsonl-path"), help="JSONL 追踪文件")
+    parser.add_argument("--top", type=int, default=10, help="展示费用最高的章节个数")
+    args = parser.parse_args()
+    summarize_traces(args.path, args.top)
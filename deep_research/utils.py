@@ -1,143 +1,315 @@
 import asyncio
+import hashlib
+import random
+from concurrent.futures import ThreadPoolExecutor
 
 from langchain_community.tools import DuckDuckGoSearchResults
 from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
-import requests
+import httpx
 import os
+import weakref
 from dotenv import load_dotenv
 from datetime import datetime
 
-from tavily import AsyncTavilyClient, TavilyClient
+from langchain_core.runnables import RunnableConfig
+from tavily import AsyncTavilyClient
 
 from deep_research.state import Section, Sections, Feedback
-from deep_research.config.application_project import WEB_SEARCH_TYPE, WEB_SEARCH_MAX_RESULTS
+from deep_research.config.application_project import WEB_SEARCH_TYPE, WEB_SEARCH_MAX_RESULTS, SEARCH_CACHE, \
+    SEARCH_RATE_LIMITS, WEB_SEARCH_TIMEOUT, FAKE_SEARCH
+from deep_research.llm.mock import sample_latency
+from deep_research.search.cache import search_cache
+from deep_research.search.content import attach_page_contents, needs_page_contents
+from deep_research.search.dedup import deduplicate_sources
+from deep_research.search.governor import get_scheduler, RetryableSearchError
+from deep_research.tracing import current_span
 
 load_dotenv()
 
 
-async def web_search(search_queries):
+async def web_search(search_queries, config: RunnableConfig = None):
     """ 联网搜索通用接口 """
+    search_results = await cached_search(list(search_queries), config)
+    return deduplicate_and_format_sources(search_results)
+
+
+async def search_sources(search_queries, config: RunnableConfig = None) -> list[dict]:
+    """ 联网搜索，返回结构化的来源列表，每个来源记录了对应的查询 """
+    search_queries = list(search_queries)
+    search_results = await cached_search(search_queries, config)
+    sources_list = []
+    for query, response in zip(search_queries, search_results):
+        sources_list.extend({**source, "query": query} for source in response.get('results', []))
+    return sources_list
+
+
+async def cached_search(search_queries: list[str], config: RunnableConfig = None):
+    """
+    带缓存的联网搜索，只有未命中缓存的查询才会真正请求联网搜索服务
+    开启网页正文抓取（PAGE_CONTENT）时，抓取到的正文片段与搜索结果一起写入缓存
+    返回结果与查询一一对应
+    """
+    configurable = (config or {}).get("configurable", {})
+    span = current_span()
+    if not SEARCH_CACHE.get("enabled") or configurable.get("bypass_search_cache"):
+        if span is not None:
+            span.search_requests += len(search_queries)
+        return await attach_page_contents(await provider_search(search_queries))
+
+    cached = await asyncio.to_thread(search_cache.get_many, WEB_SEARCH_TYPE, search_queries, WEB_SEARCH_MAX_RESULTS)
+    missed_queries = [query for query in search_queries if query not in cached]
+    # 缓存中还没有网页正文的结果（如开启网页正文抓取之前缓存的结果）同样需要抓取
+    stale_queries = [query for query, doc in cached.items() if needs_page_contents(doc)]
+    if span is not None:
+        span.search_cache_hits += len(cached)
+        span.search_requests += len(missed_queries)
+    print(f"联网搜索缓存：命中 {len(search_queries) - len(missed_queries)} 个，"
+          f"未命中 {len(missed_queries)} 个，累计统计：{search_cache.stats()}")
+    if not missed_queries and not stale_queries:
+        return [cached[query] for query in search_queries]
+
+    search_docs = await provider_search(missed_queries) if missed_queries else []
+    fresh = dict(zip(missed_queries + stale_queries,
+                     await attach_page_contents(search_docs + [cached[query] for query in stale_queries])))
+    # 失败的查询不写入缓存
+    await asyncio.to_thread(search_cache.put_many, WEB_SEARCH_TYPE,
+                            {query: doc for query, doc in fresh.items() if not doc.get("error")},
+                            WEB_SEARCH_MAX_RESULTS)
+    return [fresh[query] if query in fresh else cached[query] for query in search_queries]
+
+
+async def provider_search(search_queries: list[str]):
+    """ 按照配置的联网搜索服务（WEB_SEARCH_TYPE）进行联网搜索 """
     if WEB_SEARCH_TYPE == 'tavily':
-        search_results = await tavily_search(search_queries)
-        return deduplicate_and_format_sources(search_results)
+        return await tavily_search(search_queries)
     elif WEB_SEARCH_TYPE == 'duckduckgo':
-        search_results = await duckduckgo_search(search_queries)
-        return deduplicate_and_format_sources(search_results)
+        return await duckduckgo_search(search_queries)
     elif WEB_SEARCH_TYPE == 'bocha':
-        search_results = await bocha_search(search_queries)
-        return deduplicate_and_format_sources(search_results)
+        return await bocha_search(search_queries)
+    elif WEB_SEARCH_TYPE == 'fake':
+        return await fake_search(search_queries)
     else:
         raise ValueError(f"不支持此联网搜索类型（WEB_SEARCH_TYPE）:{WEB_SEARCH_TYPE}")
 
 
 async def tavily_search(search_queries):
     """ tavily 联网搜索接口 """
-
-    # 同步调度
-    # tavily_client = TavilyClient()
-    # search_docs = []
-    # for query in search_queries:
-    #     search_docs.append(
-    #         tavily_client.search(
-    #             query,
-    #             max_results=WEB_SEARCH_MAX_RESULTS,
-    #             include_raw_content=False,
-    #             topic="general"
-    #         )
-    #     )
-
-    # 异步存在 并发上限异常问题
-    tavily_async_client = AsyncTavilyClient()
+    # 所有查询共享 tavily 调度器的限流与并发控制，避免触发并发上限异常
+    scheduler = get_scheduler("tavily")
+    tavily_async_client = get_tavily_client()
     search_tasks = []
     for query in search_queries:
         search_tasks.append(
-            tavily_async_client.search(
+            scheduler.run(
+                tavily_async_client.search,
                 query,
-                max_results=5,
+                max_results=WEB_SEARCH_MAX_RESULTS,
                 include_raw_content=False,
                 topic="general"
             )
         )
 
     # Execute all searches concurrently
-    search_docs = await asyncio.gather(*search_tasks)
+    search_docs = await asyncio.gather(*search_tasks, return_exceptions=True)
+    print(f"tavily 联网搜索调度指标：{scheduler.stats()}")
+
+    return [failed_search_doc(query, doc) if isinstance(doc, Exception) else doc
+            for query, doc in zip(search_queries, search_docs)]
 
-    return search_docs
+
+_tavily_client = None
+
+
+def get_tavily_client() -> AsyncTavilyClient:
+    """ 复用 tavily 异步客户端 """
+    global _tavily_client
+    if _tavily_client is None:
+        _tavily_client = AsyncTavilyClient()
+    return _tavily_client
+
+
+def failed_search_doc(query: str, error: Exception) -> dict:
+    """ 单个查询联网搜索失败时，返回没有结果的搜索结构，避免影响同一批次的其他查询 """
+    print(f"联网搜索查询 [{query}] 失败，原因是：{error}")
+    return {
+        "query": query,
+        "follow_up_questions": None,
+        "answer": None,
+        "images": [],
+        "results": [],
+        "error": str(error),
+    }
 
 
 async def duckduckgo_search(search_queries):
-    """ duckduckgo 联网搜索接口 """
-    wrapper = DuckDuckGoSearchAPIWrapper(region="cn-zh", time="d", source="text", max_results=WEB_SEARCH_MAX_RESULTS)
-    search_client = DuckDuckGoSearchResults(api_wrapper=wrapper, output_format="list")
-    search_docs = []
-    for query in search_queries:
-        results = []
-        pages = search_client.invoke(query)
-        for page in pages:
-            results.append({
-                "title": page["title"],
-                "url": page['link'],
-                "content": page['snippet'],
-            })
-        search_docs.append(
-            {
-                "query": query,
-                "follow_up_questions": None,
-                "answer": None,
-                "images": [],
-                "results": results
-            }
-        )
+    """ duckduckgo 联网搜索接口，同步的搜索客户端在有界线程池中并行执行，不阻塞事件循环 """
+    scheduler = get_scheduler("duckduckgo")
+    search_docs = await asyncio.gather(*[scheduler.run(duckduckgo_search_query, query)
+                                         for query in search_queries],
+                                       return_exceptions=True)
+    print(f"duckduckgo 联网搜索调度指标：{scheduler.stats()}")
+
+    return [failed_search_doc(query, doc) if isinstance(doc, Exception) else doc
+            for query, doc in zip(search_queries, search_docs)]
+
+
+async def duckduckgo_search_query(query: str) -> dict:
+    """ duckduckgo 单个查询的联网搜索，超过 WEB_SEARCH_TIMEOUT 未返回则视为失败 """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_duckduckgo_executor, get_duckduckgo_client().invoke, query)
+    try:
+        pages = await asyncio.wait_for(asyncio.shield(future), timeout=WEB_SEARCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        # 搜索客户端不支持设置请求超时，超时后阻塞的线程仍占着线程池。
+        # 等线程结束（ddgs 自身的网络超时兜底）再抛出，准入名额覆盖线程的整个生命周期，
+        # 否则重试会排在挂起的线程后面，超时也就名存实亡
+        await asyncio.wait([future])
+        raise
+    results = []
+    for page in pages:
+        results.append({
+            "title": page["title"],
+            "url": page['link'],
+            "content": page['snippet'],
+        })
+    return {
+        "query": query,
+        "follow_up_questions": None,
+        "answer": None,
+        "images": [],
+        "results": results
+    }
 
-    return search_docs
+
+# duckduckgo 搜索专用的有界线程池，线程数与 duckduckgo 的最大并发数一致
+_duckduckgo_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_RATE_LIMITS.get("duckduckgo", SEARCH_RATE_LIMITS.get("default")).get("max-in-flight"),
+    thread_name_prefix="duckduckgo-search")
+
+_duckduckgo_client = None
+
+
+def get_duckduckgo_client() -> DuckDuckGoSearchResults:
+    """ 复用 duckduckgo 搜索客户端 """
+    global _duckduckgo_client
+    if _duckduckgo_client is None:
+        wrapper = DuckDuckGoSearchAPIWrapper(region="cn-zh", time="d", source="text",
+                                             max_results=WEB_SEARCH_MAX_RESULTS)
+        _duckduckgo_client = DuckDuckGoSearchResults(api_wrapper=wrapper, output_format="list")
+    return _duckduckgo_client
 
 
 async def bocha_search(search_queries):
-    """ 博查联网搜索接口 """
-    url = "https://api.bochaai.com/v1/web-search"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('BOCHA_API_KEY')}",
-        "Content-type": "application/json"
+    """ 博查联网搜索接口，所有查询并发执行，单个查询失败不影响其他查询 """
+    scheduler = get_scheduler("bocha")
+    client = get_bocha_client()
+    search_docs = await asyncio.gather(*[scheduler.run(bocha_search_query, client, query)
+                                         for query in search_queries],
+                                       return_exceptions=True)
+    print(f"博查联网搜索调度指标：{scheduler.stats()}")
+
+    return [failed_search_doc(query, doc) if isinstance(doc, Exception) else doc
+            for query, doc in zip(search_queries, search_docs)]
+
+
+async def bocha_search_query(client: httpx.AsyncClient, query: str) -> dict:
+    """ 博查单个查询的联网搜索，限流与服务端错误抛出可重试异常，交由调度器重试 """
+    data = {
+        "query": query,
+        "freshness": "noLimit",
+        "summary": True,
+        "count": WEB_SEARCH_MAX_RESULTS
+    }
+    response = await client.post(BOCHA_SEARCH_URL, json=data)
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableSearchError(response.status_code, response.text, response)
+    if response.status_code != 200:
+        raise ValueError(f"搜索API请求失败，状态码: {response.status_code}, 错误信息: {response.text}")
+
+    json_resp = response.json()
+    if json_resp.get("code") != 200 or not json_resp.get("data"):
+        raise ValueError(f"博查网络搜索失败，原因是：{json_resp.get('msg') or '未知错误'}")
+
+    webpages = (json_resp["data"].get("webPages") or {}).get("value") or []
+    results = []
+    for page in webpages:
+        results.append({
+            "title": page["name"],
+            "url": page['url'],
+            "content": page.get('summary') or page.get('snippet', ''),
+        })
+    return {
+        "query": query,
+        "follow_up_questions": None,
+        "answer": None,
+        "images": [],
+        "results": results
     }
 
-    search_docs = []
-    for query in search_queries:
-        data = {
-            "query": query,
-            "freshness": "noLimit",
-            "summary": True,
-            "count": WEB_SEARCH_MAX_RESULTS
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            json_resp = response.json()
-            try:
-                if json_resp["code"] != 200 or not json_resp["data"]:
-                    return f"博查网络搜索失败，原因是：{response.msg or '未知错误'}"
-                webpages = json_resp["data"]["webPages"]["value"]
-                if not webpages:
-                    return "未找到相关结果."
-                results = []
-                for idx, page in enumerate(webpages, start=1):
-                    results.append({
-                        "title": page["name"],
-                        "url": page['url'],
-                        "content": page['summary'],
-                    })
-                search_docs.append({
-                    "query": query,
-                    "follow_up_questions": None,
-                    "answer": None,
-                    "images": [],
-                    "results": results
-                })
-
-                return search_docs
-            except Exception as e:
-                return f"搜索API请求失败，原因是：搜索结果解析失败 {str(e)}"
-        else:
-            return f"搜索API请求失败，状态码: {response.status_code}, 错误信息: {response.text}"
+
+BOCHA_SEARCH_URL = "https://api.bochaai.com/v1/web-search"
+
+# 事件循环 => 博查共享的异步连接池
+_bocha_clients = weakref.WeakKeyDictionary()
+
+
+def get_bocha_client() -> httpx.AsyncClient:
+    """ 获取当前事件循环中 博查共享的异步连接池 """
+    loop = asyncio.get_running_loop()
+    client = _bocha_clients.get(loop)
+    if client is None:
+        max_in_flight = SEARCH_RATE_LIMITS.get("bocha", SEARCH_RATE_LIMITS.get("default")).get("max-in-flight")
+        client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {os.getenv('BOCHA_API_KEY')}",
+                "Content-type": "application/json"
+            },
+            timeout=WEB_SEARCH_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+        _bocha_clients[loop] = client
+    return client
+
+
+async def fake_search(search_queries):
+    """ 离线模拟的联网搜索接口，与真实的联网搜索服务一样经过调度器的限流与重试，用于无网络的基准测试 """
+    scheduler = get_scheduler("fake")
+    search_docs = await asyncio.gather(*[scheduler.run(fake_search_query, query) for query in search_queries],
+                                       return_exceptions=True)
+
+    return [failed_search_doc(query, doc) if isinstance(doc, Exception) else doc
+            for query, doc in zip(search_queries, search_docs)]
+
+
+async def fake_search_query(query: str) -> dict:
+    """ 离线模拟的单个查询，耗时按 FAKE_SEARCH 配置的延迟分布采样，同一查询返回相同的网页内容 """
+    await asyncio.sleep(sample_latency(FAKE_SEARCH.get("latency"), _fake_search_random))
+    if _fake_search_random.random() < FAKE_SEARCH.get("error-rate"):
+        raise asyncio.TimeoutError(f"模拟的联网搜索超时：{query}")
+
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+    page_random = random.Random(digest)
+    results = []
+    for idx in range(WEB_SEARCH_MAX_RESULTS):
+        words = page_random.choices(_FAKE_SEARCH_WORDS, k=FAKE_SEARCH.get("content-chars") // 2)
+        results.append({
+            "title": f"{query} 模拟网页{idx + 1}",
+            "url": f"https://example.com/{digest[:12]}/{idx + 1}",
+            "content": "".join(words),
+        })
+    return {
+        "query": query,
+        "follow_up_questions": None,
+        "answer": None,
+        "images": [],
+        "results": results
+    }
+
+
+_fake_search_random = random.Random(FAKE_SEARCH.get("seed"))
+
+_FAKE_SEARCH_WORDS = ["模型", "推理", "数据", "训练", "性能", "成本", "市场", "产品", "用户", "技术",
+                      "架构", "部署", "开源", "评测", "应用", "场景", "生态", "趋势", "安全", "效率"]
 
 
 def deduplicate_and_format_sources(search_response):
@@ -153,17 +325,23 @@ def deduplicate_and_format_sources(search_response):
     for response in search_response:
         sources_list.extend(response.get('results', []))
 
-    # 去重链接来源
-    unique_sources = {source['url']: source for source in sources_list}
+    # 去重链接来源：URL 归一化 + 近似重复内容检测
+    unique_sources, dedup_stats = deduplicate_sources(sources_list)
+    print(f"联网搜索来源去重统计：{dedup_stats}")
+
+    return formatted_text + format_sources(unique_sources)
+
 
-    # 格式化输出
-    for i, source in enumerate(unique_sources.values(), 1):
+def format_sources(sources: list[dict]) -> str:
+    """ 格式化来源信息为字符串 """
+    formatted_text = ""
+    for source in sources:
         formatted_text += "\n\n"
         formatted_text += f"标题: {source['title']}\n"
         formatted_text += f"链接地址: {source['url']}\n"
         formatted_text += f"链接内容摘要: {source['content']}\n"
         formatted_text += "\n\n"
-    return formatted_text.strip()
+    return formatted_text.rstrip()
 
 
 def format_sections(sections: list[Section]) -> str: